@@ -0,0 +1,171 @@
+import collections
+import math
+import multiprocessing
+import time
+import zlib
+
+# Resultados de AdmissionQueue.offer
+ADMITTED = "admitted"
+QUEUED = "queued"
+SHED_OVERLOAD = "overload"
+SHED_CLIENT = "client_connections"
+# Descartes que não saem de offer: prazo da fila vencido e limite de taxa do cliente
+SHED_TIMEOUT = "timeout"
+SHED_RATE = "client_rate"
+
+SHED_REASONS = (SHED_OVERLOAD, SHED_TIMEOUT, SHED_CLIENT, SHED_RATE)
+FIELDS = (ADMITTED, QUEUED) + SHED_REASONS
+
+# Status e mensagem da resposta de cada descarte: sobrecarga do servidor é 503, excesso de um cliente é 429
+SHED_RESPONSES = {
+    SHED_OVERLOAD: ("503 Service Unavailable", "Server overloaded, retry later"),
+    SHED_TIMEOUT: ("503 Service Unavailable", "Timed out waiting for a free worker"),
+    SHED_CLIENT: ("429 Too Many Requests", "Too many concurrent connections from this client"),
+    SHED_RATE: ("429 Too Many Requests", "Too many requests from this client"),
+}
+
+class AdmissionStats:
+    """Contadores de admitidas, enfileiradas e descartadas (por motivo), compartilhados entre processos."""
+
+    def __init__(self):
+        self._counts = multiprocessing.Array('Q', len(FIELDS))
+        self._index = {field: i for i, field in enumerate(FIELDS)}
+
+    def record(self, field):
+        with self._counts.get_lock():
+            self._counts[self._index[field]] += 1
+
+    def snapshot(self):
+        with self._counts.get_lock():
+            counts = dict(zip(FIELDS, self._counts[:]))
+        return {
+            "admitted": counts[ADMITTED],
+            "queued": counts[QUEUED],
+            "shed": {reason: counts[reason] for reason in SHED_REASONS}
+        }
+
+    def render(self, prefix="cpf_server"):
+        """Contadores no formato texto do Prometheus, para acrescentar a /metrics."""
+        stats = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_admitted_total Work admitted by admission control (connections or requests, by engine).",
+            f"# TYPE {prefix}_admitted_total counter",
+            f"{prefix}_admitted_total {stats['admitted']}",
+            f"# HELP {prefix}_admission_queued_total Work that waited in the admission queue before a decision.",
+            f"# TYPE {prefix}_admission_queued_total counter",
+            f"{prefix}_admission_queued_total {stats['queued']}",
+            f"# HELP {prefix}_shed_total Work answered with 503/429 instead of being served, by reason.",
+            f"# TYPE {prefix}_shed_total counter",
+        ]
+        lines += [f'{prefix}_shed_total{{reason="{reason}"}} {count}' for reason, count in stats["shed"].items()]
+        return "\n".join(lines) + "\n"
+
+class AdmissionQueue:
+    """Admissão com fila limitada: até `max_active` itens em atendimento e `max_queue` esperando.
+
+    Quem espera mais que `timeout` segundos é descartado por `expire`; `per_client` limita
+    quantos itens (em atendimento + na fila) um mesmo IP pode ter (0 desativa). Não é
+    thread-safe: fica com um único dono (o acceptor do motor prefork, o loop do asyncio).
+    """
+
+    def __init__(self, max_active, max_queue=256, timeout=2.0, per_client=0, stats=None):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.per_client = per_client
+        self.stats = stats or AdmissionStats()
+        self.active = 0
+        self.clients = collections.Counter()
+        # (prazo, cliente, item); o prazo é fixo, então a fila também fica ordenada por prazo
+        self.waiting = collections.deque()
+
+    def offer(self, client, item, now=None):
+        """ADMITTED, QUEUED ou o motivo do descarte (SHED_CLIENT, SHED_OVERLOAD)."""
+        if self.per_client and self.clients[client] >= self.per_client:
+            outcome = SHED_CLIENT
+        elif self.active < self.max_active and not self.waiting:
+            self.active += 1
+            self.clients[client] += 1
+            outcome = ADMITTED
+        elif len(self.waiting) >= self.max_queue:
+            outcome = SHED_OVERLOAD
+        else:
+            self.waiting.append(((now or time.monotonic()) + self.timeout, client, item))
+            self.clients[client] += 1
+            outcome = QUEUED
+        self.stats.record(outcome)
+        return outcome
+
+    def _forget(self, client):
+        self.clients[client] -= 1
+        if self.clients[client] <= 0:
+            del self.clients[client]
+
+    def release(self, client):
+        """Libera a vaga de um item que terminou; retorna os itens da fila admitidos no lugar."""
+        self.active -= 1
+        self._forget(client)
+        admitted = []
+        while self.waiting and self.active < self.max_active:
+            _, _, item = self.waiting.popleft()
+            self.active += 1
+            self.stats.record(ADMITTED)
+            admitted.append(item)
+        return admitted
+
+    def expire(self, now=None):
+        """Remove e retorna os itens cujo prazo na fila venceu."""
+        now = now or time.monotonic()
+        expired = []
+        while self.waiting and self.waiting[0][0] <= now:
+            _, client, item = self.waiting.popleft()
+            self._forget(client)
+            self.stats.record(SHED_TIMEOUT)
+            expired.append(item)
+        return expired
+
+    def discard(self, item):
+        """Tira da fila um item que desistiu de esperar (conta como prazo vencido)."""
+        for entry in self.waiting:
+            if entry[2] is item:
+                self.waiting.remove(entry)
+                self._forget(entry[1])
+                self.stats.record(SHED_TIMEOUT)
+                return True
+        return False
+
+    def next_deadline(self):
+        return self.waiting[0][0] if self.waiting else None
+
+class RateLimiter:
+    """Token bucket por IP em memória compartilhada: `rate` requisições/s, rajadas de até `burst`.
+
+    Os IPs são espalhados por hash em `buckets` posições; IPs que colidem dividem o mesmo balde.
+    """
+
+    def __init__(self, rate, burst=None, buckets=4096):
+        self.rate = rate
+        self.burst = burst or max(1.0, 2.0 * rate)
+        self._tokens = multiprocessing.RawArray('d', buckets)
+        self._stamps = multiprocessing.RawArray('d', buckets)
+        self._lock = multiprocessing.Lock()
+
+    def acquire(self, client):
+        """0 se a requisição pode seguir; senão, os segundos até o balde ter uma ficha."""
+        # crc32 em vez de hash(): o mesmo IP cai no mesmo balde em qualquer processo
+        i = zlib.crc32(client.encode()) % len(self._tokens)
+        # CLOCK_MONOTONIC é o mesmo para todos os processos
+        now = time.monotonic()
+        with self._lock:
+            stamp = self._stamps[i]
+            tokens = self.burst if not stamp else min(self.burst, self._tokens[i] + (now - stamp) * self.rate)
+            self._stamps[i] = now
+            if tokens >= 1.0:
+                self._tokens[i] = tokens - 1.0
+                return 0.0
+            self._tokens[i] = tokens
+        return (1.0 - tokens) / self.rate
+
+def retry_after_header(seconds):
+    # Retry-After aceita só segundos inteiros
+    return max(1, math.ceil(seconds))
@@ -0,0 +1,412 @@
+import admission
+import asyncio
+import cache
+import compression
+import database
+import plancheck
+import encoders
+import httpparser
+import logs
+import metrics
+import threading
+import traceback
+import time
+import os
+import queries
+import tls
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from server import Server, ROUTER, ROUTES, JSON_CONTENT_TYPE, log
+
+# Rotas respondidas no próprio loop, sem o pool de threads do SQLite: não esperam vaga de atendimento, para
+# que sondas de saúde, pre-flights e a coleta de métricas não fiquem atrás das consultas
+UNADMITTED_ROUTES = frozenset(("options", "health", "metrics", "invalid"))
+
+class AsyncServer(Server):
+    """Motor asyncio: cada conexão é uma corrotina e o SQLite roda num pool de threads limitado."""
+
+    def __init__(self, host, port, cpf_db, cnpj_db, db_workers=None, keepalive_timeout=5.0,
+                 max_keepalive_requests=100, certfile="cert.pem", keyfile="key.pem",
+                 cache_file="result_cache.db", cache_ttl=300.0, cache_max_entries=10000, plan_check="warn",
+                 log_level="INFO", log_sample=None, log_file=None, max_queue=256, queue_timeout=2.0,
+                 client_connections=0, client_rate=0.0, client_burst=None, retry_after=1):
+        super().__init__(host, port, cpf_db, cnpj_db, keepalive_timeout=keepalive_timeout,
+                         max_keepalive_requests=max_keepalive_requests, certfile=certfile, keyfile=keyfile,
+                         cache_file=cache_file, cache_ttl=cache_ttl, cache_max_entries=cache_max_entries,
+                         plan_check=plan_check, log_level=log_level, log_sample=log_sample, log_file=log_file,
+                         max_queue=max_queue, queue_timeout=queue_timeout, client_connections=client_connections,
+                         client_rate=client_rate, client_burst=client_burst, retry_after=retry_after)
+        self.db_workers = db_workers or min(32, (os.cpu_count() or 1) * 4)
+        # Admissão por requisição: no máximo uma por thread do pool em atendimento, as demais
+        # esperam na fila limitada em vez de se acumularem na fila interna do executor
+        self.admission = admission.AdmissionQueue(self.db_workers, max_queue, queue_timeout,
+                                                  client_connections, self.admission_stats)
+        self.executor = None
+        self.loop = None
+        self.stop_event = None
+        self.databases = database.ThreadLocalDatabases(cpf_db, cnpj_db)
+        self.writers = set()
+        # Um único slot: as requisições são registradas só pela thread do loop
+        self.metrics = metrics.Metrics(ROUTES)
+        # Handler de cada rota, resolvido uma vez
+        self.handlers = {route: getattr(self, f"handle_{route}") for route in ROUTES}
+
+    def _run_query(self, query_func, params, cache_key=None, timer=metrics.DISCARD):
+        # Cada thread do pool mantém suas próprias conexões, abertas na primeira consulta
+        return timer.timed("sql", cache.cached_call, self.cache if cache_key else None, cache_key,
+                           lambda: Server.run_with_cursor(self.databases.get(), query_func, *params))
+
+    async def query(self, query_func, params, cache_key=None, timer=metrics.DISCARD):
+        return await self.loop.run_in_executor(self.executor, self._run_query, query_func, params, cache_key, timer)
+
+    @staticmethod
+    async def read_request(reader, parser):
+        # O parser guarda os bytes excedentes entre chamadas (pipelining); None quando o cliente fecha
+        request = parser.next_request()
+        while request is None:
+            data = await reader.read(65536)
+            if not data:
+                if parser.buffer:
+                    log.debug("Connection closed in the middle of a request")
+                return None
+            parser.feed(data)
+            request = parser.next_request()
+        return request
+
+    def _produce_chunks(self, make_chunks, chunk_queue, cancelled, encoder, timer):
+        # Roda numa thread do pool: gera os pedaços, já enquadrados e comprimidos fora do loop,
+        # e os entrega ao loop com contrapressão (fila limitada)
+        chunks = None
+        try:
+            # Dentro do try: se abrir a conexão falhar, o erro e o sentinela ainda chegam ao loop
+            chunks = make_chunks(self.databases.get().cursor_cpf())
+            for payload in chunks:
+                if cancelled.is_set():
+                    break
+                chunk = timer.timed("serialize", encoder.chunk, payload)
+                if chunk:
+                    asyncio.run_coroutine_threadsafe(chunk_queue.put(chunk), self.loop).result()
+            else:
+                asyncio.run_coroutine_threadsafe(chunk_queue.put(encoder.finish()), self.loop).result()
+        except Exception as e:
+            asyncio.run_coroutine_threadsafe(chunk_queue.put(e), self.loop).result()
+        finally:
+            if chunks is not None:
+                chunks.close()
+            asyncio.run_coroutine_threadsafe(chunk_queue.put(None), self.loop).result()
+
+    async def send_streaming_response(self, writer, execute_func, params, keep_alive, cache_key=None, timer=metrics.DISCARD,
+                                      encoding=None):
+        return await self.send_chunks(writer, lambda cursor: Server.stream_chunks(
+            execute_func, params, cursor, result_cache=self.cache, cache_key=cache_key, timer=timer
+        ), keep_alive, timer, encoding)
+
+    async def send_chunks(self, writer, make_chunks, keep_alive, timer=metrics.DISCARD, encoding=None):
+        chunk_queue = asyncio.Queue(maxsize=4)
+        cancelled = threading.Event()
+        encoder = compression.ChunkedEncoder(encoding)
+        producer = self.loop.run_in_executor(
+            self.executor, self._produce_chunks, make_chunks, chunk_queue, cancelled, encoder, timer
+        )
+        finished = False
+        # A thread produtora acumula SQL e serialização no timer; o envio é somado só no fim, sem disputa
+        send_time = 0.0
+        try:
+            writer.write(Server.build_streaming_headers(keep_alive, encoding))
+            while True:
+                chunk = await chunk_queue.get()
+                if chunk is None:
+                    finished = True
+                    return True
+                if isinstance(chunk, Exception):
+                    # Erro da produção (SQL, banco ausente): mesmo um OSError não é o cliente desconectando
+                    finished = True
+                    return await self.send_stream_error(writer, encoder, timer, chunk)
+                start = time.perf_counter()
+                writer.write(chunk)
+                await writer.drain()
+                send_time += time.perf_counter() - start
+
+        except (ConnectionError, OSError) as e:
+            timer.error = True
+            log.info("Streaming interrupted, client disconnected: %s", e)
+            return False
+
+        except Exception as e:
+            return await self.send_stream_error(writer, encoder, timer, e)
+
+        finally:
+            if not finished:
+                # Libera a thread produtora, que pode estar bloqueada esperando espaço na fila
+                cancelled.set()
+                while await chunk_queue.get() is not None:
+                    pass
+            await producer
+            timer.send += send_time
+
+    @staticmethod
+    async def send_stream_error(writer, encoder, timer, e):
+        timer.error = True
+        timer.status = 500
+        log.error("Streaming response failed: %s", e, exc_info=e)
+        try:
+            # A thread produtora já parou de usar o encoder quando entrega a exceção
+            error_msg = Server.encode_payload({"status": "error", "message": str(e), "isComplete": True})
+            writer.write(encoder.chunk(error_msg) + encoder.finish())
+            await writer.drain()
+        except Exception:
+            pass
+        return False
+
+    async def admit(self, client):
+        """Espera uma vaga de atendimento; retorna ADMITTED ou o motivo do descarte."""
+        waiter = self.loop.create_future()
+        outcome = self.admission.offer(client, waiter)
+        if outcome != admission.QUEUED:
+            return outcome
+        try:
+            # shield: no prazo vencido o waiter segue intacto e a decisão abaixo não disputa com release
+            await asyncio.wait_for(asyncio.shield(waiter), self.admission.timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self.admission.discard(waiter)
+                return admission.SHED_TIMEOUT
+        except asyncio.CancelledError:
+            # Conexão encerrada enquanto esperava: sai da fila ou devolve a vaga já recebida
+            if not self.admission.discard(waiter):
+                self.release(client)
+            raise
+        return admission.ADMITTED
+
+    def release(self, client):
+        for waiter in self.admission.release(client):
+            waiter.set_result(None)
+
+    async def serve_request(self, writer, request, client, timer):
+        # Limite de taxa por IP e admissão antes de ocupar uma thread do pool
+        route, param = ROUTER.match(request.method, request.path)
+        timer.route = route
+        retry_after = self.rate_limiter.acquire(client) if self.rate_limiter else 0
+        if retry_after:
+            self.admission_stats.record(admission.SHED_RATE)
+            return await self.respond_shed(writer, request, timer, admission.SHED_RATE,
+                                           admission.retry_after_header(retry_after))
+        if route in UNADMITTED_ROUTES:
+            return await self.handlers[route](writer, request, param, timer)
+        outcome = await self.admit(client)
+        if outcome != admission.ADMITTED:
+            # Sobrecarga: responde e fecha, liberando o cliente para tentar de novo mais tarde
+            request.keep_alive = False
+            return await self.respond_shed(writer, request, timer, outcome, self.retry_after)
+        try:
+            return await self.handlers[route](writer, request, param, timer)
+        finally:
+            self.release(client)
+
+    async def respond_shed(self, writer, request, timer, reason, retry_after):
+        status, message = admission.SHED_RESPONSES[reason]
+        return await self.respond_error(writer, request, timer, message, status, retry_after)
+
+    async def respond(self, writer, response, timer):
+        start = time.perf_counter()
+        writer.write(response)
+        await writer.drain()
+        timer.send += time.perf_counter() - start
+        return True
+
+    async def respond_error(self, writer, request, timer, message="Invalid request", status="400 Bad Request",
+                            retry_after=None, allow=None):
+        timer.error = True
+        timer.status = int(status.split(" ", 1)[0])
+        return await self.respond(writer, Server.build_error_response(request.keep_alive, message, status, retry_after, allow),
+                                  timer)
+
+    # Handlers das rotas (mesmos nomes do motor prefork): (writer, requisição, parâmetro do caminho, timer)
+
+    async def handle_options(self, writer, request, param, timer):
+        return await self.respond(writer, Server.build_cors_response(request.keep_alive), timer)
+
+    async def handle_health(self, writer, request, param, timer):
+        return await self.respond(writer, Server.build_health_response(request.keep_alive), timer)
+
+    async def handle_stats(self, writer, request, param, timer):
+        stats = {"tls": self.handshake_stats.snapshot(), "admission": self.admission_stats.snapshot()}
+        if self.cache:
+            # snapshot conta as entradas no arquivo de cache: fora do loop
+            stats["cache"] = await self.loop.run_in_executor(self.executor, self.cache.snapshot)
+        response = timer.timed("serialize", Server.build_http_json, stats, request.keep_alive, Server.response_encoding(request))
+        return await self.respond(writer, response, timer)
+
+    async def handle_metrics(self, writer, request, param, timer):
+        text = timer.timed("serialize", lambda: self.metrics.render() + self.admission_stats.render())
+        response = timer.timed("serialize", Server.build_http_body, text.encode('utf-8'), request.keep_alive, metrics.CONTENT_TYPE,
+                               Server.response_encoding(request))
+        return await self.respond(writer, response, timer)
+
+    async def handle_person_by_cpf_batch(self, writer, request, param, timer):
+        try:
+            cpfs = queries.parse_cpf_batch(request.body)
+        except queries.BatchTooLargeError as e:
+            return await self.respond_error(writer, request, timer, str(e), "413 Payload Too Large")
+        except ValueError as e:
+            return await self.respond_error(writer, request, timer, str(e))
+        return await self.send_chunks(writer, lambda cursor: Server.batch_chunks(cpfs, cursor, timer), request.keep_alive, timer,
+                                      Server.response_encoding(request))
+
+    async def search_by_name(self, writer, request, name, timer, execute, paginate):
+        try:
+            page = Server.page_params(request.query())
+        except ValueError as e:
+            return await self.respond_error(writer, request, timer, str(e))
+        encoding = Server.response_encoding(request)
+        if page is None:
+            return await self.send_streaming_response(writer, execute, (name,), request.keep_alive,
+                                                      cache.search_key(timer.route, name), timer, encoding)
+        result = await self.query(lambda name, cursor: paginate(name, cursor, *page), (name,),
+                                  cache.search_key(timer.route, name, *page), timer)
+        body = timer.timed("serialize", encoders.CPF_ROW.page_body, result)
+        response = timer.timed("serialize", Server.build_http_body, body, request.keep_alive, JSON_CONTENT_TYPE, encoding)
+        return await self.respond(writer, response, timer)
+
+    async def handle_person_by_name(self, writer, request, param, timer):
+        return await self.search_by_name(writer, request, param, timer,
+                                         queries.execute_cpf_by_name, queries.paginate_cpf_by_name)
+
+    async def handle_person_by_exact_name(self, writer, request, param, timer):
+        return await self.search_by_name(writer, request, param, timer,
+                                         queries.execute_cpf_by_exact_name, queries.paginate_cpf_by_exact_name)
+
+    async def handle_person_by_phonetic_name(self, writer, request, param, timer):
+        return await self.search_by_name(writer, request, param, timer,
+                                         queries.execute_cpf_by_phonetic_name, queries.paginate_cpf_by_phonetic_name)
+
+    async def handle_autocomplete_person_name(self, writer, request, param, timer):
+        try:
+            limit = queries.parse_autocomplete_limit(request.query().get("limit"))
+        except ValueError as e:
+            return await self.respond_error(writer, request, timer, str(e))
+        names = await self.query(lambda text, cursor: queries.fetch_name_autocomplete(text, cursor, limit), (param,),
+                                 timer=timer)
+        body = timer.timed("serialize", encoders.names_body, names)
+        response = timer.timed("serialize", Server.build_http_body, body, request.keep_alive, JSON_CONTENT_TYPE,
+                               Server.response_encoding(request))
+        return await self.respond(writer, response, timer)
+
+    async def handle_person_by_cpf(self, writer, request, param, timer):
+        rows = await self.query(queries.fetch_cpf_by_cpf, (param,), cache.make_key(timer.route, param), timer)
+        body = timer.timed("serialize", encoders.CPF_ROW.results_body, rows)
+        response = timer.timed("serialize", Server.build_http_body, body, request.keep_alive, JSON_CONTENT_TYPE,
+                               Server.response_encoding(request))
+        return await self.respond(writer, response, timer)
+
+    async def handle_invalid(self, writer, request, param, timer):
+        message, status, allow = Server.route_error(request)
+        return await self.respond_error(writer, request, timer, message, status, allow=allow)
+
+    async def handle_connection(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        ssl_object = writer.get_extra_info('ssl_object')
+        if ssl_object is not None:
+            self.handshake_stats.record(ssl_object.session_reused)
+
+        self.writers.add(writer)
+        served = 0
+        parser = httpparser.RequestParser()
+        try:
+            while served < self.max_keepalive_requests:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader, parser), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except httpparser.BadRequest as e:
+                    # Corpo não lido ou bytes fora de sincronia: responde e encerra a conexão
+                    writer.write(Server.build_error_response(False, str(e), e.status))
+                    await writer.drain()
+                    break
+
+                if request is None:
+                    break
+
+                served += 1
+
+                request.keep_alive = request.keep_alive and served < self.max_keepalive_requests
+                timer = metrics.RequestTimer()
+                self.metrics.request_started()
+                handled = False
+                try:
+                    handled = await self.serve_request(writer, request, addr[0] if addr else "", timer)
+                finally:
+                    timer.error = timer.error or not handled
+                    self.metrics.request_finished(timer)
+                    logs.log_access(request.request_line, addr[0] if addr else None, timer)
+                if not handled or not request.keep_alive:
+                    break
+        except (ConnectionError, OSError) as e:
+            log.info("Connection with %s lost: %s", addr, e)
+        except Exception as e:
+            log.exception("Error handling client %s: %s", addr, e)
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            log.debug("Connection with %s closed after %d requests", addr, served)
+
+    async def serve(self):
+        # Em modo strict uma consulta sem índice impede a inicialização
+        plancheck.check_query_plans(self.plan_check, self.cpf_db)
+
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        self.ssl_context = tls.create_server_context(self.certfile, self.keyfile, metrics=self.metrics)
+        self.executor = ThreadPoolExecutor(max_workers=self.db_workers, thread_name_prefix="sqlite")
+
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port,
+            ssl=self.ssl_context, ssl_handshake_timeout=5.0,
+            backlog=4096, limit=65536, reuse_address=True
+        )
+
+        local_ip = self.get_local_ip()
+        print(f"[SERVER] Listening on {local_ip}:{self.port} (HTTPS, asyncio, {self.db_workers} database threads)")
+        self.running = True
+
+        try:
+            async with self.server:
+                await self.stop_event.wait()
+
+                # Fecha as conexões abertas para que os handlers terminem normalmente
+                for writer in list(self.writers):
+                    writer.close()
+                deadline = time.monotonic() + 5.0
+                while self.writers and time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        # Registrar o tempo de início
+        self.start_time = time.time()
+        start_datetime = datetime.fromtimestamp(self.start_time)
+        print(f"[SERVER] Starting at: {start_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
+        self._start_logging()
+
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            print(f"Error setting up server: {e}")
+            traceback.print_exc()
+            # Registrar tempo de parada mesmo em caso de erro
+            self.stop_time = time.time()
+            self._log_execution_time()
+        finally:
+            # O loop já encerrou: nada mais é enfileirado depois daqui
+            self._stop_logging()
+
+    def stop(self):
+        self.running = False
+        if self.loop and self.stop_event:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+        self._log_stop()
@@ -0,0 +1,164 @@
+import collections
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from argon2 import PasswordHasher
+from argon2.exceptions import Argon2Error
+from flask_jwt_extended import JWTManager
+
+# Um PasswordHasher por processo do pool, criado uma vez
+_hasher = None
+
+def verify_password(hashed_password, password):
+    """Roda num processo do pool: True se a senha confere com o hash Argon2."""
+    global _hasher
+    if not isinstance(password, str):
+        return False
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    try:
+        return _hasher.verify(hashed_password, password)
+    except Argon2Error:
+        return False
+
+def watch_parent(parent_pid):
+    """Inicializador dos processos do pool: saem se o worker que os criou morrer sem encerrá-los."""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(0)
+    threading.Thread(target=watch, daemon=True).start()
+
+class VerifierBusy(Exception):
+    """Fila de verificações de senha cheia (ou o pool não respondeu a tempo)."""
+
+class LoginStats:
+    """Contadores de login e do cache de tokens, compartilhados entre os workers do Flask."""
+
+    FIELDS = ("verified", "rejected", "throttled", "busy", "token_hits", "token_misses")
+
+    def __init__(self):
+        self._counts = multiprocessing.Array('Q', len(self.FIELDS))
+        self._index = {field: i for i, field in enumerate(self.FIELDS)}
+
+    def record(self, field):
+        with self._counts.get_lock():
+            self._counts[self._index[field]] += 1
+
+    def snapshot(self):
+        with self._counts.get_lock():
+            return dict(zip(self.FIELDS, self._counts[:]))
+
+class PasswordVerifier:
+    """Verificação Argon2 num pool de processos limitado, fora das threads que atendem requisições.
+
+    Cada verificação usa 64 MiB e um núcleo por ~50 ms; com `workers` processos e até `max_pending`
+    esperando, o excedente recebe VerifierBusy em vez de enfileirar sem limite. O pool é criado
+    no primeiro uso em cada processo (depois do fork dos workers do Flask).
+    """
+
+    def __init__(self, workers=1, max_pending=8, timeout=10.0, stats=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.stats = stats
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # fork: com spawn/forkserver cada processo do pool reimportaria o script principal
+                # (flask-server.py e os bancos que ele abre); os filhos só rodam verify_password
+                method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+                context = multiprocessing.get_context(method)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                     initializer=watch_parent, initargs=(os.getpid(),))
+            return self._executor
+
+    def shutdown(self):
+        """Encerra o pool deste processo (chamado quando o worker termina)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _record(self, field):
+        if self.stats is not None:
+            self.stats.record(field)
+
+    def verify(self, hashed_password, password):
+        if not self._slots.acquire(blocking=False):
+            self._record("busy")
+            raise VerifierBusy("Too many logins being verified")
+        try:
+            executor = self._pool()
+            try:
+                verified = executor.submit(verify_password, hashed_password, password).result(timeout=self.timeout)
+            except BrokenProcessPool:
+                # Um processo do pool morreu: o próximo login cria outro pool
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                self._record("busy")
+                raise VerifierBusy("Password verification pool failed")
+            except FutureTimeout:
+                self._record("busy")
+                raise VerifierBusy("Password verification timed out")
+        finally:
+            self._slots.release()
+        self._record("verified" if verified else "rejected")
+        return verified
+
+class TokenCache:
+    """Claims de JWTs já verificados, reaproveitados até o `exp` do token (LRU limitado)."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None:
+                return None
+            if "exp" in claims and claims["exp"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(claims)
+
+    def put(self, key, claims):
+        with self._lock:
+            self._entries[key] = dict(claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class CachingJWTManager(JWTManager):
+    """JWTManager que não refaz a decodificação e a verificação da assinatura de um token já visto.
+
+    Sobrescreve o ponto em que o flask_jwt_extended decodifica o token; expiração, revogação e
+    os demais callbacks continuam valendo porque rodam depois, sobre os claims devolvidos.
+    """
+
+    def __init__(self, app=None, cache=None, stats=None, **kwargs):
+        self.token_cache = cache or TokenCache()
+        self.stats = stats
+        super().__init__(app, **kwargs)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        key = (encoded_token, csrf_value)
+        claims = self.token_cache.get(key)
+        if self.stats is not None:
+            self.stats.record("token_hits" if claims is not None else "token_misses")
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+            self.token_cache.put(key, claims)
+        return claims
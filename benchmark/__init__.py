@@ -0,0 +1 @@
+"""Benchmarks do servidor: execute cada módulo com `python -m benchmark.<nome>`."""
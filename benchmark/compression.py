@@ -0,0 +1,82 @@
+import argparse
+import json
+import random
+import time
+import timeit
+import zlib
+import compression
+import encoders
+import queries
+from benchmark import gendb
+
+def sample_rows(count, seed=1):
+    # Linhas no formato do cursor (cpf, nome, sexo, nasc), com os nomes do gendb
+    rng = random.Random(seed)
+    return [
+        (gendb.cpf_number(i), gendb.person_name(i, seed), rng.choice("MF"),
+         f"{rng.randint(1930, 2010)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+        for i in range(1, count + 1)
+    ]
+
+def stream_payloads(rows, batch_size=queries.STREAM_BATCH_SIZE):
+    # O mesmo conteúdo que Server.stream_chunks gera para uma busca por nome
+    payloads = [b'{"status":"searching","message":"Iniciando busca...","progress":0,"isComplete":false}']
+    for start in range(0, len(rows), batch_size):
+        payloads.append(encoders.CPF_ROW.stream_batch(rows[start:start + batch_size], start + batch_size))
+    payloads.append(b'{"status":"complete","progress":100,"isComplete":true,"rowsSent":%d,"results":[]}' % len(rows))
+    return payloads
+
+def encode_stream(payloads, encoding):
+    encoder = compression.ChunkedEncoder(encoding)
+    return b"".join(encoder.chunk(payload) for payload in payloads) + encoder.finish()
+
+def decode_stream(body, encoding):
+    # Desfaz o chunked e, se houver, a compressão, como faria o cliente
+    data, pos = bytearray(), 0
+    while True:
+        end = body.index(b"\r\n", pos)
+        size = int(body[pos:end], 16)
+        if size == 0:
+            break
+        data += body[end + 2:end + 2 + size]
+        pos = end + 4 + size
+    return zlib.decompress(bytes(data), compression.WBITS[encoding]) if encoding else bytes(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes e latência de uma busca por nome em streaming, com e sem compressão")
+    parser.add_argument("--rows", type=int, default=5000, help="linhas na resposta")
+    parser.add_argument("--bandwidth", type=float, default=2.0, help="banda do enlace lento, em Mbit/s")
+    parser.add_argument("--rtt", type=float, default=100.0, help="tempo de ida e volta do enlace, em ms")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = stream_payloads(sample_rows(args.rows))
+    plain = b"".join(payloads)
+
+    results = {}
+    for encoding in (None, "gzip", "deflate"):
+        body = encode_stream(payloads, encoding)
+        assert decode_stream(body, encoding) == plain
+        # CPU do servidor para enquadrar (e comprimir) e do cliente para desfazer
+        encode_s = min(timeit.repeat(lambda: encode_stream(payloads, encoding), number=args.repeat, repeat=3)) / args.repeat
+        decode_s = min(timeit.repeat(lambda: decode_stream(body, encoding), number=args.repeat, repeat=3)) / args.repeat
+        # Latência no enlace lento: um RTT, a transmissão dos bytes e a CPU dos dois lados
+        transfer_s = len(body) * 8 / (args.bandwidth * 1e6)
+        results[encoding or "identity"] = {
+            "bytes": len(body),
+            "ratio": round(len(plain) / len(body), 2),
+            "encode_ms": round(encode_s * 1e3, 2),
+            "decode_ms": round(decode_s * 1e3, 2),
+            "latency_ms": round((args.rtt / 1e3 + transfer_s + encode_s + decode_s) * 1e3, 1)
+        }
+
+    print(json.dumps({
+        "rows": args.rows,
+        "link": {"mbit_s": args.bandwidth, "rtt_ms": args.rtt},
+        "level": compression.LEVEL,
+        "results": results,
+        "speedup": round(results["identity"]["latency_ms"] / results["gzip"]["latency_ms"], 2)
+    }))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+import indexer
+
+# Sementes de nomes: combinações suficientes para buscas por nome com poucos e muitos resultados
+FIRST_NAMES = [
+    "JOSÉ", "MARIA", "JOÃO", "ANA", "ANTÔNIO", "FRANCISCO", "CARLOS", "PAULO", "PEDRO", "LUCAS",
+    "LUIZ", "MARCOS", "LUÍS", "GABRIEL", "RAFAEL", "DANIEL", "MARCELO", "BRUNO", "EDUARDO", "FELIPE",
+    "JULIANA", "MÁRCIA", "FERNANDA", "PATRÍCIA", "ALINE", "SANDRA", "CAMILA", "AMANDA", "BRUNA", "JÉSSICA",
+    "LETÍCIA", "JÚLIA", "LUCIANA", "VANESSA", "MARIANA", "GABRIELA", "VERA", "VITÓRIA", "LARISSA", "CLÁUDIA",
+]
+SURNAMES = [
+    "SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "RODRIGUES", "FERREIRA", "ALVES", "PEREIRA", "LIMA", "GOMES",
+    "COSTA", "RIBEIRO", "MARTINS", "CARVALHO", "ALMEIDA", "LOPES", "SOARES", "FERNANDES", "VIEIRA", "BARBOSA",
+    "ROCHA", "DIAS", "NASCIMENTO", "ANDRADE", "MOREIRA", "NUNES", "MARQUES", "MACHADO", "MENDES", "FREITAS",
+    "CARDOSO", "RAMOS", "GONÇALVES", "SANTANA", "TEIXEIRA", "ARAÚJO", "PINTO", "CAVALCANTI", "MONTEIRO", "CORREIA",
+]
+STREET_TYPES = ["RUA", "AVENIDA", "TRAVESSA", "ALAMEDA", "RODOVIA"]
+UFS = ["AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA", "PB", "PE",
+       "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO"]
+MUNICIPIOS = 5570
+
+MASK64 = (1 << 64) - 1
+
+def mix(i, seed):
+    # splitmix64: função do índice, para que cpf.db e cnpj.db concordem sem guardar os nomes
+    x = (i * 0x9E3779B97F4A7C15 + seed) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+def person_name(i, seed):
+    h = mix(i, seed)
+    h, first = divmod(h, len(FIRST_NAMES))
+    parts = [FIRST_NAMES[first]]
+    h, middle = divmod(h, len(FIRST_NAMES) * 2)
+    if middle < len(FIRST_NAMES):
+        parts.append(FIRST_NAMES[middle])
+    h, count = divmod(h, 3)
+    for _ in range(count + 1):
+        h, surname = divmod(h, len(SURNAMES))
+        parts.append(SURNAMES[surname])
+    return " ".join(parts)
+
+def cpf_number(i):
+    # Identificadores distintos e determinísticos; não são CPFs com dígito verificador válido
+    return f"{(i * 7919) % 10**11:011d}"
+
+def open_for_bulk_load(path):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    # Carga única e descartável: sem journal nem fsync
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    return conn
+
+def insert_batches(conn, sql, rows, batch_size=100000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+    conn.commit()
+
+def generate_cpf_db(path, rows, seed):
+    """Tabela cpf(cpf, nome, sexo, nasc) conforme STRUCTURE."""
+    rng = random.Random(seed)
+    conn = open_for_bulk_load(path)
+    try:
+        start = time.time()
+        conn.execute("CREATE TABLE cpf (cpf VARCHAR, nome VARCHAR, sexo CHAR, nasc DATE)")
+        insert_batches(conn, "INSERT INTO cpf VALUES (?, ?, ?, ?)", (
+            (cpf_number(i), person_name(i, seed), rng.choice("MF"),
+             f"{rng.randint(1930, 2010)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+            for i in range(1, rows + 1)
+        ))
+        print(f"[GENDB] {path}: {rows} cpf rows in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+def generate_cnpj_db(path, companies, cpf_rows, seed):
+    """Empresas, estabelecimentos e sócios com as colunas lidas pelas rotas, e tabelas de códigos de STRUCTURE."""
+    rng = random.Random(seed + 1)
+    conn = open_for_bulk_load(path)
+    try:
+        start = time.time()
+        conn.execute("CREATE TABLE empresas (cnpj_basico TEXT, razao_social TEXT, natureza TEXT, capital TEXT, porte TEXT)")
+        conn.execute(
+            "CREATE TABLE estabelecimento (cnpj TEXT, cnpj_basico TEXT, nome_fantasia TEXT, tipo_logradouro TEXT, "
+            "logradouro TEXT, numero TEXT, complemento TEXT, bairro TEXT, municipio TEXT, uf TEXT, cep TEXT, "
+            "ddd1 TEXT, telefone1 TEXT, correio_eletronico TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE socios (cnpj TEXT, cnpj_basico TEXT, nome_socio TEXT, nome_representante TEXT, "
+            "cnpj_cpf_socio TEXT, qualificacao_socio TEXT)"
+        )
+        for table in ("municipios", "cnaes", "qualificacoes", "paises", "motivos", "naturezas"):
+            conn.execute(f'CREATE TABLE {table} (id TEXT, "desc" TEXT)')
+
+        insert_batches(conn, "INSERT INTO municipios VALUES (?, ?)",
+                       ((str(code), f"MUNICIPIO {code}") for code in range(1, MUNICIPIOS + 1)))
+        for table, count in (("cnaes", 1300), ("qualificacoes", 70), ("paises", 250), ("motivos", 60), ("naturezas", 90)):
+            insert_batches(conn, f"INSERT INTO {table} VALUES (?, ?)",
+                           ((str(code), f"{table.upper()} {code}") for code in range(1, count + 1)))
+
+        insert_batches(conn, "INSERT INTO empresas VALUES (?, ?, ?, ?, ?)", (
+            (f"{i:08d}", f"{rng.choice(SURNAMES)} {rng.choice(SURNAMES)} LTDA", str(rng.randint(1, 90)),
+             f"{rng.randint(1, 10**6)},00", str(rng.choice((1, 3, 5))))
+            for i in range(1, companies + 1)
+        ))
+
+        # Um estabelecimento (matriz) por empresa e de 1 a 3 sócios, escolhidos entre as pessoas do cpf.db
+        def estabelecimentos():
+            for i in range(1, companies + 1):
+                basico = f"{i:08d}"
+                yield (
+                    f"{basico}000100", basico, f"FANTASIA {i}", rng.choice(STREET_TYPES), f"{rng.choice(SURNAMES)}",
+                    str(rng.randint(1, 9999)), None if rng.random() < 0.7 else f"SALA {rng.randint(1, 999)}",
+                    "CENTRO", str(rng.randint(1, MUNICIPIOS)), rng.choice(UFS), f"{rng.randint(10**7, 10**8 - 1)}",
+                    str(rng.randint(11, 99)), str(rng.randint(10**7, 10**8 - 1)), f"contato{i}@empresa.com.br"
+                )
+        insert_batches(conn, "INSERT INTO estabelecimento VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       estabelecimentos())
+
+        # Sócios são pessoas do cpf.db (mesmo nome e CPF mascarado), para que a busca por sócio encontre resultados
+        def socios():
+            for i in range(1, companies + 1):
+                basico = f"{i:08d}"
+                for _ in range(rng.randint(1, 3)):
+                    person = rng.randint(1, cpf_rows)
+                    cpf = cpf_number(person)
+                    yield (f"{basico}000100", basico, person_name(person, seed), None, f"***{cpf[3:9]}**", "49")
+        insert_batches(conn, "INSERT INTO socios VALUES (?, ?, ?, ?, ?, ?)", socios())
+        print(f"[GENDB] {path}: {companies} companies in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera bancos cpf.db e cnpj.db sintéticos e reproduzíveis")
+    parser.add_argument("--out-dir", default="bench-data")
+    parser.add_argument("--cpf-rows", type=int, default=1_000_000, help="linhas da tabela cpf (1M a 100M)")
+    parser.add_argument("--companies", type=int, default=None, help="empresas no cnpj.db (padrão: cpf-rows / 10)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-indexes", action="store_true", help="não cria os índices (para medir sem eles)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    cpf_db = os.path.join(args.out_dir, "cpf.db")
+    cnpj_db = os.path.join(args.out_dir, "cnpj.db")
+    companies = args.companies or max(1, args.cpf_rows // 10)
+
+    generate_cpf_db(cpf_db, args.cpf_rows, args.seed)
+    generate_cnpj_db(cnpj_db, companies, args.cpf_rows, args.seed)
+
+    if not args.no_indexes:
+        indexer.build_name_fts(cpf_db)
+        indexer.build_normalized_name(cpf_db)
+        indexer.build_phonetic_index(cpf_db)
+        # ANALYZE por último, com os índices de nome já criados, para o sqlite_stat1 ter as estatísticas de todos
+        indexer.build_indexes(cpf_db, indexer.CPF_INDEXES)
+        indexer.build_indexes(cnpj_db, indexer.CNPJ_INDEXES)
+
+if __name__ == "__main__":
+    main()
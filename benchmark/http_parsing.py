@@ -0,0 +1,85 @@
+import argparse
+import json
+import re
+import timeit
+import urllib.parse
+import httpparser
+import server
+
+# Mistura de requisições do tráfego típico, como chegam da rede (cabeçalhos de um cliente HTTP comum)
+HEADERS = b"Host: 127.0.0.1:8000\r\nUser-Agent: python-requests/2.31\r\nAccept: */*\r\nConnection: keep-alive\r\n"
+REQUESTS = [
+    b"GET /get-person-by-cpf/00000007919 HTTP/1.1\r\n" + HEADERS + b"\r\n",
+    b"GET /get-person-by-name/MARIA%20DA%20SILVA HTTP/1.1\r\n" + HEADERS + b"\r\n",
+    b"GET /get-person-by-exact-name/JOSE+PEREIRA?limit=50&after=00000123456 HTTP/1.1\r\n" + HEADERS + b"\r\n",
+    b"GET /health HTTP/1.1\r\n" + HEADERS + b"\r\n",
+    b"POST /get-person-by-cpf-batch HTTP/1.1\r\n" + HEADERS + b"Content-Length: 24\r\n\r\n" + b'{"cpfs":["00000007919"]}',
+    b"GET /nope HTTP/1.1\r\n" + HEADERS + b"\r\n",
+]
+
+def old_parse_and_route(data):
+    # Caminho anterior: cabeçalhos como texto, regex para Content-Length/Connection e cadeia de ifs com re.match
+    head, buffer = data.split(b"\r\n\r\n", 1)
+    request = head.decode('utf-8', errors='replace') + "\r\n\r\n"
+    match = re.search(r"^content-length:\s*(\d+)", request, re.IGNORECASE | re.MULTILINE)
+    body_length = int(match.group(1)) if match else 0
+    body = buffer[:body_length]
+    match = re.search(r"^connection:\s*([^\r\n]*)", request, re.IGNORECASE | re.MULTILINE)
+    connection = match.group(1).strip().lower() if match else ""
+    keep_alive = connection == "keep-alive" if request.split("\r\n", 1)[0].endswith("HTTP/1.0") else connection != "close"
+
+    def query(query_string):
+        if not query_string:
+            return {}
+        return {key: values[0] for key, values in urllib.parse.parse_qs(query_string).items()}
+
+    if request.startswith("OPTIONS"):
+        return "options", None, {}, body, keep_alive
+    if "GET /health" in request:
+        return "health", None, {}, body, keep_alive
+    if request.startswith("GET /stats "):
+        return "stats", None, {}, body, keep_alive
+    if request.startswith("GET /metrics "):
+        return "metrics", None, {}, body, keep_alive
+    if request.startswith("POST /get-person-by-cpf-batch "):
+        return "person_by_cpf_batch", None, {}, body, keep_alive
+    match = re.match(r"GET /get-person-by-name/([^ ?]+)(?:\?([^ ]*))? HTTP/1.[01]", request)
+    if match:
+        return "person_by_name", urllib.parse.unquote_plus(match.group(1)), query(match.group(2)), body, keep_alive
+    match = re.match(r"GET /get-person-by-exact-name/([^ ?]+)(?:\?([^ ]*))? HTTP/1.[01]", request)
+    if match:
+        return "person_by_exact_name", urllib.parse.unquote_plus(match.group(1)), query(match.group(2)), body, keep_alive
+    match = re.match(r"GET /get-person-by-cpf/(\d+) HTTP/1.[01]", request)
+    if match:
+        return "person_by_cpf", match.group(1), {}, body, keep_alive
+    return "invalid", None, {}, body, keep_alive
+
+def new_parse_and_route(data):
+    parser = httpparser.RequestParser()
+    parser.feed(data)
+    request = parser.next_request()
+    route, param = server.ROUTER.match(request.method, request.path)
+    server.HANDLERS[route]
+    return route, param, request.query(), request.body, request.keep_alive
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por requisição da leitura dos cabeçalhos e do roteamento")
+    parser.add_argument("--repeat", type=int, default=20000, help="passadas pela mistura de requisições")
+    args = parser.parse_args()
+
+    for data in REQUESTS:
+        assert old_parse_and_route(data) == new_parse_and_route(data), data
+
+    results = {}
+    for name, func in (("regex", old_parse_and_route), ("parser_router", new_parse_and_route)):
+        best = min(timeit.repeat(lambda: [func(data) for data in REQUESTS], number=args.repeat, repeat=5))
+        results[name] = round(best / args.repeat / len(REQUESTS) * 1e9, 1)
+
+    print(json.dumps({
+        "requests": len(REQUESTS),
+        "ns_per_request": results,
+        "speedup": round(results["regex"] / results["parser_router"], 2)
+    }))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Gerador de carga TLS para server.py (motores prefork e asyncio) e flask-server.py.
+
+Cada conexão keep-alive sorteia rotas de ROUTES com chaves reais dos bancos e o relatório traz vazão, erros e
+p50/p95/p99 por rota. Entram todas as rotas dos servidores, inclusive /metrics, o pre-flight CORS (OPTIONS) e o
+/login do Flask; este só com --login, e as respostas 429 do limitador de login contam como esperadas.
+"""
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import random
+import ssl
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import database
+
+# Rotas exercitadas: nome -> (método, servidores que a atendem, função amostra -> (caminho, corpo)).
+# "server" cobre server.py nos dois motores (prefork e asyncio); "flask" cobre flask-server.py
+ROUTES = {
+    "health": ("GET", ("server",), lambda s: ("/health", None)),
+    "stats": ("GET", ("server", "flask"), lambda s: ("/stats", None)),
+    "metrics": ("GET", ("server", "flask"), lambda s: ("/metrics", None)),
+    "options_preflight": ("OPTIONS", ("server", "flask"),
+                          lambda s: (f"/get-person-by-name/{s.quote(s.full_name())}", None)),
+    "login": ("POST", ("flask",), lambda s: ("/login", s.login_body())),
+    "person_by_cpf": ("GET", ("server", "flask"), lambda s: (f"/get-person-by-cpf/{s.cpf()}", None)),
+    "person_by_name": ("GET", ("server", "flask"), lambda s: (f"/get-person-by-name/{s.quote(s.full_name())}", None)),
+    "person_by_name_page": ("GET", ("server", "flask"),
+                            lambda s: (f"/get-person-by-name/{s.quote(s.surname())}?limit=50", None)),
+    "person_by_exact_name": ("GET", ("server", "flask"),
+                             lambda s: (f"/get-person-by-exact-name/{s.quote(s.full_name())}", None)),
+    "person_by_exact_name_page": ("GET", ("server", "flask"),
+                                  lambda s: (f"/get-person-by-exact-name/{s.quote(s.full_name())}?limit=50", None)),
+    "person_by_phonetic_name": ("GET", ("server", "flask"),
+                                lambda s: (f"/get-person-by-phonetic-name/{s.quote(s.full_name())}", None)),
+    "person_by_phonetic_name_page": ("GET", ("server", "flask"),
+                                     lambda s: (f"/get-person-by-phonetic-name/{s.quote(s.surname())}?limit=50", None)),
+    "autocomplete_person_name": ("GET", ("server", "flask"),
+                                 lambda s: (f"/autocomplete-person-name/{s.quote(s.prefix())}", None)),
+    "person_by_cpf_batch": ("POST", ("server", "flask"),
+                            lambda s: ("/get-person-by-cpf-batch", json.dumps({"cpfs": s.cpfs(100)}).encode())),
+    "cnpj_by_partner": ("GET", ("flask",),
+                        lambda s: ("/get-person-cnpj-by-name-and-cpf/{}/{}".format(*map(s.quote, s.partner())), None)),
+    "cnpj_with_partners": ("GET", ("flask",), lambda s: (f"/get-cnpj-person-by-cnpj/{s.cnpj()}", None)),
+}
+
+# Cabeçalhos de um pre-flight de navegador, enviados nas requisições OPTIONS
+PREFLIGHT_HEADERS = {
+    "Origin": "https://localhost:5000",
+    "Access-Control-Request-Method": "GET",
+    "Access-Control-Request-Headers": "Authorization",
+}
+
+# Status que a rota devolve por projeto e não contam como erro: o limitador de /login (LOGIN_RATE, LOGIN_BURST)
+# responde 429 a quase todas as tentativas sob carga; para medir o argon2, suba os limites no flask-server.py
+EXPECTED_STATUSES = {
+    "login": (429,),
+}
+
+# Orçamento de latência (p95, em ms) das rotas interativas; o relatório aponta as que estouraram. O p99 de uma
+# rota de menos de 1 ms é o handshake TLS das reconexões (o servidor fecha o keep-alive a cada 100 requisições)
+LATENCY_BUDGETS_MS = {
+    "autocomplete_person_name": 10.0,
+}
+
+class Samples:
+    """Chaves reais lidas dos bancos, escolhidas com uma semente fixa para que as execuções sejam comparáveis."""
+
+    def __init__(self, cpf_db, cnpj_db=None, size=2000, seed=1, credentials=None):
+        self.rng = random.Random(seed)
+        self.credentials = credentials
+        conn = database.connect_readonly(cpf_db)
+        try:
+            self.people = self._sample(conn, "SELECT cpf, nome FROM cpf WHERE rowid = ?", "cpf", size)
+        finally:
+            conn.close()
+        self.partners = self.cnpjs = []
+        if cnpj_db:
+            conn = database.connect_readonly(cnpj_db)
+            try:
+                self.partners = self._sample(conn, "SELECT nome_socio, cnpj_cpf_socio FROM socios WHERE rowid = ?",
+                                             "socios", size)
+                self.cnpjs = [row[0] for row in self._sample(conn, "SELECT cnpj FROM estabelecimento WHERE rowid = ?",
+                                                             "estabelecimento", size)]
+            finally:
+                conn.close()
+
+    def _sample(self, conn, sql, table, size):
+        max_rowid = conn.execute(f"SELECT max(rowid) FROM {table}").fetchone()[0] or 0
+        rows = []
+        for _ in range(size * 2 if max_rowid else 0):
+            row = conn.execute(sql, (self.rng.randint(1, max_rowid),)).fetchone()
+            if row is not None:
+                rows.append(row)
+                if len(rows) == size:
+                    break
+        return rows
+
+    @staticmethod
+    def quote(value):
+        return urllib.parse.quote(value, safe="")
+
+    def cpf(self):
+        return self.rng.choice(self.people)[0]
+
+    def cpfs(self, count):
+        return [self.rng.choice(self.people)[0] for _ in range(count)]
+
+    def full_name(self):
+        return self.rng.choice(self.people)[1]
+
+    def prefix(self):
+        # O que já foi digitado de um nome: de 1 a 12 caracteres, como a cada tecla do autocompletar
+        name = self.rng.choice(self.people)[1]
+        return name[:self.rng.randint(1, min(len(name), 12))]
+
+    def surname(self):
+        return self.rng.choice(self.people)[1].split()[-1]
+
+    def partner(self):
+        # O CPF do sócio vem mascarado (***123456**); a rota compara só os dígitos do meio
+        name, masked = self.rng.choice(self.partners)
+        return name, "000" + masked.strip("*") + "00"
+
+    def cnpj(self):
+        return self.rng.choice(self.cnpjs)
+
+    def login_body(self):
+        username, _, password = self.credentials.partition(":")
+        return json.dumps({"username": username, "password": password}).encode()
+
+def percentile(sorted_values, p):
+    # Método do posto mais próximo
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def run_connection(args, routes, samples, deadline, results, lock):
+    """Uma conexão keep-alive que envia requisições em sequência até o prazo."""
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    headers = {"Authorization": f"Bearer {args['token']}"} if args["token"] else {}
+    conn = None
+    local = []
+    while time.monotonic() < deadline:
+        route = samples.rng.choice(routes)
+        method, _, build = ROUTES[route]
+        path, body = build(samples)
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPSConnection(args["host"], args["port"], context=context, timeout=args["timeout"])
+            request_headers = dict(headers, **({"Content-Type": "application/json"} if body else {}))
+            if method == "OPTIONS":
+                request_headers.update(PREFLIGHT_HEADERS)
+            conn.request(method, path, body=body, headers=request_headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400 or response.status == 404 or response.status in EXPECTED_STATUSES.get(route, ())
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            ok = False
+            if conn is not None:
+                conn.close()
+            conn = None
+        local.append((route, time.perf_counter() - start, ok))
+    if conn is not None:
+        conn.close()
+    with lock:
+        results.extend(local)
+
+def run_process(args, process_index):
+    # Cada conexão sorteia com a própria semente
+    routes = args["routes"]
+    samples = [
+        Samples(args["cpf_db"], args["cnpj_db"], seed=args["seed"] + process_index * 1000 + thread_index,
+                credentials=args["credentials"])
+        for thread_index in range(args["connections"])
+    ]
+    # O prazo só começa a contar depois da amostragem nos bancos
+    deadline = time.monotonic() + args["duration"]
+    results = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_connection, args=(args, routes, thread_samples, deadline, results, lock))
+        for thread_samples in samples
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def summarize(results, elapsed, budgets=LATENCY_BUDGETS_MS):
+    by_route = {}
+    for route, latency, ok in results:
+        by_route.setdefault(route, []).append((latency, ok))
+    report = {}
+    for route, entries in sorted(by_route.items()):
+        latencies = sorted(latency for latency, _ in entries)
+        report[route] = {
+            "requests": len(entries),
+            "errors": sum(1 for _, ok in entries if not ok),
+            "throughput_rps": round(len(entries) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+        if route in budgets:
+            report[route]["budget_ms"] = budgets[route]
+            report[route]["within_budget"] = report[route]["p95_ms"] <= budgets[route]
+    return report
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except OSError:
+        return None
+
+def login(host, port, credentials):
+    username, _, password = credentials.partition(":")
+    context = ssl._create_unverified_context()
+    conn = http.client.HTTPSConnection(host, port, context=context, timeout=30)
+    try:
+        conn.request("POST", "/login", body=json.dumps({"username": username, "password": password}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise SystemExit(f"[LOADGEN] Login failed: {response.status} {data}")
+    return data["access_token"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga TLS concorrente para server.py e flask-server.py")
+    parser.add_argument("--target", choices=("server", "flask"), default="server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--cpf-db", required=True, help="banco de onde são sorteados nomes e CPFs")
+    parser.add_argument("--cnpj-db", default=None, help="banco de onde são sorteados CNPJs e sócios (rotas CNPJ)")
+    parser.add_argument("--routes", default=None, help="rotas separadas por vírgula (padrão: todas as do alvo)")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos de carga")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--connections", type=int, default=8, help="conexões simultâneas por processo")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--token", default=None, help="JWT para as rotas protegidas do Flask")
+    parser.add_argument("--login", default=None,
+                        help="usuario:senha para obter o JWT em /login; também habilita a rota login")
+    parser.add_argument("--output", default=None, help="grava o relatório JSON neste arquivo")
+    parser.add_argument("--budget", action="append", default=[], metavar="ROTA=MS",
+                        help="orçamento de p95 de uma rota, em ms (substitui o padrão; repetível)")
+    args = parser.parse_args()
+
+    budgets = dict(LATENCY_BUDGETS_MS)
+    for item in args.budget:
+        route, _, value = item.partition("=")
+        try:
+            budgets[route] = float(value)
+        except ValueError:
+            parser.error(f"invalid budget: {item}")
+
+    available = [name for name, (_, targets, _) in ROUTES.items() if args.target in targets]
+    if not args.cnpj_db:
+        available = [name for name in available if not name.startswith("cnpj_")]
+    if not args.login:
+        available = [name for name in available if name != "login"]
+    routes = args.routes.split(",") if args.routes else available
+    unknown = [route for route in routes if route not in available]
+    if unknown:
+        parser.error(f"routes not available for {args.target}: {', '.join(unknown)}")
+
+    token = args.token
+    if args.login:
+        token = login(args.host, args.port, args.login)
+
+    config = {
+        "host": args.host, "port": args.port, "routes": routes, "duration": args.duration,
+        "connections": args.connections, "timeout": args.timeout, "seed": args.seed,
+        "cpf_db": args.cpf_db, "cnpj_db": args.cnpj_db, "token": token,
+        "credentials": args.login,
+    }
+    print(f"[LOADGEN] {args.processes}x{args.connections} connections for {args.duration}s on "
+          f"https://{args.host}:{args.port} ({', '.join(routes)})", file=sys.stderr, flush=True)
+    with multiprocessing.Pool(args.processes) as pool:
+        results = [item for chunk in pool.starmap(run_process, [(config, i) for i in range(args.processes)])
+                   for item in chunk]
+    # Vazão sobre a janela de carga; a inicialização dos processos e a amostragem ficam de fora
+    elapsed = args.duration
+
+    latencies = sorted(latency for _, latency, _ in results)
+    report = {
+        "target": args.target,
+        "revision": git_revision(),
+        "duration_s": round(elapsed, 3),
+        "processes": args.processes,
+        "connections": args.processes * args.connections,
+        "total": {
+            "requests": len(results),
+            "errors": sum(1 for _, _, ok in results if not ok),
+            "throughput_rps": round(len(results) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        },
+        "routes": summarize(results, elapsed, budgets),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    over = [route for route, entry in report["routes"].items() if entry.get("within_budget") is False]
+    if over:
+        raise SystemExit(f"[LOADGEN] p95 over budget: {', '.join(over)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import json
+import timeit
+import encoders
+
+def sample_rows(count):
+    # Linhas no formato do cursor (cpf, nome, sexo, nasc), com acentos como na base real
+    names = ["JOSÉ DA SILVA", "MARIA APARECIDA DE SOUZA", "JOÃO PEREIRA", "ANA CAROLINA \"NINA\" LIMA"]
+    return [
+        (f"{i:011d}", f"{names[i % len(names)]} {i}", "MF"[i % 2], "1990-01-01")
+        for i in range(count)
+    ]
+
+def encode_with_dicts(rows):
+    # Caminho anterior: um dict por linha, json.dumps e codificação UTF-8 separada
+    body = json.dumps({"results": [dict(zip(encoders.CPF_COLUMNS, row)) for row in rows]}, ensure_ascii=False)
+    return body.encode('utf-8')
+
+def encode_with_row_encoder(rows):
+    return encoders.CPF_ROW.results_body(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por linha da serialização JSON dos resultados")
+    parser.add_argument("--rows", type=int, default=1000, help="linhas por resposta")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = sample_rows(args.rows)
+    assert json.loads(encode_with_dicts(rows)) == json.loads(encode_with_row_encoder(rows))
+
+    results = {}
+    for name, func in (("dicts", encode_with_dicts), ("row_encoder", encode_with_row_encoder)):
+        best = min(timeit.repeat(lambda: func(rows), number=args.repeat, repeat=5))
+        results[name] = round(best / args.repeat / args.rows * 1e9, 1)
+
+    print(json.dumps({
+        "rows": args.rows,
+        "ns_per_row": results,
+        "speedup": round(results["dicts"] / results["row_encoder"], 2)
+    }))
+
+if __name__ == "__main__":
+    main()
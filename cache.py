@@ -0,0 +1,175 @@
+import database
+import json
+import multiprocessing
+import os
+import phonetic
+import queries
+import sqlite3
+import threading
+import time
+
+class ResultCache:
+    """Cache de resultados em um arquivo SQLite local, compartilhado pelos processos e threads do servidor.
+
+    Cada entrada expira após `ttl` segundos e, acima de `max_entries`, as menos usadas
+    recentemente são descartadas. O cache é esvaziado quando algum banco de origem muda.
+    """
+
+    # Uma varredura de expiração/LRU a cada N gravações de cada processo
+    EVICT_EVERY = 32
+    # Versão do formato dos valores (linhas do cursor); mudar a versão esvazia caches antigos
+    FORMAT = 2
+
+    def __init__(self, path, sources, max_entries=10000, ttl=300.0, max_rows=5000, check_interval=1.0):
+        self.path = path
+        self.sources = [os.path.abspath(source) for source in sources]
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.check_interval = check_interval
+        # Atualizar o instante de uso a cada leitura seria uma escrita por acerto; basta uma fração do TTL
+        self.touch_interval = ttl / 10
+        self._counts = multiprocessing.Array('Q', 3)  # acertos, faltas, invalidações
+        self._local = threading.local()
+
+    def _connection(self):
+        # Uma conexão por thread e por processo: conexões SQLite não atravessam fork
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_used ON entries(used)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        self._local.checked = 0.0
+        self._local.puts = 0
+        return conn
+
+    def _fingerprint(self):
+        # O mesmo sinal que reabre as conexões dos workers (DatabaseManager): depois de esvaziado, o cache
+        # só é preenchido de novo por consultas feitas no arquivo novo
+        return json.dumps([self.FORMAT] + [[source, database.file_fingerprint(source)] for source in self.sources])
+
+    def _check_sources(self, conn):
+        # Compara o inode/tamanho/mtime dos bancos com o registrado no cache, no máximo uma vez por intervalo
+        now = time.monotonic()
+        if now - self._local.checked < self.check_interval:
+            return
+        self._local.checked = now
+
+        fingerprint = self._fingerprint()
+        row = conn.execute("SELECT value FROM meta WHERE name = 'sources'").fetchone()
+        if row is not None and row[0] == fingerprint:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE name = 'sources'").fetchone()
+            if row is None or row[0] != fingerprint:
+                conn.execute("DELETE FROM entries")
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('sources', ?)", (fingerprint,))
+                if row is not None:
+                    self._count(2)
+                    print("[CACHE] Source database changed, cache cleared")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _count(self, index):
+        with self._counts.get_lock():
+            self._counts[index] += 1
+
+    def get(self, key):
+        """Retorna o valor em cache ou None (falta, expirado ou erro no arquivo de cache)."""
+        try:
+            conn = self._connection()
+            self._check_sources(conn)
+            row = conn.execute("SELECT value, expires, used FROM entries WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or row[1] <= now:
+                self._count(1)
+                return None
+            if now - row[2] > self.touch_interval:
+                conn.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"[CACHE] Lookup failed: {e}")
+            self._count(1)
+            return None
+
+        self._count(0)
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        # Listas grandes demais não compensam o custo de serializar e ocupar o cache
+        if isinstance(value, list) and len(value) > self.max_rows:
+            return
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, separators=(',', ':')), now + self.ttl, now)
+            )
+            self._local.puts += 1
+            if self._local.puts % self.EVICT_EVERY == 0:
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"[CACHE] Store failed: {e}")
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+        excess = conn.execute("SELECT count(*) FROM entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used LIMIT ?)",
+                (excess,)
+            )
+
+    def snapshot(self):
+        with self._counts.get_lock():
+            hits, misses, invalidations = self._counts[:]
+        total = hits + misses
+        try:
+            entries = self._connection().execute("SELECT count(*) FROM entries").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "invalidations": invalidations,
+            "entries": entries
+        }
+
+def make_key(route, *params):
+    return json.dumps([route, *params], separators=(',', ':'))
+
+def cached_call(cache, key, compute):
+    # Consulta o cache antes de executar `compute`; sem cache apenas executa
+    if cache is None:
+        return compute()
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.put(key, result)
+    return result
+
+def search_key(route, name, *params):
+    # Nome exato compara pela forma normalizada; a busca parcial já é feita em maiúsculas
+    if route == "person_by_exact_name":
+        name = queries.normalize_name(name)
+    elif route == "person_by_phonetic_name":
+        # Variantes com as mesmas chaves fonéticas (Souza/Sousa) dividem a entrada; a ordem das palavras não importa
+        name = " ".join(sorted(phonetic.name_keys(name)[:phonetic.MAX_KEYS]))
+    else:
+        name = name.upper()
+    return make_key(route, name, *params)
@@ -17,8 +17,34 @@ def menu():
     choice = input("Enter your choice: ")
     return choice
 
-def send_https_request(sock, path):
-    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+def read_chunked_body(sock, buffer, start_time):
+    # Decodifica Transfer-Encoding: chunked até o chunk final de tamanho 0
+    body = b""
+    while True:
+        while b"\r\n" not in buffer:
+            chunk = sock.recv(8192)
+            if not chunk:
+                raise ConnectionError("Conexão fechada durante resposta chunked.")
+            buffer += chunk
+        size_line, buffer = buffer.split(b"\r\n", 1)
+        size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+        while len(buffer) < size + 2:
+            chunk = sock.recv(8192)
+            if not chunk:
+                raise ConnectionError("Conexão fechada durante resposta chunked.")
+            buffer += chunk
+        if size == 0:
+            # Consome o CRLF final (sem trailers)
+            return body, buffer[2:]
+        body += buffer[:size]
+        buffer = buffer[size + 2:]
+        print(f"Recebido mais {size} bytes...")
+        if time.time() - start_time > 120:  # 2 minutos no máximo
+            raise socket.timeout("Tempo limite excedido.")
+
+def send_https_request(sock, path, keep_alive=False):
+    connection = "keep-alive" if keep_alive else "close"
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: {connection}\r\n\r\n"
     sock.sendall(request.encode())
 
     # Aumentar o timeout para receber a resposta completa
@@ -31,54 +57,57 @@ def send_https_request(sock, path):
 
     # Inicialmente, vamos tentar obter pelo menos os headers
     while b"\r\n\r\n" not in response:
-        try:
-            chunk = sock.recv(8192)  # Aumentei o tamanho do buffer
-            if not chunk:
-                break
-            response += chunk
-            if time.time() - start_time > 60:  # Timeout de segurança
-                print("Tempo limite excedido ao receber headers.")
-                break
-        except socket.timeout:
-            print("Timeout ao aguardar headers.")
+        chunk = sock.recv(8192)  # Aumentei o tamanho do buffer
+        if not chunk:
+            break
+        response += chunk
+        if time.time() - start_time > 60:  # Timeout de segurança
+            print("Tempo limite excedido ao receber headers.")
             break
 
     # Se não conseguimos os headers, retorna o que tiver
     if b"\r\n\r\n" not in response:
+        if not response:
+            raise ConnectionError("Conexão fechada pelo servidor.")
         print("Resposta incompleta recebida (sem headers completos).")
-        return response.decode('utf-8', errors='ignore')
+        return response.decode('utf-8', errors='ignore'), False
 
     # Dividir em headers e corpo
     headers_raw, body = response.split(b"\r\n\r\n", 1)
-    headers = headers_raw.decode('utf-8', errors='ignore')
-    # Verificar se há Content-Length
+    headers = {}
+    for line in headers_raw.decode('utf-8', errors='ignore').splitlines()[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
 
-    content_length = None
-    for line in headers.splitlines():
-        if line.lower().startswith('content-length:'):
-            content_length = int(line.split(':', 1)[1].strip())
-            break
+    # A conexão só pode ser reaproveitada se ambos os lados concordarem
+    reusable = keep_alive and headers.get('connection', '').lower() != 'close'
 
-    # Se conhecemos o tamanho do corpo, continuamos recebendo até obtê-lo completo
+    content_length = headers.get('content-length')
     if content_length is not None:
+        # Se conhecemos o tamanho do corpo, continuamos recebendo até obtê-lo completo
+        content_length = int(content_length)
         print(f"Esperando corpo da resposta ({content_length} bytes)...")
         while len(body) < content_length:
-            try:
-                chunk = sock.recv(8192)
-                if not chunk:
-                    print("Conexão fechada antes de receber o corpo completo.")
-                    break
-                body += chunk
-                print(f"Recebido: {len(body)}/{content_length} bytes")
-                if time.time() - start_time > 120:  # 2 minutos no máximo
-                    print("Tempo limite excedido ao receber corpo.")
-                    break
-            except socket.timeout:
-                print("Timeout ao aguardar corpo da resposta.")
+            chunk = sock.recv(8192)
+            if not chunk:
+                print("Conexão fechada antes de receber o corpo completo.")
+                reusable = False
                 break
+            body += chunk
+            print(f"Recebido: {len(body)}/{content_length} bytes")
+            if time.time() - start_time > 120:  # 2 minutos no máximo
+                print("Tempo limite excedido ao receber corpo.")
+                reusable = False
+                break
+        body = body[:content_length]
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        print("Recebendo resposta chunked...")
+        body, _ = read_chunked_body(sock, body, start_time)
     else:
         # Se não temos Content-Length, continuamos recebendo até a conexão fechar
         print("Recebendo resposta de tamanho desconhecido...")
+        reusable = False
         while True:
             try:
                 chunk = sock.recv(8192)
@@ -97,16 +126,20 @@ def send_https_request(sock, path):
     try:
         total_time = time.time() - start_time
         print(f"Resposta completa recebida em {total_time:.2f} segundos ({len(body)} bytes).")
-        return body.decode('utf-8', errors='ignore')
+        return body.decode('utf-8', errors='ignore'), reusable
     except Exception as e:
         print(f"Erro ao decodificar resposta: {e}")
-        return f"Erro na decodificação: {len(body)} bytes recebidos"
+        return f"Erro na decodificação: {len(body)} bytes recebidos", reusable
 
-def connect_to_server(host, port, path, timeout=30.0):
+def create_client_context():
     # Create SSL context with proper configuration
     context = ssl.create_default_context()
     context.check_hostname = False
     context.verify_mode = ssl.CERT_NONE  # Skip certificate verification (use in dev only)
+    return context
+
+def connect_to_server(host, port, path, timeout=30.0):
+    context = create_client_context()
 
     try:
         # Create a new socket for the request
@@ -118,7 +151,7 @@ def connect_to_server(host, port, path, timeout=30.0):
         wrapped_sock.connect((host, port))
         print("Conexão estabelecida. Enviando requisição...")
 
-        result = send_https_request(wrapped_sock, path)
+        result, _ = send_https_request(wrapped_sock, path)
         return result
     except ConnectionRefusedError:
         print(f"Erro: Conexão recusada pelo servidor em {host}:{port}.")
@@ -140,6 +173,71 @@ def connect_to_server(host, port, path, timeout=30.0):
         except:
             pass
 
+class PersistentConnection:
+    """Mantém uma única conexão TLS aberta entre as opções do menu (keep-alive)."""
+
+    def __init__(self, host, port, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.context = create_client_context()
+        self.sock = None
+        self.session = None
+        self.requests_on_connection = 0
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        # Reapresenta a sessão TLS anterior para obter um handshake abreviado
+        self.sock = self.context.wrap_socket(sock, server_hostname=self.host, session=self.session)
+        self.requests_on_connection = 0
+        resumed = " (sessão TLS retomada)" if self.sock.session_reused else ""
+        print(f"Conexão estabelecida com {self.host}:{self.port}{resumed}.")
+
+    def close(self):
+        if self.sock:
+            if self.sock.session is not None:
+                self.session = self.sock.session
+            try:
+                self.sock.close()
+            except:
+                pass
+        self.sock = None
+
+    def request(self, path):
+        # Uma nova tentativa só é feita se a conexão reaproveitada foi fechada pelo servidor
+        for attempt in range(2):
+            reused = self.sock is not None
+            try:
+                if not reused:
+                    print(f"Conectando a {self.host}:{self.port}...")
+                    self.connect()
+                else:
+                    print(f"Reutilizando conexão ({self.requests_on_connection} requisições anteriores)...")
+
+                start_time = time.time()
+                result, reusable = send_https_request(self.sock, path, keep_alive=True)
+                self.requests_on_connection += 1
+                print(f"Tempo total da requisição: {(time.time() - start_time) * 1000:.1f} ms")
+                if not reusable:
+                    self.close()
+                return result
+            except ConnectionRefusedError:
+                print(f"Erro: Conexão recusada pelo servidor em {self.host}:{self.port}.")
+                print("Verifique se o servidor está rodando e se a porta está correta.")
+                self.close()
+                return None
+            except (ConnectionError, ssl.SSLError, OSError) as e:
+                self.close()
+                if reused and attempt == 0:
+                    print("Conexão anterior foi encerrada pelo servidor, reconectando...")
+                    continue
+                if isinstance(e, socket.timeout):
+                    print(f"Erro: Timeout ao conectar ao servidor em {self.host}:{self.port}")
+                else:
+                    print(f"Erro ao conectar ao servidor: {e}")
+                return None
+        return None
+
 def main():
     # Default configuration
     DEFAULT_PORT = 5000  # Alterado para 5000 para corresponder ao servidor
@@ -169,12 +267,15 @@ def main():
     # Set longer timeout for SSL handshake
     socket.setdefaulttimeout(30.0)
 
+    # Uma única conexão é reaproveitada entre as opções do menu
+    connection = PersistentConnection(HOST, PORT)
+
     while True:
         choice = menu()
         if choice == '1':
             name = input("Enter name: ")
             path = f"/get-person-by-name/{urllib.parse.quote(name)}"
-            result = connect_to_server(HOST, PORT, path)
+            result = connection.request(path)
             if result:
                 print("\n--- RESULTADO DA PESQUISA ---\n")
                 print(result)
@@ -182,7 +283,7 @@ def main():
         elif choice == '2':
             name = input("Enter exact name: ")
             path = f"/get-person-by-exact-name/{urllib.parse.quote(name)}"
-            result = connect_to_server(HOST, PORT, path)
+            result = connection.request(path)
             if result:
                 print("\n--- RESULTADO DA PESQUISA ---\n")
                 print(result)
@@ -190,7 +291,7 @@ def main():
         elif choice == '3':
             cpf = input("Enter CPF: ")
             path = f"/get-person-by-cpf/{cpf}"
-            result = connect_to_server(HOST, PORT, path)
+            result = connection.request(path)
             if result:
                 print("\n--- RESULTADO DA PESQUISA ---\n")
                 print(result)
@@ -198,7 +299,7 @@ def main():
         elif choice == '4':
             name = input("Enter name: ")
             path = f"/get-person-cnpj-by-name/{urllib.parse.quote(name)}"
-            result = connect_to_server(HOST, PORT, path)
+            result = connection.request(path)
             if result:
                 print("\n--- RESULTADO DA PESQUISA ---\n")
                 print(result)
@@ -207,7 +308,7 @@ def main():
             name = input("Enter exact name: ")
             cpf = input("Enter CPF: ")
             path = f"/get-person-cnpj-by-name-cpf/{urllib.parse.quote(name)}-{urllib.parse.quote(cpf)}"
-            result = connect_to_server(HOST, PORT, path)
+            result = connection.request(path)
             if result:
                 print("\n--- RESULTADO DA PESQUISA ---\n")
                 print(result)
@@ -216,7 +317,7 @@ def main():
             name = input("Enter name: ")
             cpf = input("Enter CPF: ")
             path = f"/get-person-cnpj-by-name-cpf-radical/{urllib.parse.quote(name)}-{urllib.parse.quote(cpf)}"
-            result = connect_to_server(HOST, PORT, path)
+            result = connection.request(path)
             if result:
                 print("\n--- RESULTADO DA PESQUISA ---\n")
                 print(result)
@@ -224,7 +325,7 @@ def main():
         elif choice == '7':
             print("Testando conexão com o servidor (health check)...")
             path = "/health"
-            result = connect_to_server(HOST, PORT, path, timeout=5.0)
+            result = connection.request(path)
             if result:
                 print("\n--- RESULTADO DO HEALTH CHECK ---\n")
                 print(result)
@@ -236,12 +337,15 @@ def main():
                     try:
                         new_port = int(input("Digite o número da porta: "))
                         PORT = new_port
+                        connection.close()
+                        connection = PersistentConnection(HOST, PORT)
                         print(f"Porta atualizada para: {PORT}")
                     except ValueError:
                         print("Valor de porta inválido, mantendo a porta atual.")
 
         elif choice == '0':
             print("Saindo do programa...")
+            connection.close()
             break
 
         else:
@@ -0,0 +1,94 @@
+import zlib
+
+# Corpos menores que isso vão sem compressão: o ganho não paga o custo nem o cabeçalho gzip
+MIN_SIZE = 1024
+# Nível do zlib: o JSON das buscas repete as mesmas chaves em cada linha e já comprime bem nos níveis baixos
+LEVEL = 5
+# Tipos de conteúdo que vale a pena comprimir
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+# wbits do zlib de cada codificação: gzip (RFC 1952) e deflate, que no HTTP é o formato zlib (RFC 1950)
+WBITS = {"gzip": 31, "deflate": 15}
+# Em caso de empate no q do cliente, gzip primeiro
+PREFERENCE = ("gzip", "deflate")
+
+def negotiate(accept_encoding):
+    """Codificação escolhida a partir do cabeçalho Accept-Encoding: "gzip", "deflate" ou None."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in PREFERENCE:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compressible(content_type):
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+def compress(body, encoding, level=LEVEL):
+    """Corpo inteiro comprimido na codificação negociada."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+    return compressor.compress(body) + compressor.flush()
+
+class StreamCompressor:
+    """Compressão incremental de uma resposta em streaming.
+
+    Cada pedaço sai comprimido na hora (Z_SYNC_FLUSH): o cliente descomprime o progresso sem
+    esperar o fim da resposta e a memória fica limitada à janela do zlib.
+    """
+
+    def __init__(self, encoding, level=LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+class ChunkedEncoder:
+    """Pedaços de uma resposta `Transfer-Encoding: chunked`, comprimidos se houver `encoding`."""
+
+    def __init__(self, encoding=None, level=LEVEL):
+        self.compressor = StreamCompressor(encoding, level) if encoding else None
+
+    @staticmethod
+    def frame(payload):
+        # Um pedaço vazio terminaria a resposta
+        return b"%X\r\n%b\r\n" % (len(payload), payload) if payload else b""
+
+    def chunk(self, payload):
+        if self.compressor is not None:
+            payload = self.compressor.compress(payload)
+        return self.frame(payload)
+
+    def finish(self):
+        """Final do fluxo comprimido e o pedaço vazio que encerra a resposta."""
+        tail = self.frame(self.compressor.finish()) if self.compressor is not None else b""
+        return tail + b"0\r\n\r\n"
+
+def compress_iter(chunks, encoding, level=LEVEL):
+    """Comprime um iterável de bytes pedaço a pedaço (respostas em streaming do Flask)."""
+    compressor = StreamCompressor(encoding, level)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,159 @@
+import sqlite3
+import threading
+import queue
+import os
+import urllib.parse
+import phonetic
+from contextlib import contextmanager
+
+# Ajustes aplicados a toda conexão somente leitura
+MMAP_SIZE = 1 << 30          # 1 GiB mapeado em memória por banco
+CACHE_SIZE_KIB = 32768       # 32 MiB de cache de páginas por conexão
+CACHED_STATEMENTS = 256      # Cache de statements preparados do módulo sqlite3
+
+def file_fingerprint(path):
+    """(inode, tamanho, mtime) do arquivo, ou None se ele não existe.
+
+    Muda quando o banco é reescrito no lugar ou substituído por outro arquivo; é o sinal
+    que reabre as conexões, recarrega as tabelas de códigos e esvazia o cache de resultados.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+def connect_readonly(path, immutable=True, check_same_thread=True):
+    """Abre o banco em modo somente leitura via URI, com mmap e cache de páginas ampliados.
+
+    Com immutable=1 o SQLite dispensa locks e a verificação de alterações no arquivo;
+    quem mantém a conexão aberta (DatabaseManager) a reabre quando o arquivo muda.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Database file not found: {path}")
+
+    uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+
+    conn = sqlite3.connect(uri, uri=True, cached_statements=CACHED_STATEMENTS,
+                           check_same_thread=check_same_thread)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    # Busca fonética sem o índice cpf_nome_fonetico (ver queries.cpf_by_phonetic_name_clause)
+    conn.create_function("phonetic_match", 2, phonetic.matches, deterministic=True)
+    return conn
+
+class DatabaseManager:
+    """Conexões CPF e CNPJ de um worker, abertas apenas quando uma rota precisa delas.
+
+    A cada uso a conexão é comparada com o arquivo (file_fingerprint): se o banco mudou, ela
+    é fechada e reaberta, para que as consultas não leiam páginas antigas pela conexão imutável.
+    """
+
+    def __init__(self, cpf_db, cnpj_db, immutable=True, check_same_thread=True, code_tables=None):
+        self.cpf_db = cpf_db
+        self.cnpj_db = cnpj_db
+        self.immutable = immutable
+        self.check_same_thread = check_same_thread
+        # Tabelas de códigos do CNPJ (lookups.CodeTables), trocadas junto com a conexão CNPJ
+        self.code_tables = code_tables
+        self._conn_cpf = None
+        self._conn_cnpj = None
+        self._fingerprint_cpf = None
+        self._fingerprint_cnpj = None
+
+    def _open(self, path, conn, opened_fingerprint):
+        # Retorna (conexão, fingerprint do arquivo quando ela foi aberta)
+        fingerprint = file_fingerprint(path)
+        if conn is not None:
+            # Arquivo removido: segue com a conexão atual em vez de falhar
+            if fingerprint == opened_fingerprint or fingerprint is None:
+                return conn, opened_fingerprint
+            print(f"[DATABASE] {path} changed, reopening connection")
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return connect_readonly(path, self.immutable, self.check_same_thread), fingerprint
+
+    def cpf(self):
+        self._conn_cpf, self._fingerprint_cpf = self._open(self.cpf_db, self._conn_cpf, self._fingerprint_cpf)
+        return self._conn_cpf
+
+    def cnpj(self):
+        self._conn_cnpj, self._fingerprint_cnpj = self._open(self.cnpj_db, self._conn_cnpj, self._fingerprint_cnpj)
+        if self.code_tables is not None:
+            self.code_tables.sync(self._fingerprint_cnpj)
+        return self._conn_cnpj
+
+    def cursor_cpf(self):
+        return self.cpf().cursor()
+
+    def cursor_cnpj(self):
+        return self.cnpj().cursor()
+
+    def close(self):
+        for conn in (self._conn_cpf, self._conn_cnpj):
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        self._conn_cpf = None
+        self._conn_cnpj = None
+        self._fingerprint_cpf = None
+        self._fingerprint_cnpj = None
+
+class ThreadLocalDatabases:
+    """Um DatabaseManager por thread, para pools de threads de longa duração."""
+
+    def __init__(self, cpf_db, cnpj_db, immutable=True, code_tables=None):
+        self.cpf_db = cpf_db
+        self.cnpj_db = cnpj_db
+        self.immutable = immutable
+        self.code_tables = code_tables
+        self._local = threading.local()
+
+    def get(self):
+        databases = getattr(self._local, "databases", None)
+        if databases is None:
+            databases = DatabaseManager(self.cpf_db, self.cnpj_db, self.immutable, code_tables=self.code_tables)
+            self._local.databases = databases
+        return databases
+
+class DatabasePool:
+    """Pool limitado de DatabaseManager compartilhado por threads de vida curta."""
+
+    def __init__(self, cpf_db, cnpj_db, size=8, immutable=True, timeout=30.0, code_tables=None):
+        self.cpf_db = cpf_db
+        self.cnpj_db = cnpj_db
+        self.immutable = immutable
+        self.code_tables = code_tables
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No database connection available")
+        try:
+            try:
+                databases = self._idle.get_nowait()
+            except queue.Empty:
+                databases = DatabaseManager(self.cpf_db, self.cnpj_db, self.immutable, check_same_thread=False,
+                                            code_tables=self.code_tables)
+            try:
+                yield databases
+            except sqlite3.DatabaseError:
+                # Conexão possivelmente inconsistente: descarta em vez de devolver ao pool
+                databases.close()
+                raise
+            except BaseException:
+                self._idle.put(databases)
+                raise
+            self._idle.put(databases)
+        finally:
+            self._slots.release()
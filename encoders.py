@@ -0,0 +1,90 @@
+import json
+from json.encoder import encode_basestring
+
+# Colunas das consultas de CPF, na ordem em que são selecionadas
+CPF_COLUMNS = ("cpf", "nome", "sexo", "nasc")
+
+def encode_value(value):
+    if value.__class__ is str:
+        return encode_basestring(value)
+    if value is None:
+        return "null"
+    return json.dumps(value, ensure_ascii=False)
+
+def _format_rows_2(template, rows, e=encode_basestring):
+    return [template % (e(a), e(b)) for a, b in rows]
+
+def _format_rows_4(template, rows, e=encode_basestring):
+    return [template % (e(a), e(b), e(c), e(d)) for a, b, c, d in rows]
+
+def _format_rows_n(template, rows, e=encode_basestring):
+    return [template % tuple(map(e, row)) for row in rows]
+
+_FAST_FORMATTERS = {2: _format_rows_2, 4: _format_rows_4}
+
+class RowEncoder:
+    """Escreve JSON direto das tuplas do cursor, sem montar um dict por linha."""
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        # Chaves já serializadas: cada linha vira um único `template % valores`
+        self.template = "{" + ",".join(f"{encode_basestring(column)}:%s" for column in self.columns) + "}"
+        self._format_fast = _FAST_FORMATTERS.get(len(self.columns), _format_rows_n)
+
+    def encode_rows(self, rows):
+        """Retorna os objetos JSON das linhas separados por vírgula, já em UTF-8 (sem colchetes)."""
+        try:
+            # Caminho rápido: todas as colunas são texto
+            parts = self._format_fast(self.template, rows)
+        except TypeError:
+            # Há NULL ou números no lote: codifica valor a valor
+            parts = [self.template % tuple(map(encode_value, row)) for row in rows]
+        return ",".join(parts).encode("utf-8")
+
+    def results_body(self, rows):
+        return b'{"results":[' + self.encode_rows(rows) + b']}'
+
+    def page_body(self, page):
+        return b'{"results":[%s],"next":%s,"total_estimate":%d}' % (
+            self.encode_rows(page["rows"]),
+            encode_value(page["next"]).encode("utf-8"),
+            page["total_estimate"]
+        )
+
+    def stream_batch(self, rows, rows_sent):
+        return b'{"status":"streaming","rowsSent":%d,"isComplete":false,"results":[%s]}' % (
+            rows_sent, self.encode_rows(rows)
+        )
+
+    def encode_keyed(self, pairs):
+        """Membros de um objeto JSON: "chave":[linhas], ou "chave":null quando não há linhas."""
+        return b",".join(
+            b"%s:[%s]" % (encode_basestring(key).encode("utf-8"), self.encode_rows(rows)) if rows
+            else encode_basestring(key).encode("utf-8") + b":null"
+            for key, rows in pairs
+        )
+
+CPF_ROW = RowEncoder(CPF_COLUMNS)
+
+def names_body(names):
+    """Resposta do autocompletar: {"results": ["NOME", ...]}."""
+    return b'{"results":[%s]}' % ",".join(map(encode_basestring, names)).encode("utf-8")
+
+def cpf_batch_payloads(batches):
+    """Objetos JSON da resposta em lote: um por bloco consultado e um resumo final."""
+    sent = found = 0
+    for pairs in batches:
+        sent += len(pairs)
+        found += sum(1 for _, rows in pairs if rows)
+        yield b'{"status":"streaming","cpfsSent":%d,"isComplete":false,"results":{%s}}' % (
+            sent, CPF_ROW.encode_keyed(pairs)
+        )
+    yield json.dumps({
+        "status": "complete",
+        "progress": 100,
+        "isComplete": True,
+        "cpfsSent": sent,
+        "found": found,
+        "notFound": sent - found,
+        "results": {}
+    }).encode("utf-8")
@@ -1,21 +1,176 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from argon2 import PasswordHasher
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, get_jwt_identity
+    create_access_token, jwt_required, get_jwt_identity
 )
 import os
-import ssl
-import sqlite3
+import admission
+import auth
+import cache
+import compression
+import database
+import encoders
+import lookups
+import metrics
+import plancheck
+import queries
 import datetime
 import json
+import logging
+import logs
+import time
+import tls
+import wsgiserver
+from werkzeug.serving import generate_adhoc_ssl_context
 
 app = Flask(__name__)
 
+# Contadores de handshakes TLS (completos x retomados)
+HANDSHAKE_STATS = tls.HandshakeStats()
+
+# Modo de execução: "production" (processos x threads, ver wsgiserver.py) ou "development" (app.run com depurador)
+SERVER_MODE = os.environ.get('FLASK_SERVER_MODE', 'production')
+WORKERS = int(os.environ.get('FLASK_WORKERS') or os.cpu_count() or 1)
+THREADS = int(os.environ.get('FLASK_THREADS', '8'))
+
+# Métricas de /metrics por endpoint; um slot por worker e várias threads em cada, daí o lock
+ROUTES = (
+    "login", "stats", "metrics", "get_person_by_name", "get_person_by_exact_name", "get_person_by_phonetic_name",
+    "autocomplete_person_name", "get_person_by_cpf", "get_person_by_cpf_batch", "get_person_cnpj_by_name_and_cpf",
+    "get_person_cnpj_by_cnpj", "invalid"
+)
+METRICS = metrics.Metrics(ROUTES, slots=WORKERS if SERVER_MODE == 'production' else 1, threaded=True)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify contabilizado na fase de serialização da requisição."""
+
+    def response(self, *args, **kwargs):
+        serialize = super().response
+        return g.get('timer', metrics.DISCARD).timed("serialize", lambda: serialize(*args, **kwargs))
+
+app.json = TimedJSONProvider(app)
+
+def json_response(body):
+    # Corpo JSON já em bytes (ver encoders.py), escrito direto das linhas do cursor
+    return Response(body, mimetype='application/json')
+
+# Conexões SQLite somente leitura, reaproveitadas entre requisições; em produção o pool de cada
+# worker tem uma conexão por thread, abertas depois do fork
+CPF_DB_PATH = os.environ.get('CPF_DB_PATH', 'db/basecpf.db')
+CNPJ_DB_PATH = os.environ.get('CNPJ_DB_PATH', 'db/cnpj.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or (THREADS if SERVER_MODE == 'production' else 16))
+
+# Tabelas de códigos do CNPJ em memória, carregadas na inicialização e recarregadas quando as conexões
+# do pool são reabertas num banco alterado
+CODE_TABLES = lookups.CodeTables(CNPJ_DB_PATH)
+CODE_TABLES.load()
+
+DATABASES = database.DatabasePool(CPF_DB_PATH, CNPJ_DB_PATH, size=DB_POOL_SIZE, code_tables=CODE_TABLES)
+
+# Cache de resultados em arquivo, compartilhado com outros processos (RESULT_CACHE_FILE vazio desativa)
+RESULT_CACHE_FILE = os.environ.get('RESULT_CACHE_FILE', 'result_cache.db')
+RESULT_CACHE = cache.ResultCache(
+    RESULT_CACHE_FILE, [CPF_DB_PATH, CNPJ_DB_PATH],
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', '300'))
+) if RESULT_CACHE_FILE else None
+
+# Maior corpo aceito na consulta em lote
+MAX_BATCH_BODY_SIZE = 1 << 20
+
+def cached_cpf_query(key, query):
+    # Só ocupa uma conexão do pool quando o resultado não está em cache
+    def compute():
+        with DATABASES.acquire() as databases:
+            return query(databases.cursor_cpf())
+    return g.timer.timed("sql", cache.cached_call, RESULT_CACHE, key, compute)
+
+def cached_cnpj_query(key, query):
+    def compute():
+        with DATABASES.acquire() as databases:
+            return query(databases.cursor_cnpj())
+    return g.timer.timed("sql", cache.cached_call, RESULT_CACHE, key, compute)
+
 # Configuração JWT
 app.config['JWT_SECRET_KEY'] = 'teste'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(minutes=10)
-jwt = JWTManager(app)
+# Tokens já verificados não têm a assinatura conferida de novo até expirarem
+LOGIN_STATS = auth.LoginStats()
+jwt = auth.CachingJWTManager(app, cache=auth.TokenCache(int(os.environ.get('JWT_CACHE_SIZE', '4096'))), stats=LOGIN_STATS)
+
+# Argon2 num pool de processos por worker (ARGON2_WORKERS), com no máximo ARGON2_QUEUE logins esperando;
+# tentativas de login limitadas por IP e por usuário (LOGIN_RATE por segundo, rajadas de LOGIN_BURST)
+PASSWORDS = auth.PasswordVerifier(
+    workers=int(os.environ.get('ARGON2_WORKERS', '1')),
+    max_pending=int(os.environ.get('ARGON2_QUEUE', '8')),
+    stats=LOGIN_STATS
+)
+LOGIN_LIMITER = admission.RateLimiter(float(os.environ.get('LOGIN_RATE', '0.2')), float(os.environ.get('LOGIN_BURST', '5')))
+
+# Tempo de cada requisição, por fase, para /metrics
+@app.before_request
+def start_request_timer():
+    g.timer = metrics.RequestTimer(request.endpoint or "invalid")
+    METRICS.request_started()
+
+@app.after_request
+def finish_request_timer(response):
+    timer = g.pop('timer', None)
+    if timer is None:
+        return response
+    timer.status = response.status_code
+    timer.error = response.status_code >= 400
+    # O envio termina quando o servidor WSGI fecha a resposta; descontado o SQL e a serialização
+    # que um gerador (streaming) ainda fizer nesse intervalo
+    handled = time.perf_counter()
+    work = timer.sql + timer.serialize
+    request_line = f"{request.method} {request.full_path.rstrip('?')} {request.environ.get('SERVER_PROTOCOL', '')}"
+    peer = request.remote_addr
+
+    def finished():
+        timer.send += time.perf_counter() - handled - (timer.sql + timer.serialize - work)
+        METRICS.request_finished(timer)
+        logs.log_access(request_line, peer, timer)
+
+    response.call_on_close(finished)
+    return response
+
+@app.teardown_request
+def abort_request_timer(exc):
+    # Exceções propagadas (modo debug) não passam por after_request
+    timer = g.pop('timer', None)
+    if timer is not None:
+        timer.status = 500
+        timer.error = True
+        METRICS.request_finished(timer)
+        logs.log_access(f"{request.method} {request.full_path.rstrip('?')}", request.remote_addr, timer)
+
+# Compressão gzip/deflate negociada pelo Accept-Encoding. Registrada depois de finish_request_timer para rodar
+# antes dele (after_request roda na ordem inversa) e entrar na fase de serialização
+@app.after_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or not compression.compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    timer = g.get('timer', metrics.DISCARD)
+    if response.is_streamed:
+        # Streaming: comprimido pedaço a pedaço, sem acumular a resposta
+        stream = compression.compress_iter(response.response, encoding)
+        response.response = timer.timed_iter("serialize", stream)
+        response.call_on_close(stream.close)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < compression.MIN_SIZE:
+            return response
+        response.set_data(timer.timed("serialize", compression.compress, body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 # Configuração CORS
 @app.after_request
@@ -45,50 +200,64 @@ USERS = {
 # Login
 @app.route('/login', methods=['POST', 'OPTIONS'])
 def login():
-    ph = PasswordHasher()
     if request.method == 'OPTIONS':
         return '', 200
     data = request.json
     username = data.get('username')
     password = data.get('password')
+    # Um balde por IP e outro por usuário: nem um IP testa muitos usuários, nem vários IPs o mesmo usuário
+    wait = max(LOGIN_LIMITER.acquire(f"ip:{request.remote_addr}"), LOGIN_LIMITER.acquire(f"user:{username}"))
+    if wait:
+        LOGIN_STATS.record("throttled")
+        return jsonify({"message": "Too many login attempts"}), 429, {"Retry-After": str(admission.retry_after_header(wait))}
     if username in USERS:
-        hashed_password = USERS[username]
         try:
-            if ph.verify(hashed_password, password):
-                access_token = create_access_token(identity=username)
-                return jsonify({
-                    "message": "Login successful!",
-                    "username": username,
-                    "access_token": access_token
-                }), 200
-        except Exception:
-            pass
+            verified = PASSWORDS.verify(USERS[username], password)
+        except auth.VerifierBusy:
+            return jsonify({"message": "Login temporarily unavailable, retry later"}), 503, {"Retry-After": "1"}
+        if verified:
+            access_token = create_access_token(identity=username)
+            return jsonify({
+                "message": "Login successful!",
+                "username": username,
+                "access_token": access_token
+            }), 200
     return jsonify({"message": "Invalid credentials"}), 401
 
+# Estatísticas
+@app.route('/stats', methods=['GET'])
+def stats():
+    stats = {'tls': HANDSHAKE_STATS.snapshot(), 'login': LOGIN_STATS.snapshot()}
+    if RESULT_CACHE:
+        stats['cache'] = RESULT_CACHE.snapshot()
+    return jsonify(stats), 200
+
+# Métricas no formato Prometheus
+@app.route('/metrics', methods=['GET'], endpoint='metrics')
+def metrics_endpoint():
+    return Response(METRICS.render(), content_type=metrics.CONTENT_TYPE)
+
 # Rotas SQL
 @app.route("/get-person-by-name/<name>", methods=['GET', 'OPTIONS'])
 @jwt_required()
 def get_person_by_name(name):
     if request.method == 'OPTIONS':
         return '', 200
-    cpf_db_path = os.environ.get('CPF_DB_PATH', 'db/basecpf.db')
     try:
-        conn_cpf = sqlite3.connect(cpf_db_path)
-        cursor_cpf = conn_cpf.cursor()
-        cursor_cpf.execute("SELECT * FROM cpf WHERE nome LIKE UPPER(?)", ('%' + name + '%',))
-        results = cursor_cpf.fetchall()
-        conn_cpf.close()
-        if results:
-            cpf_list = []
-            for row in results:
-                cpf_info = {
-                    'cpf': row[0],
-                    'nome': row[1],
-                    'sexo': row[2],
-                    'nasc': row[3]
-                }
-                cpf_list.append(cpf_info)
-            return jsonify({'results': cpf_list}), 200
+        # Usa o índice FTS5 trigram quando disponível (ver indexer.py)
+        if 'limit' in request.args:
+            # Paginação por chave: ?limit=N&after=<cursor da página anterior>
+            try:
+                limit, after = queries.parse_page_params(request.args['limit'], request.args.get('after'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            page = cached_cpf_query(cache.search_key("person_by_name", name, limit, after),
+                                    lambda cursor: queries.paginate_cpf_by_name(name, cursor, limit, after))
+            return json_response(g.timer.timed("serialize", encoders.CPF_ROW.page_body, page))
+        rows = cached_cpf_query(cache.search_key("person_by_name", name),
+                                lambda cursor: queries.fetch_cpf_by_name(name, cursor))
+        if rows:
+            return json_response(g.timer.timed("serialize", encoders.CPF_ROW.results_body, rows))
         else:
             return jsonify({'error': 'Nome não encontrado'}), 404
     except Exception as e:
@@ -99,120 +268,121 @@ def get_person_by_name(name):
 def get_person_by_exact_name(name):
     if request.method == 'OPTIONS':
         return '', 200
-    cpf_db_path = os.environ.get('CPF_DB_PATH', 'db/basecpf.db')
     try:
-        conn_cpf = sqlite3.connect(cpf_db_path)
-        cursor_cpf = conn_cpf.cursor()
-        cursor_cpf.execute("SELECT * FROM cpf WHERE nome = UPPER(?)", (name,))
-        results = cursor_cpf.fetchall()
-        conn_cpf.close()
-        if results:
-            cpf_list = []
-            for row in results:
-                cpf_info = {
-                    'cpf': row[0],
-                    'nome': row[1],
-                    'sexo': row[2],
-                    'nasc': row[3]
-                }
-                cpf_list.append(cpf_info)
-            return jsonify({'results': cpf_list}), 200
+        # Usa a coluna normalizada indexada quando disponível (ver indexer.py)
+        if 'limit' in request.args:
+            # Paginação por chave: ?limit=N&after=<cursor da página anterior>
+            try:
+                limit, after = queries.parse_page_params(request.args['limit'], request.args.get('after'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            page = cached_cpf_query(cache.search_key("person_by_exact_name", name, limit, after),
+                                    lambda cursor: queries.paginate_cpf_by_exact_name(name, cursor, limit, after))
+            return json_response(g.timer.timed("serialize", encoders.CPF_ROW.page_body, page))
+        rows = cached_cpf_query(cache.search_key("person_by_exact_name", name),
+                                lambda cursor: queries.fetch_cpf_by_exact_name(name, cursor))
+        if rows:
+            return json_response(g.timer.timed("serialize", encoders.CPF_ROW.results_body, rows))
         else:
             return jsonify({'error': 'Nome não encontrado'}), 404
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@app.route("/get-person-by-phonetic-name/<name>", methods=['GET', 'OPTIONS'])
+@jwt_required()
+def get_person_by_phonetic_name(name):
+    if request.method == 'OPTIONS':
+        return '', 200
+    try:
+        # Variantes de grafia (Souza/Sousa, Luiz/Luis) pela tabela de chaves fonéticas (ver indexer.py)
+        if 'limit' in request.args:
+            try:
+                limit, after = queries.parse_page_params(request.args['limit'], request.args.get('after'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            page = cached_cpf_query(cache.search_key("person_by_phonetic_name", name, limit, after),
+                                    lambda cursor: queries.paginate_cpf_by_phonetic_name(name, cursor, limit, after))
+            return json_response(g.timer.timed("serialize", encoders.CPF_ROW.page_body, page))
+        rows = cached_cpf_query(cache.search_key("person_by_phonetic_name", name),
+                                lambda cursor: queries.fetch_cpf_by_phonetic_name(name, cursor))
+        if rows:
+            return json_response(g.timer.timed("serialize", encoders.CPF_ROW.results_body, rows))
+        else:
+            return jsonify({'error': 'Nome não encontrado'}), 404
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@app.route("/autocomplete-person-name/<prefix>", methods=['GET', 'OPTIONS'])
+@jwt_required()
+def autocomplete_person_name(prefix):
+    if request.method == 'OPTIONS':
+        return '', 200
+    try:
+        limit = queries.parse_autocomplete_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        # Fora do cache de resultados: a busca no índice de nome normalizado custa menos que a ida ao cache
+        with DATABASES.acquire() as databases:
+            names = g.timer.timed("sql", queries.fetch_name_autocomplete, prefix, databases.cursor_cpf(), limit)
+        return jsonify({'results': names}), 200
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
 @app.route("/get-person-by-cpf/<cpf>", methods=['GET', 'OPTIONS'])
 @jwt_required()
 def get_person_by_cpf(cpf):
     if request.method == 'OPTIONS':
         return '', 200
-    cpf_db_path = os.environ.get('CPF_DB_PATH', 'db/basecpf.db')
     try:
-        conn_cpf = sqlite3.connect(cpf_db_path)
-        cursor_cpf = conn_cpf.cursor()
-        cursor_cpf.execute("SELECT * FROM cpf WHERE cpf = ?", (cpf,))
-        results = cursor_cpf.fetchall()
-        conn_cpf.close()
-        if results:
-            cpf_list = []
-            for row in results:
-                cpf_info = {
-                    'cpf': row[0],
-                    'nome': row[1],
-                    'sexo': row[2],
-                    'nasc': row[3]
-                }
-                cpf_list.append(cpf_info)
-            return jsonify({'results': cpf_list}), 200
+        rows = cached_cpf_query(cache.make_key("person_by_cpf", cpf),
+                                lambda cursor: queries.fetch_cpf_by_cpf(cpf, cursor))
+        if rows:
+            return json_response(g.timer.timed("serialize", encoders.CPF_ROW.results_body, rows))
         else:
             return jsonify({'error': 'CPF não encontrado'}), 404
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@app.route("/get-person-by-cpf-batch", methods=['POST', 'OPTIONS'])
+@jwt_required()
+def get_person_by_cpf_batch():
+    if request.method == 'OPTIONS':
+        return '', 200
+    if (request.content_length or 0) > MAX_BATCH_BODY_SIZE:
+        return jsonify({'error': f'Corpo da requisição acima de {MAX_BATCH_BODY_SIZE} bytes'}), 413
+    try:
+        cpfs = queries.parse_cpf_batch(request.get_data())
+    except queries.BatchTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # O gerador roda depois que a view retorna, fora do contexto da requisição
+    timer = g.timer
+
+    def generate():
+        # A conexão do pool fica reservada enquanto a resposta é transmitida
+        with DATABASES.acquire() as databases:
+            cursor_cpf = databases.cursor_cpf()
+            try:
+                batches = timer.timed_iter("sql", queries.iter_cpf_batches(cpfs, cursor_cpf))
+                yield from timer.timed_iter("serialize", encoders.cpf_batch_payloads(batches))
+            finally:
+                cursor_cpf.close()
+
+    return Response(generate(), mimetype='application/json')
 
 @app.route("/get-person-cnpj-by-name-and-cpf/<name>/<cpf>", methods=['GET', 'OPTIONS'])
 def get_person_cnpj_by_name_and_cpf(name, cpf):
     if request.method == 'OPTIONS':
         return '', 200
-    cnpj_db_path = os.environ.get('CNPJ_DB_PATH', 'db/cnpj.db')
     try:
-        conn_cnpj = sqlite3.connect(cnpj_db_path)
-        cursor_cnpj = conn_cnpj.cursor()
-        cursor_cnpj.execute(
-            "SELECT cnpj FROM socios WHERE (nome_socio LIKE UPPER(?) OR nome_representante LIKE UPPER(?)) AND cnpj_cpf_socio LIKE ?",
-            ('%' + name + '%', '%' + name + '%', '%' + cpf[3:-2] + '%')
-        )
-        cnpj_rows = cursor_cnpj.fetchall()
-        if not cnpj_rows:
-            conn_cnpj.close()
+        # Estabelecimentos, empresas e municípios buscados em lote: número fixo de consultas
+        results = cached_cnpj_query(cache.make_key("cnpj_by_partner", name, cpf),
+                                    lambda cursor: queries.search_cnpj_by_partner(name, cpf, cursor, CODE_TABLES))
+        if results is None:
             return jsonify({'error': 'Nome não encontrado'}), 404
-        cnpj_list = [row[0] for row in cnpj_rows]
-        results = []
-        for cnpj in cnpj_list:
-            cursor_cnpj.execute(
-                "SELECT cnpj, nome_fantasia, tipo_logradouro, logradouro, numero, complemento, bairro, municipio, uf, cep, ddd1, telefone1, correio_eletronico FROM estabelecimento WHERE cnpj = ?",
-                (cnpj,)
-            )
-            est = cursor_cnpj.fetchone()
-            if est:
-                cnpj_basico = est[0][:8]
-                cursor_cnpj.execute(
-                    "SELECT razao_social FROM empresas WHERE cnpj_basico = ?",
-                    (cnpj_basico,)
-                )
-                emp = cursor_cnpj.fetchone()
-                razao_social = emp[0]
-                municipio = est[7]
-                cursor_cnpj.execute(
-                    "SELECT descricao FROM municipio WHERE codigo = ?",
-                    (municipio,)
-                )
-                mun = cursor_cnpj.fetchone()
-                municipio = mun[0]
-                endereco = ', '.join(filter(None, [
-                    est[2], # tipo_logradouro
-                    est[3], # logradouro
-                    est[4], # numero
-                    est[5], # complemento
-                    est[6], # bairro
-                    municipio, # municipio
-                    est[8], # uf
-                    est[9]  # cep
-                ]))
-                telefone = ', '.join(filter(None, [
-                    est[10], # ddd
-                    est[11]  # telefone
-                ]))
-                results.append({
-                    'cnpj': est[0],
-                    'nome_fantasia': est[1],
-                    'razao_social': razao_social,
-                    'endereço': endereco,
-                    'telefone': telefone,
-                    'email': est[12]
-                })
-        conn_cnpj.close()
         if results:
             return jsonify({'results': results}), 200
         else:
@@ -224,70 +394,9 @@ def get_person_cnpj_by_name_and_cpf(name, cpf):
 def get_person_cnpj_by_cnpj(cnpj):
     if request.method == 'OPTIONS':
         return '', 200
-    cnpj_db_path = os.environ.get('CNPJ_DB_PATH', 'db/cnpj.db')
     try:
-        conn_cnpj = sqlite3.connect(cnpj_db_path)
-        cursor_cnpj = conn_cnpj.cursor()
-        cursor_cnpj.execute(
-            "SELECT cnpj, nome_fantasia, tipo_logradouro, logradouro, numero, complemento, bairro, municipio, uf, cep, ddd1, telefone1, correio_eletronico FROM estabelecimento WHERE cnpj = ?",
-            (cnpj,)
-        )
-        results = cursor_cnpj.fetchall()
-        cnpj_list = []
-        for row in results:
-            # Get socios
-            cursor_cnpj.execute(
-                "SELECT nome_socio, nome_representante, cnpj_cpf_socio FROM socios WHERE cnpj = ?",
-                (row[0],)
-            )
-            print(cnpj)
-            socios = cursor_cnpj.fetchall()
-            socios_list = [
-                {
-                    'nome_socio': s[0],
-                    'nome_representante': s[1],
-                    'cnpj_cpf_socio': s[2]
-                } for s in socios
-            ]
-            cursor_cnpj.execute(
-                "SELECT descricao FROM municipio WHERE codigo = ?",
-                (row[7],)
-            )
-            mun = cursor_cnpj.fetchone()
-            municipio = mun[0]
-            cnpj_basico = row[0][:8]
-            cursor_cnpj.execute(
-                "SELECT razao_social FROM empresas WHERE cnpj_basico = ?",
-                (cnpj_basico,)
-            )
-            emp = cursor_cnpj.fetchone()
-            razao_social = emp[0]
-            endereco = ', '.join(filter(None, [
-                row[2],  # tipo_logradouro
-                row[3],  # logradouro
-                row[4],  # numero
-                row[5],  # complemento
-                row[6],  # bairro
-                municipio,  # municipio
-                row[8],  # uf
-                row[9]   # cep
-            ]))
-            telefone = ', '.join(filter(None, [
-                row[10],  # ddd1
-                row[11]   # telefone1
-            ]))
-            cnpj_info = {
-                'cnpj': row[0],
-                'nome_fantasia': row[1],
-                'razao_social': razao_social,
-                'endereco': endereco,
-                'telefone': telefone,
-                'email': row[12],
-                'uf': row[8],
-                'socios': socios_list
-            }
-            cnpj_list.append(cnpj_info)
-        conn_cnpj.close()
+        cnpj_list = cached_cnpj_query(cache.make_key("cnpj_with_partners", cnpj),
+                                      lambda cursor: queries.search_cnpj_with_partners(cnpj, cursor, CODE_TABLES))
         if cnpj_list:
             return jsonify({'results': cnpj_list}), 200
         else:
@@ -297,8 +406,7 @@ def get_person_cnpj_by_cnpj(cnpj):
 
 def create_ssl_context():
     try:
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain('server.crt', 'server.key')
+        context = tls.create_server_context('server.crt', 'server.key', HANDSHAKE_STATS, METRICS)
         print("Certificados encontrados, usando SSL")
         return context
     except FileNotFoundError:
@@ -308,13 +416,37 @@ def create_ssl_context():
 if __name__ == "__main__":
     host = os.environ.get("FLASK_RUN_HOST", "127.0.0.1")
     port = int(os.environ.get("FLASK_RUN_PORT", "5000"))
+    # Logs JSON escritos por uma thread em segundo plano (LOG_FILE, LOG_LEVEL, LOG_SAMPLE=INFO=0.1,...);
+    # a linha de acesso do werkzeug dá lugar à nossa, com os tempos de cada fase
+    log_queue, log_listener = logs.start_writer(os.environ.get("LOG_FILE") or None)
+    logs.configure(log_queue, os.environ.get("LOG_LEVEL", "INFO"), logs.parse_sample_rates(os.environ.get("LOG_SAMPLE")),
+                   loggers=(logs.LOGGER, "werkzeug"))
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    # PLAN_CHECK=strict recusa iniciar se alguma consulta fizer varredura completa
+    plancheck.check_query_plans(os.environ.get("PLAN_CHECK", "warn"), CPF_DB_PATH, CNPJ_DB_PATH)
     ssl_context = create_ssl_context()
-    print(f"Servidor Flask iniciando em https://{host}:{port}")
-    app.run(
-        host=host,
-        port=port,
-        debug=True,
-        threaded=True,
-        use_reloader=False,
-        ssl_context=ssl_context
-    )
+    print(f"Servidor Flask iniciando em https://{host}:{port} (modo {SERVER_MODE})")
+    try:
+        if SERVER_MODE == 'development':
+            app.run(
+                host=host,
+                port=port,
+                debug=True,
+                threaded=True,
+                use_reloader=False,
+                ssl_context=ssl_context
+            )
+        else:
+            # FLASK_WORKERS processos x FLASK_THREADS threads; cada worker recomeça após FLASK_MAX_REQUESTS requisições
+            server = wsgiserver.PreforkWSGIServer(
+                app, host, port,
+                workers=WORKERS,
+                threads=THREADS,
+                ssl_context=generate_adhoc_ssl_context() if ssl_context == 'adhoc' else ssl_context,
+                max_requests=int(os.environ.get('FLASK_MAX_REQUESTS', '10000')),
+                on_worker_start=METRICS.bind,
+                on_worker_exit=lambda slot: PASSWORDS.shutdown()
+            )
+            server.serve_forever()
+    finally:
+        logs.stop_writer(log_listener)
@@ -6,12 +6,13 @@ import subprocess
 import sys
 
 class FlaskServerThread(QtCore.QThread):
-    def __init__(self, host, port, cpf_db, cnpj_db):
+    def __init__(self, host, port, cpf_db, cnpj_db, workers=None):
         super().__init__()
         self.host = host
         self.port = port
         self.cpf_db = cpf_db
         self.cnpj_db = cnpj_db
+        self.workers = workers
         self.process = None
 
     def run(self):
@@ -20,13 +21,18 @@ class FlaskServerThread(QtCore.QThread):
         env['FLASK_RUN_PORT'] = str(self.port)
         env['CPF_DB_PATH'] = self.cpf_db
         env['CNPJ_DB_PATH'] = self.cnpj_db
+        # Modo de produção: vários processos com um pool de threads cada (ver wsgiserver.py)
+        env['FLASK_SERVER_MODE'] = 'production'
+        if self.workers:
+            env['FLASK_WORKERS'] = str(self.workers)
         self.process = subprocess.Popen([sys.executable, 'flask-server.py'], env=env)
 
     def stop(self):
         if self.process:
+            # SIGTERM: os workers terminam as requisições em curso antes de sair
             self.process.terminate()
             try:
-                self.process.wait(timeout=3)
+                self.process.wait(timeout=15)
             except subprocess.TimeoutExpired:
                 self.process.kill()
                 self.process.wait()
@@ -76,6 +82,12 @@ class Window(QtWidgets.QWidget):
         self.port_field.setPlaceholderText("Port")
         self.port_field.setValidator(QtGui.QIntValidator(1, 65535, self))
 
+        # Worker processes field
+        self.workers_field = QtWidgets.QSpinBox()
+        self.workers_field.setRange(1, 64)
+        self.workers_field.setValue(os.cpu_count() or 1)
+        self.workers_field.setPrefix("Workers: ")
+
         # Buttons
         self.start_server_button = QtWidgets.QPushButton("Start Server")
         self.stop_server_button = QtWidgets.QPushButton("Stop Server")
@@ -98,6 +110,7 @@ class Window(QtWidgets.QWidget):
         hostport_layout = QtWidgets.QHBoxLayout()
         hostport_layout.addWidget(self.interface_combo)
         hostport_layout.addWidget(self.port_field)
+        hostport_layout.addWidget(self.workers_field)
 
         error_layout = QtWidgets.QHBoxLayout()
         error_layout.addWidget(self.error_label)
@@ -183,7 +196,8 @@ class Window(QtWidgets.QWidget):
             self.selected_host,
             self.selected_port,
             self.selected_cpf_db,
-            self.selected_cnpj_db
+            self.selected_cnpj_db,
+            self.workers_field.value()
         )
         self.server_thread.start()
         self.start_server_button.setEnabled(False)
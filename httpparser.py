@@ -0,0 +1,159 @@
+import urllib.parse
+
+# Limites de uma requisição: cabeçalhos e corpo (POST em lote)
+MAX_HEADER_SIZE = 65536
+MAX_BODY_SIZE = 1 << 20
+
+class BadRequest(ValueError):
+    """Requisição HTTP malformada; `status` é a linha de status da resposta de erro."""
+    status = "400 Bad Request"
+
+class HeadersTooLarge(BadRequest):
+    status = "431 Request Header Fields Too Large"
+
+class PayloadTooLarge(BadRequest):
+    """Corpo da requisição acima do limite aceito."""
+    status = "413 Payload Too Large"
+
+class Request:
+    __slots__ = ("method", "target", "path", "query_string", "version", "headers", "body", "keep_alive")
+
+    def __init__(self, method, target, version, headers, body=b""):
+        self.method = method
+        self.target = target
+        self.path, _, self.query_string = target.partition("?")
+        self.version = version
+        self.headers = headers
+        self.body = body
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            self.keep_alive = "keep-alive" in connection
+        else:
+            self.keep_alive = "close" not in connection
+
+    @property
+    def request_line(self):
+        return f"{self.method} {self.target} {self.version}"
+
+    def query(self):
+        # Mantém só o primeiro valor de cada parâmetro
+        if not self.query_string:
+            return {}
+        return {key: values[0] for key, values in urllib.parse.parse_qs(self.query_string).items()}
+
+def parse_head(head):
+    """Linha de requisição e cabeçalhos (sem o \\r\\n\\r\\n final); nomes de cabeçalho em minúsculas."""
+    lines = head.decode("utf-8", errors="replace").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) != 3 or not parts[0] or not parts[1].startswith(("/", "*")) or not parts[2].startswith("HTTP/1."):
+        raise BadRequest(f"Malformed request line: {lines[0][:100]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if not sep or not name or name[-1] in " \t":
+            raise BadRequest(f"Malformed header line: {line[:100]!r}")
+        headers[name.lower()] = value.strip()
+    return Request(parts[0], parts[1], parts[2], headers)
+
+class RequestParser:
+    """Parser HTTP/1.1 incremental: recebe os bytes como chegarem da rede e devolve requisições completas.
+
+    Uma requisição pode chegar em vários segmentos e um segmento pode trazer várias (pipelining);
+    o que sobra fica no buffer para a próxima chamada.
+    """
+
+    def __init__(self, max_header_size=MAX_HEADER_SIZE, max_body_size=MAX_BODY_SIZE):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.buffer = bytearray()
+        self._pending = None
+        self._body_length = 0
+        self._scanned = 0
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next_request(self):
+        """Próxima requisição completa, ou None se ainda faltam bytes. Levanta BadRequest."""
+        if self._pending is None:
+            # Retoma a busca do fim dos cabeçalhos de onde parou, sem reler o buffer inteiro
+            end = self.buffer.find(b"\r\n\r\n", max(0, self._scanned - 3))
+            if end < 0:
+                if len(self.buffer) > self.max_header_size:
+                    raise HeadersTooLarge(f"Request headers larger than {self.max_header_size} bytes")
+                self._scanned = len(self.buffer)
+                return None
+            if end > self.max_header_size:
+                raise HeadersTooLarge(f"Request headers larger than {self.max_header_size} bytes")
+
+            request = parse_head(bytes(self.buffer[:end]))
+            del self.buffer[:end + 4]
+            self._scanned = 0
+
+            if "transfer-encoding" in request.headers:
+                raise BadRequest("Chunked request bodies are not supported; send Content-Length")
+            length = request.headers.get("content-length", "0")
+            if not length.isdigit():
+                raise BadRequest(f"Invalid Content-Length: {length[:20]!r}")
+            length = int(length)
+            if length > self.max_body_size:
+                raise PayloadTooLarge(f"Request body too large: {length} bytes (maximum {self.max_body_size})")
+            self._pending, self._body_length = request, length
+
+        if len(self.buffer) < self._body_length:
+            return None
+        request, self._pending = self._pending, None
+        if self._body_length:
+            request.body = bytes(self.buffer[:self._body_length])
+            del self.buffer[:self._body_length]
+        return request
+
+class Router:
+    """Tabela de rotas pré-compilada: cada requisição é resolvida com até dois acessos a dicts.
+
+    Entradas: (método, caminho, rota). "*" como caminho aceita qualquer caminho do método; um
+    caminho terminado em "/" recebe o restante como parâmetro (decodificado), opcionalmente validado.
+    """
+
+    def __init__(self, table, fallback="invalid"):
+        self.fallback = fallback
+        self._any_path = {}
+        self._exact = {}
+        self._prefixed = {}
+        # Métodos aceitos em cada caminho (ou prefixo), para distinguir 405 de 404
+        self._methods = {}
+        for method, path, route, *validate in table:
+            if path == "*":
+                self._any_path[method] = route
+                continue
+            elif path.endswith("/"):
+                self._prefixed[(method, path)] = (route, validate[0] if validate else None)
+            else:
+                self._exact[(method, path)] = route
+            self._methods.setdefault(path, set()).add(method)
+        self.routes = tuple(dict.fromkeys(entry[2] for entry in table)) + (fallback,)
+
+    def match(self, method, path):
+        """(rota, parâmetro) da requisição; rotas desconhecidas caem em `fallback`."""
+        route = self._any_path.get(method) or self._exact.get((method, path))
+        if route:
+            return route, None
+        slash = path.find("/", 1)
+        if slash > 0:
+            entry = self._prefixed.get((method, path[:slash + 1]))
+            if entry and slash + 1 < len(path):
+                route, validate = entry
+                param = urllib.parse.unquote_plus(path[slash + 1:])
+                if validate is None or validate(param):
+                    return route, param
+        return self.fallback, None
+
+    def allowed_methods(self, path):
+        """Métodos com rota para o caminho, em ordem; vazio quando nenhuma rota atende o caminho."""
+        methods = self._methods.get(path)
+        if methods is None:
+            slash = path.find("/", 1)
+            methods = self._methods.get(path[:slash + 1]) if slash > 0 else None
+        if not methods:
+            return []
+        return sorted(methods | set(self._any_path))
@@ -0,0 +1,154 @@
+import argparse
+import sqlite3
+import time
+import phonetic
+import plancheck
+import queries
+
+def build_name_fts(cpf_db):
+    """Cria (ou recria) o índice FTS5 trigram usado pela busca por parte do nome."""
+    conn = sqlite3.connect(cpf_db)
+    try:
+        start = time.time()
+        table = queries.NAME_FTS_TABLE
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        # Tabela de conteúdo externo: o índice guarda só os trigramas e lê os nomes da própria tabela cpf
+        conn.execute(
+            f"CREATE VIRTUAL TABLE {table} USING fts5("
+            "nome, content='cpf', content_rowid='rowid', tokenize='trigram', detail='none')"
+        )
+        conn.execute(f"INSERT INTO {table}({table}) VALUES('rebuild')")
+        conn.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+        conn.commit()
+        print(f"[INDEXER] {table} built in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+def build_normalized_name(cpf_db, batch_size=500000):
+    """Adiciona a coluna de nome normalizado ao cpf, preenche em lotes e cria o índice B-tree."""
+    conn = sqlite3.connect(cpf_db)
+    try:
+        start = time.time()
+        column = queries.NORMALIZED_NAME_COLUMN
+        cursor = conn.cursor()
+        if not queries.column_exists(cursor, 'cpf', column):
+            conn.execute(f"ALTER TABLE cpf ADD COLUMN {column} TEXT")
+            conn.commit()
+
+        conn.create_function("normalize_name", 1, queries.normalize_name, deterministic=True)
+
+        # Lotes por faixa de rowid para manter o journal pequeno em bases grandes
+        max_rowid = conn.execute("SELECT max(rowid) FROM cpf").fetchone()[0] or 0
+        for low in range(0, max_rowid + 1, batch_size):
+            conn.execute(
+                f"UPDATE cpf SET {column} = normalize_name(nome) WHERE rowid > ? AND rowid <= ?",
+                (low, low + batch_size)
+            )
+            conn.commit()
+            print(f"[INDEXER] {column}: {min(low + batch_size, max_rowid)}/{max_rowid} rows")
+
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {queries.NORMALIZED_NAME_INDEX} ON cpf({column})")
+        conn.commit()
+        print(f"[INDEXER] {queries.NORMALIZED_NAME_INDEX} built in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+def build_phonetic_index(cpf_db, batch_size=500000):
+    """Cria (ou recria) a tabela de chaves fonéticas por palavra do nome, usada pela busca fonética."""
+    conn = sqlite3.connect(cpf_db)
+    try:
+        start = time.time()
+        table = queries.PHONETIC_NAME_TABLE
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} (chave TEXT NOT NULL, cpf_rowid INTEGER NOT NULL, "
+                     "PRIMARY KEY (chave, cpf_rowid)) WITHOUT ROWID")
+        # As chaves são calculadas em Python e acumuladas numa tabela temporária; a tabela final é
+        # preenchida já na ordem da chave primária, o que evita inserções espalhadas pela árvore
+        conn.execute("CREATE TEMP TABLE phonetic_staging (chave TEXT, cpf_rowid INTEGER)")
+        max_rowid = conn.execute("SELECT max(rowid) FROM cpf").fetchone()[0] or 0
+        for low in range(0, max_rowid + 1, batch_size):
+            rows = conn.execute("SELECT rowid, nome FROM cpf WHERE rowid > ? AND rowid <= ?", (low, low + batch_size))
+            conn.executemany("INSERT INTO phonetic_staging VALUES (?, ?)", (
+                (key, rowid) for rowid, nome in rows for key in phonetic.name_keys(nome)
+            ))
+            print(f"[INDEXER] {table}: {min(low + batch_size, max_rowid)}/{max_rowid} rows")
+        conn.execute(f"INSERT INTO {table} SELECT chave, cpf_rowid FROM phonetic_staging ORDER BY chave, cpf_rowid")
+        conn.execute("DROP TABLE phonetic_staging")
+        conn.execute(f"ANALYZE {table}")
+        conn.commit()
+        print(f"[INDEXER] {table} built in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+# Índices B-tree exigidos pelas consultas dos servidores (conferidos na inicialização por plancheck.py)
+CPF_INDEXES = {
+    "idx_cpf_cpf": ("cpf", "cpf"),
+}
+CNPJ_INDEXES = {
+    "idx_socios_cnpj": ("socios", "cnpj"),
+    # Cobre a busca por sócio: o LIKE com curinga inicial percorre só este índice, não a tabela
+    "idx_socios_partner": ("socios", "cnpj_cpf_socio, nome_socio, nome_representante, cnpj"),
+    "idx_estabelecimento_cnpj": ("estabelecimento", "cnpj"),
+    "idx_empresas_cnpj_basico": ("empresas", "cnpj_basico"),
+    "idx_municipio_codigo": ("municipio", "codigo"),
+}
+
+def build_indexes(db_path, indexes):
+    """Cria os índices que faltam e atualiza as estatísticas do planejador (ANALYZE)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        for name, (table, columns) in indexes.items():
+            if not queries.table_exists(cursor, table):
+                print(f"[INDEXER] {db_path}: table {table} not found, skipping {name}")
+                continue
+            start = time.time()
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+            conn.commit()
+            print(f"[INDEXER] {name} ready in {time.time() - start:.1f}s")
+        start = time.time()
+        conn.execute("ANALYZE")
+        conn.commit()
+        print(f"[INDEXER] {db_path}: ANALYZE done in {time.time() - start:.1f}s")
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Construção offline de índices para os bancos CPF/CNPJ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fts_parser = subparsers.add_parser("fts", help="índice FTS5 trigram para busca por parte do nome")
+    fts_parser.add_argument("--cpf-db", default="db/basecpf.db")
+
+    normalized_parser = subparsers.add_parser("normalized", help="coluna de nome normalizado com índice B-tree")
+    normalized_parser.add_argument("--cpf-db", default="db/basecpf.db")
+
+    phonetic_parser = subparsers.add_parser("phonetic", help="chaves fonéticas por palavra do nome (busca fonética)")
+    phonetic_parser.add_argument("--cpf-db", default="db/basecpf.db")
+
+    indexes_parser = subparsers.add_parser("indexes", help="índices B-tree das consultas por chave e ANALYZE")
+    indexes_parser.add_argument("--cpf-db", default="db/basecpf.db")
+    indexes_parser.add_argument("--cnpj-db", default="db/cnpj.db")
+
+    check_parser = subparsers.add_parser("check", help="confere os planos de consulta (EXPLAIN QUERY PLAN)")
+    check_parser.add_argument("--cpf-db", default="db/basecpf.db")
+    check_parser.add_argument("--cnpj-db", default="db/cnpj.db")
+
+    args = parser.parse_args()
+
+    # Os servidores reabrem as conexões imutáveis quando o arquivo muda; reconstrua numa cópia e substitua com mv
+    if args.command == "fts":
+        build_name_fts(args.cpf_db)
+    elif args.command == "normalized":
+        build_normalized_name(args.cpf_db)
+    elif args.command == "phonetic":
+        build_phonetic_index(args.cpf_db)
+    elif args.command == "indexes":
+        build_indexes(args.cpf_db, CPF_INDEXES)
+        build_indexes(args.cnpj_db, CNPJ_INDEXES)
+    elif args.command == "check":
+        if plancheck.check_query_plans("warn", args.cpf_db, args.cnpj_db):
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
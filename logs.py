@@ -0,0 +1,94 @@
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import random
+import sys
+import time
+
+# Logger dos servidores e o de acesso (uma linha por requisição)
+LOGGER = "server"
+ACCESS_LOGGER = "server.access"
+access_log = logging.getLogger(ACCESS_LOGGER)
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON compacta por registro; os campos de `extra={"fields": {...}}` entram na linha."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+class LevelSampler(logging.Filter):
+    """Mantém só uma fração dos registros de cada nível; níveis sem taxa passam todos."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelname, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+def parse_sample_rates(spec):
+    """'INFO=0.1,DEBUG=0' -> {'INFO': 0.1, 'DEBUG': 0.0}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        level, _, rate = item.partition("=")
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+        rate = float(rate)
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"Sample rate for {level} must be between 0 and 1")
+        rates[level] = rate
+    return rates
+
+def start_writer(path=None):
+    """Inicia o escritor em segundo plano; retorna (fila, listener). Chamar uma vez, no processo principal."""
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    # A fila de multiprocessing é herdada pelos workers; cada um só enfileira, sem I/O no caminho da requisição
+    queue = multiprocessing.Queue(-1)
+    listener = logging.handlers.QueueListener(queue, handler)
+    listener.start()
+    return queue, listener
+
+def stop_writer(listener):
+    # Esvazia a fila antes de encerrar
+    if listener is not None:
+        listener.stop()
+
+def configure(queue, level="INFO", sample_rates=None, loggers=(LOGGER,)):
+    """Direciona os loggers deste processo para a fila do escritor (idempotente; repetir em cada worker)."""
+    handler = logging.handlers.QueueHandler(queue)
+    if sample_rates:
+        handler.addFilter(LevelSampler(sample_rates))
+    for name in loggers:
+        logger = logging.getLogger(name)
+        logger.handlers[:] = [handler]
+        logger.setLevel(level)
+        logger.propagate = False
+
+def log_access(request_line, peer, timer):
+    """Linha de acesso da requisição, com o tempo total e o de cada fase em milissegundos."""
+    if not access_log.isEnabledFor(logging.INFO):
+        return
+    access_log.info(request_line, extra={"fields": {
+        "route": timer.route,
+        "status": timer.status,
+        "error": timer.error,
+        "ms": round((time.perf_counter() - timer.start) * 1000, 3),
+        "sql_ms": round(timer.sql * 1000, 3),
+        "serialize_ms": round(timer.serialize * 1000, 3),
+        "send_ms": round(timer.send * 1000, 3),
+        "peer": peer,
+    }})
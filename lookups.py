@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import database
+
+# Tabelas de códigos do banco CNPJ: nome lógico -> (tabela, coluna do código, coluna da descrição).
+# Aceita o layout descrito em STRUCTURE (municipios id/desc, ...) e o consultado pelas rotas
+# Flask (municipio codigo/descricao); vale a primeira tabela existente, as ausentes são ignoradas
+CODE_TABLES = {
+    "municipio": (("municipio", "codigo", "descricao"), ("municipios", "id", "desc")),
+    "cnae": (("cnae", "codigo", "descricao"), ("cnaes", "id", "desc")),
+    "qualificacao": (("qualificacao_socio", "codigo", "descricao"), ("qualificacoes", "id", "desc")),
+    "pais": (("pais", "codigo", "descricao"), ("paises", "id", "desc")),
+    "motivo": (("motivo", "codigo", "descricao"), ("motivos", "id", "desc")),
+    "natureza": (("natureza_juridica", "codigo", "descricao"), ("naturezas", "id", "desc")),
+}
+
+class CodeTables:
+    """Tabelas de códigos do CNPJ em dicts na memória do processo.
+
+    Carregadas uma vez (antes do fork, as páginas ficam compartilhadas entre os workers) e
+    recarregadas quando uma conexão CNPJ é aberta num arquivo diferente (ver database.DatabaseManager):
+    as descrições trocam junto com as linhas consultadas.
+    """
+
+    def __init__(self, cnpj_db, tables=CODE_TABLES):
+        self.cnpj_db = cnpj_db
+        self.tables = tables
+        self._maps = {}
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        fingerprint = database.file_fingerprint(self.cnpj_db)
+        maps = {}
+        if fingerprint is not None:
+            # Conexão própria e descartável, aberta no arquivo atual
+            conn = database.connect_readonly(self.cnpj_db)
+            try:
+                existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                for name, candidates in self.tables.items():
+                    found = [candidate for candidate in candidates if candidate[0] in existing]
+                    if not found:
+                        continue
+                    table, code_column, description_column = found[0]
+                    codes = {}
+                    try:
+                        for codigo, descricao in conn.execute(
+                            f'SELECT "{code_column}", "{description_column}" FROM {table} ORDER BY rowid'
+                        ):
+                            # O primeiro registro de cada código prevalece, como numa consulta por código
+                            codes.setdefault(str(codigo), descricao)
+                    except sqlite3.Error as e:
+                        print(f"[LOOKUPS] Skipping {table}: {e}")
+                        continue
+                    maps[name] = codes
+            finally:
+                conn.close()
+
+        # Troca atômica: leitores em outras threads veem os mapas antigos ou os novos, nunca parciais
+        self._maps = maps
+        self._fingerprint = fingerprint
+        print(f"[LOOKUPS] Loaded {', '.join(f'{t} ({len(m)})' for t, m in maps.items()) or 'no code tables'}")
+
+    def sync(self, fingerprint):
+        """Recarrega os mapas se a conexão CNPJ foi aberta num arquivo com outro fingerprint."""
+        if fingerprint is None or fingerprint == self._fingerprint:
+            return
+        # As demais threads esperam a recarga em vez de decodificar linhas novas com os mapas antigos
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                print(f"[LOOKUPS] {self.cnpj_db} changed, reloading code tables")
+                self.load()
+
+    def describe(self, table, code):
+        """Descrição do código, ou None quando o código ou a tabela não existem."""
+        if code is None:
+            return None
+        return self._maps.get(table, {}).get(str(code))
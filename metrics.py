@@ -0,0 +1,177 @@
+import bisect
+import contextlib
+import multiprocessing
+import threading
+import time
+
+# Limites superiores (segundos) dos buckets dos histogramas de latência
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Fases de uma requisição; "total" vai da requisição lida até a resposta enviada
+PHASES = ("total", "sql", "serialize", "send")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class RequestTimer:
+    """Tempo de cada fase de uma requisição, em segundos.
+
+    Cada fase conta só o próprio tempo: uma serialização que puxa linhas do cursor
+    não inclui o tempo do SQL, que vai para a fase "sql".
+    """
+
+    __slots__ = ("start", "route", "status", "error", "sql", "serialize", "send")
+
+    def __init__(self, route="invalid"):
+        self.start = time.perf_counter()
+        self.route = route
+        self.status = 200
+        self.error = False
+        self.sql = self.serialize = self.send = 0.0
+
+    def _add(self, phase, start, inner):
+        nested = self.sql + self.serialize + self.send - inner
+        setattr(self, phase, getattr(self, phase) + time.perf_counter() - start - nested)
+
+    def timed(self, phase, func, *args):
+        start = time.perf_counter()
+        inner = self.sql + self.serialize + self.send
+        try:
+            return func(*args)
+        finally:
+            self._add(phase, start, inner)
+
+    def timed_iter(self, phase, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            inner = self.sql + self.serialize + self.send
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._add(phase, start, inner)
+                return
+            self._add(phase, start, inner)
+            yield item
+
+# Para chamadas fora de uma requisição medida: os tempos acumulados são descartados
+DISCARD = RequestTimer()
+
+class Metrics:
+    """Contadores e histogramas de latência por rota, agregados entre processos.
+
+    Cada processo escreve apenas no seu slot de memória compartilhada (um por worker),
+    então o caminho quente não disputa locks entre processos; `threaded=True` protege
+    o slot quando várias threads do mesmo processo registram requisições.
+    """
+
+    def __init__(self, routes, slots=1, threaded=False):
+        # A última rota recebe as requisições de rotas desconhecidas
+        self.routes = tuple(routes)
+        self._route_index = {route: i for i, route in enumerate(self.routes)}
+        width = len(BUCKETS) + 1
+        series = len(self.routes) * len(PHASES)
+        # Por slot: [requisições, erros] por rota, buckets de cada (rota, fase) e buckets do handshake TLS
+        self._histograms = len(self.routes) * 2
+        self._handshakes = self._histograms + series * width
+        self._slot_size = self._handshakes + width
+        self._sum_size = series + 1
+        self._counts = multiprocessing.RawArray('Q', slots * self._slot_size)
+        self._sums = multiprocessing.RawArray('d', slots * self._sum_size)
+        self._in_flight = multiprocessing.RawArray('q', slots)
+        self.slots = slots
+        self.slot = 0
+        self._lock = threading.Lock() if threaded else contextlib.nullcontext()
+
+    def bind(self, slot):
+        """Associa o processo atual a um slot; um worker substituto zera o que o anterior deixou em andamento."""
+        self.slot = slot
+        self._in_flight[slot] = 0
+
+    def _observe(self, offset, sum_offset, seconds):
+        self._counts[offset + bisect.bisect_left(BUCKETS, seconds)] += 1
+        self._sums[sum_offset] += seconds
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight[self.slot] += 1
+
+    def request_finished(self, timer):
+        total = time.perf_counter() - timer.start
+        route = self._route_index.get(timer.route, len(self.routes) - 1)
+        base = self.slot * self._slot_size
+        sum_base = self.slot * self._sum_size + route * len(PHASES)
+        offset = base + self._histograms + route * len(PHASES) * (len(BUCKETS) + 1)
+        with self._lock:
+            self._in_flight[self.slot] -= 1
+            self._counts[base + route * 2] += 1
+            if timer.error:
+                self._counts[base + route * 2 + 1] += 1
+            for phase, seconds in enumerate((total, timer.sql, timer.serialize, timer.send)):
+                # Fases que não ocorreram (sem SQL no health, por exemplo) não entram no histograma
+                if phase == 0 or seconds > 0:
+                    self._observe(offset + phase * (len(BUCKETS) + 1), sum_base + phase, seconds)
+
+    def handshake(self, seconds):
+        with self._lock:
+            self._observe(self.slot * self._slot_size + self._handshakes,
+                          self.slot * self._sum_size + self._sum_size - 1, seconds)
+
+    def _totals(self):
+        # Soma os slots de todos os processos
+        counts = [0] * self._slot_size
+        sums = [0.0] * self._sum_size
+        for slot in range(self.slots):
+            for i, value in enumerate(self._counts[slot * self._slot_size:(slot + 1) * self._slot_size]):
+                counts[i] += value
+            for i, value in enumerate(self._sums[slot * self._sum_size:(slot + 1) * self._sum_size]):
+                sums[i] += value
+        return counts, sums, sum(self._in_flight[:])
+
+    @staticmethod
+    def _histogram_lines(name, labels, buckets, total):
+        lines = []
+        cumulative = 0
+        bucket_labels = labels + "," if labels else ""
+        for bound, count in zip(BUCKETS + ("+Inf",), buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{bucket_labels}le="{bound}"}} {cumulative}')
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{labels} {total}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+    def render(self, prefix="cpf_server"):
+        """Métricas no formato texto do Prometheus."""
+        counts, sums, in_flight = self._totals()
+        width = len(BUCKETS) + 1
+        lines = [
+            f"# HELP {prefix}_requests_total Requests handled, by route.",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        lines += [f'{prefix}_requests_total{{route="{route}"}} {counts[i * 2]}' for i, route in enumerate(self.routes)]
+        lines += [
+            f"# HELP {prefix}_request_errors_total Requests answered with an error status or not fully sent, by route.",
+            f"# TYPE {prefix}_request_errors_total counter",
+        ]
+        lines += [f'{prefix}_request_errors_total{{route="{route}"}} {counts[i * 2 + 1]}' for i, route in enumerate(self.routes)]
+        lines += [
+            f"# HELP {prefix}_requests_in_flight Requests being handled right now.",
+            f"# TYPE {prefix}_requests_in_flight gauge",
+            f"{prefix}_requests_in_flight {in_flight}",
+            f"# HELP {prefix}_request_duration_seconds Request latency by route and phase (total, sql, serialize, send).",
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+        ]
+        for i, route in enumerate(self.routes):
+            for p, phase in enumerate(PHASES):
+                offset = self._histograms + (i * len(PHASES) + p) * width
+                buckets = counts[offset:offset + width]
+                # Séries sem nenhuma observação ficam de fora
+                if any(buckets):
+                    lines += self._histogram_lines(f"{prefix}_request_duration_seconds",
+                                                   f'route="{route}",phase="{phase}"', buckets,
+                                                   sums[i * len(PHASES) + p])
+        lines += [
+            f"# HELP {prefix}_tls_handshake_duration_seconds TLS handshake latency.",
+            f"# TYPE {prefix}_tls_handshake_duration_seconds histogram",
+        ]
+        lines += self._histogram_lines(f"{prefix}_tls_handshake_duration_seconds", "",
+                                       counts[self._handshakes:self._handshakes + width], sums[-1])
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,69 @@
+import functools
+import re
+import unicodedata
+
+# Partículas ignoradas: "MARIA DA SILVA" e "MARIA SILVA" têm as mesmas chaves
+PARTICLES = frozenset({"D", "DA", "DAS", "DE", "DI", "DO", "DOS", "DU", "E"})
+
+# Palavras consideradas por busca (cada uma é uma junção na consulta); as excedentes são ignoradas
+MAX_KEYS = 8
+
+# Regras do português, aplicadas em ordem a cada palavra já em maiúsculas, sem acentos e com Ç trocado por S
+RULES = tuple((re.compile(pattern), replacement) for pattern, replacement in (
+    (r"[^A-Z]", ""),
+    (r"PH", "F"),                   # RAPHAEL / RAFAEL
+    (r"TH", "T"),                   # THIAGO / TIAGO
+    (r"S?CH|SH", "X"),              # CHAVIER / XAVIER
+    (r"LH", "L"),                   # CARVALHO / CARVALO
+    (r"NH", "N"),
+    (r"CK", "K"),
+    (r"Q", "K"),
+    (r"KU(?=[EIY])", "K"),          # QUEIROZ / KEIROZ
+    (r"G(?=[EIY])", "J"),           # GEOVANA / JEOVANA
+    (r"GU(?=[EIY])", "G"),          # GUERRA: G duro, o U não soa
+    (r"[SX]?C(?=[EIY])", "S"),      # CECILIA / SESILIA, NASCIMENTO / NASIMENTO
+    (r"C", "K"),                    # CARLOS / KARLOS
+    (r"Z", "S"),                    # SOUZA / SOUSA, LUIZ / LUIS
+    (r"W", "V"),                    # WALTER / VALTER
+    (r"Y", "I"),                    # THAYNA / TAINA
+    (r"H", ""),                     # HELENA / ELENA
+    (r"OU", "O"),                   # SOUSA / SOSA
+    (r"EI", "E"),                   # FERREIRA / FERRERA
+    (r"M(?=[^AEIOU]|$)", "N"),      # JOAQUIM / JOAQUIN
+    (r"E", "I"),                    # FELIPE / FILIPE
+    (r"O", "U"),                    # ANTONIO / ANTUNIU
+    (r"(.)\1+", r"\1"),             # RAFFAEL / RAFAEL
+))
+
+def strip_accents(text):
+    # Ç soa como S: trocado antes de a decomposição transformá-lo em C
+    text = text.upper().replace("Ç", "S")
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+# Nomes e sobrenomes se repetem muito: a indexação de milhões de nomes calcula poucas chaves distintas
+@functools.lru_cache(maxsize=1 << 16)
+def word_key(word):
+    """Chave fonética de uma palavra já sem acentos; vazia se não sobrar nenhuma letra."""
+    for pattern, replacement in RULES:
+        word = pattern.sub(replacement, word)
+    return word
+
+def name_keys(name):
+    """Chaves distintas das palavras do nome, na ordem em que aparecem, sem as partículas."""
+    if not name:
+        return []
+    keys = []
+    for word in strip_accents(name).split():
+        if word in PARTICLES:
+            continue
+        key = word_key(word)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+def matches(name, keys):
+    """Função SQL phonetic_match(nome, chaves separadas por espaço), usada quando o índice não existe."""
+    return set(keys.split()) <= set(name_keys(name))
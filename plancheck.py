@@ -0,0 +1,83 @@
+import sqlite3
+import database
+import queries
+
+# off: não verifica; warn: avisa e inicia; strict: recusa iniciar se alguma consulta fizer varredura completa
+PLAN_CHECK_MODES = ("off", "warn", "strict")
+
+class QueryPlanError(RuntimeError):
+    pass
+
+def cpf_statements(cursor):
+    """(nome, SQL, parâmetros de exemplo, motivo se a varredura é esperada) das consultas ao banco CPF."""
+    # Nomes curtos (< 3 caracteres) não usam o trigram e sempre percorrem a tabela
+    for name, clause_func, sample in (("by_name", queries.cpf_by_name_clause, "MARIA"),
+                                      ("by_exact_name", queries.cpf_by_exact_name_clause, "MARIA"),
+                                      ("by_phonetic_name", queries.cpf_by_phonetic_name_clause, "MARIA SOUZA")):
+        clause, params, rowid_expr, indexed_count = clause_func(sample, cursor)
+        yield f"cpf_{name}", f"SELECT cpf.cpf, cpf.nome, cpf.sexo, cpf.nasc {clause}", params, None
+        yield f"cpf_{name}_page", queries.page_sql(clause, rowid_expr), params + (0, 10), None
+        if indexed_count:
+            yield f"cpf_{name}_count", f"SELECT count(*) {clause}", params, None
+    yield ("cpf_autocomplete", *queries.autocomplete_query("MARIA", cursor), None)
+    yield "cpf_max_rowid", queries.MAX_ROWID_SQL, (), None
+    yield "cpf_by_cpf", queries.CPF_BY_CPF_SQL, ("00000000000",), None
+    yield "cpf_batch", queries.CPF_BATCH_SQL, ('["00000000000"]',), None
+
+def cnpj_statements(cursor):
+    """(nome, SQL, parâmetros de exemplo, motivo se a varredura é esperada) das consultas ao banco CNPJ."""
+    yield ("cnpj_partner", queries.PARTNER_CNPJ_SQL, ("%MARIA%", "%MARIA%", "%123456%"),
+           "LIKE com curinga inicial; o índice idx_socios_partner reduz a varredura ao índice de cobertura")
+    yield "cnpj_estabelecimento", queries.ESTABELECIMENTO_BY_CNPJ_SQL, ("00000000000100",), None
+    for columns, table, key_column in queries.GROUPED_LOOKUPS:
+        yield f"cnpj_{table}_grouped", queries.grouped_sql(columns, table, key_column), ('["00000000"]',), None
+
+def full_scans(cursor, sql, params):
+    # Linhas "SCAN <tabela>" do plano; tabelas virtuais (json_each, FTS5) e CTEs (o autocompletar) não contam
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [
+        row[3] for row in cursor.fetchall()
+        if row[3].startswith("SCAN ") and "VIRTUAL TABLE" not in row[3] and row[3].split()[1] in tables
+    ]
+
+def check_query_plans(mode, cpf_db=None, cnpj_db=None):
+    """Roda EXPLAIN QUERY PLAN nas consultas dos servidores; retorna a lista de problemas encontrados."""
+    if mode == "off":
+        return []
+    if mode not in PLAN_CHECK_MODES:
+        raise ValueError(f"Unknown plan check mode: {mode}")
+
+    problems = []
+    checks = [(path, statements) for path, statements in ((cpf_db, cpf_statements), (cnpj_db, cnpj_statements)) if path]
+    for path, statements in checks:
+        try:
+            conn = database.connect_readonly(path)
+        except (OSError, sqlite3.Error) as e:
+            problems.append(f"{path}: {e}")
+            continue
+        try:
+            cursor = conn.cursor()
+            for name, sql, params, expected in statements(cursor):
+                try:
+                    scans = full_scans(cursor, sql, params)
+                except sqlite3.Error as e:
+                    problems.append(f"{name}: {e}")
+                    continue
+                if scans and expected:
+                    print(f"[PLAN] {name}: full scan expected ({expected})")
+                    continue
+                problems.extend(f"{name}: {scan}" for scan in scans)
+        finally:
+            conn.close()
+
+    for problem in problems:
+        print(f"[PLAN] WARNING {problem}")
+    if problems:
+        print("[PLAN] Build the indexes with `python indexer.py indexes` (and `fts` / `normalized` / `phonetic` for the name searches)")
+        if mode == "strict":
+            raise QueryPlanError(f"{len(problems)} query plan problem(s); refusing to start")
+    else:
+        print(f"[PLAN] All queries use indexes ({', '.join(path for path, _ in checks)})")
+    return problems
@@ -1,58 +1,274 @@
 import sqlite3
 import json
+import base64
+import unicodedata
+import phonetic
 
-def search_cpf_by_exact_name(name, cursor):
-    name = name.upper()
-    cursor.execute(
-        "SELECT cpf, nome, sexo, nasc FROM cpf WHERE nome = ? COLLATE NOCASE",
-        (name,)
-    )
-    result = cursor.fetchall()
-    json_result = []
-    for row in result:
-        json_dict = {
-            'cpf': row[0],
-            'nome': row[1],
-            'sexo': row[2],
-            'nasc': row[3]
-        }
-        json_result.append(json_dict)
-    return json_result
+# Coluna com o nome normalizado e indexado, criada por `python indexer.py normalized`
+NORMALIZED_NAME_COLUMN = "nome_norm"
+NORMALIZED_NAME_INDEX = "idx_cpf_nome_norm"
+
+def normalize_name(name):
+    # Maiúsculas, sem acentos e com espaços colapsados
+    if name is None:
+        return None
+    if not name.isascii():
+        decomposed = unicodedata.normalize('NFKD', name)
+        name = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(name.upper().split())
+
+def column_exists(cursor, table, column):
+    cursor.execute("SELECT 1 FROM pragma_table_info(?) WHERE name = ?", (table, column))
+    return cursor.fetchone() is not None
+
+# Linhas por lote ao transmitir resultados em streaming
+STREAM_BATCH_SIZE = 1000
+
+def iter_batches(cursor, batch_size=STREAM_BATCH_SIZE):
+    # Lê o cursor em lotes: a memória fica limitada ao tamanho do lote
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
 
-def search_cpf_by_name(name, cursor):
+def cpf_by_exact_name_clause(name, cursor):
+    # Retorna (FROM/WHERE, parâmetros, expressão do rowid, se a contagem usa índice)
+    if column_exists(cursor, 'cpf', NORMALIZED_NAME_COLUMN):
+        # Busca pelo índice B-tree da coluna normalizada: ignora acentos e espaços repetidos
+        return f"FROM cpf WHERE cpf.{NORMALIZED_NAME_COLUMN} = ?", (normalize_name(name),), "cpf.rowid", True
+    return "FROM cpf WHERE cpf.nome = ? COLLATE NOCASE", (name.upper(),), "cpf.rowid", False
+
+def execute_cpf_by_exact_name(name, cursor):
+    clause, params, _, _ = cpf_by_exact_name_clause(name, cursor)
+    cursor.execute(f"SELECT cpf.cpf, cpf.nome, cpf.sexo, cpf.nasc {clause}", params)
+    return cursor
+
+def fetch_cpf_by_exact_name(name, cursor):
+    return execute_cpf_by_exact_name(name, cursor).fetchall()
+
+# Índice FTS5 (tokenizer trigram) sobre cpf.nome, criado por `python indexer.py fts`
+NAME_FTS_TABLE = "cpf_nome_fts"
+
+def table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,))
+    return cursor.fetchone() is not None
+
+def cpf_by_name_clause(name, cursor):
     name = name.upper()
-    cursor.execute(
-        "SELECT cpf, nome, sexo, nasc FROM cpf WHERE nome LIKE ?",
-        ('%' + name + '%',)
-    )
-    result = cursor.fetchall()
-    json_result = []
-    for row in result:
-        json_dict = {
-            'cpf': row[0],
-            'nome': row[1],
-            'sexo': row[2],
-            'nasc': row[3]
-        }
-        json_result.append(json_dict)
-    return json_result
+    # O trigram só indexa padrões com 3 ou mais caracteres; abaixo disso o LIKE direto é equivalente
+    if len(name) >= 3 and table_exists(cursor, NAME_FTS_TABLE):
+        return (
+            f"FROM {NAME_FTS_TABLE} CROSS JOIN cpf ON cpf.rowid = {NAME_FTS_TABLE}.rowid "
+            f"WHERE {NAME_FTS_TABLE}.nome LIKE ?",
+            ('%' + name + '%',), f"{NAME_FTS_TABLE}.rowid", False
+        )
+    return "FROM cpf WHERE cpf.nome LIKE ?", ('%' + name + '%',), "cpf.rowid", False
 
-def search_cpf_by_cpf(cpf, cursor):
-    cursor.execute(
-        "SELECT cpf, nome, sexo, nasc FROM cpf WHERE cpf = ?",
-        (cpf,)
+def execute_cpf_by_name(name, cursor):
+    clause, params, _, _ = cpf_by_name_clause(name, cursor)
+    cursor.execute(f"SELECT cpf.cpf, cpf.nome, cpf.sexo, cpf.nasc {clause}", params)
+    return cursor
+
+def fetch_cpf_by_name(name, cursor):
+    return execute_cpf_by_name(name, cursor).fetchall()
+
+# Chaves fonéticas de cada palavra do nome (phonetic.py), criadas por `python indexer.py phonetic`:
+# uma linha (chave, rowid do cpf) por palavra, com chave primária (chave, cpf_rowid)
+PHONETIC_NAME_TABLE = "cpf_nome_fonetico"
+
+def cpf_by_phonetic_name_clause(name, cursor):
+    keys = phonetic.name_keys(name)[:phonetic.MAX_KEYS]
+    if not keys:
+        # Nada para procurar (só partículas ou sem letras)
+        return "FROM cpf WHERE 0", (), "cpf.rowid", False
+    if table_exists(cursor, PHONETIC_NAME_TABLE):
+        # A primeira chave percorre a sua faixa do índice; cada uma das outras confirma o rowid com uma busca
+        # pela chave primária. Todas as palavras pedidas precisam estar no nome, em qualquer ordem.
+        table = PHONETIC_NAME_TABLE
+        joins = "".join(
+            f" JOIN {table} AS k{i} ON k{i}.chave = ? AND k{i}.cpf_rowid = k0.cpf_rowid" for i in range(1, len(keys))
+        )
+        return (
+            f"FROM {table} AS k0{joins} JOIN cpf ON cpf.rowid = k0.cpf_rowid WHERE k0.chave = ?",
+            tuple(keys[1:]) + (keys[0],), "k0.cpf_rowid", False
+        )
+    # Sem o índice: calcula as chaves de cada nome durante a varredura (phonetic_match, ver database.py)
+    return "FROM cpf WHERE phonetic_match(cpf.nome, ?)", (" ".join(keys),), "cpf.rowid", False
+
+def execute_cpf_by_phonetic_name(name, cursor):
+    clause, params, _, _ = cpf_by_phonetic_name_clause(name, cursor)
+    cursor.execute(f"SELECT cpf.cpf, cpf.nome, cpf.sexo, cpf.nasc {clause}", params)
+    return cursor
+
+def fetch_cpf_by_phonetic_name(name, cursor):
+    return execute_cpf_by_phonetic_name(name, cursor).fetchall()
+
+# Autocompletar: nomes distintos que começam com o prefixo digitado, em ordem alfabética e sempre com limite
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 20
+
+# Uma busca no índice por nome distinto: cada passo salta para o primeiro nome maior que o anterior, sem
+# percorrer as repetições (milhares de "MARIA DA SILVA" custam o mesmo que uma)
+AUTOCOMPLETE_SQL = (
+    "WITH RECURSIVE autocomplete(nome) AS ("
+    f"SELECT (SELECT {NORMALIZED_NAME_COLUMN} FROM cpf WHERE {NORMALIZED_NAME_COLUMN} >= ?1 "
+    f"AND {NORMALIZED_NAME_COLUMN} < ?2 ORDER BY {NORMALIZED_NAME_COLUMN} LIMIT 1) "
+    f"UNION ALL SELECT (SELECT {NORMALIZED_NAME_COLUMN} FROM cpf WHERE {NORMALIZED_NAME_COLUMN} > autocomplete.nome "
+    f"AND {NORMALIZED_NAME_COLUMN} < ?2 ORDER BY {NORMALIZED_NAME_COLUMN} LIMIT 1) "
+    "FROM autocomplete WHERE autocomplete.nome IS NOT NULL LIMIT ?3"
+    # Cada sugestão sai com a grafia do cadastro (acentos), lida de uma das linhas com aquele nome
+    f") SELECT (SELECT nome FROM cpf WHERE {NORMALIZED_NAME_COLUMN} = autocomplete.nome LIMIT 1) "
+    "FROM autocomplete WHERE autocomplete.nome IS NOT NULL"
+)
+# Sem a coluna normalizada: LIKE com o prefixo, percorrendo a tabela
+AUTOCOMPLETE_SCAN_SQL = "SELECT DISTINCT nome FROM cpf WHERE nome LIKE ? ESCAPE '\\' ORDER BY nome LIMIT ?"
+
+def parse_autocomplete_limit(limit):
+    if limit is None:
+        return AUTOCOMPLETE_LIMIT
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_AUTOCOMPLETE_LIMIT:
+        raise ValueError(f"'limit' must be between 1 and {MAX_AUTOCOMPLETE_LIMIT}")
+    return limit
+
+def autocomplete_prefix(text):
+    # Mesma normalização da coluna; um espaço no fim é mantido ("MARIA " não sugere "MARIANA")
+    prefix = normalize_name(text)
+    if prefix and text[-1].isspace():
+        prefix += " "
+    return prefix
+
+def autocomplete_query(prefix, cursor, limit=AUTOCOMPLETE_LIMIT):
+    # Retorna (SQL, parâmetros) para um prefixo já normalizado e não vazio
+    if column_exists(cursor, 'cpf', NORMALIZED_NAME_COLUMN):
+        # Faixa [prefixo, prefixo com o último caractere incrementado) do índice B-tree
+        return AUTOCOMPLETE_SQL, (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), limit)
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return AUTOCOMPLETE_SCAN_SQL, (escaped + "%", limit)
+
+def fetch_name_autocomplete(text, cursor, limit=AUTOCOMPLETE_LIMIT):
+    """Até `limit` nomes distintos que começam com `text`."""
+    prefix = autocomplete_prefix(text)
+    if not prefix:
+        return []
+    cursor.execute(*autocomplete_query(prefix, cursor, limit))
+    return [row[0] for row in cursor.fetchall()]
+
+# Paginação por chave (keyset) sobre o rowid: cada página é uma busca a partir do último rowid visto
+MAX_PAGE_LIMIT = 1000
+
+def encode_page_cursor(rowid):
+    token = json.dumps({"r": rowid}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+def decode_page_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rowid = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))["r"]
+    except Exception:
+        raise ValueError("Invalid 'after' cursor")
+    if not isinstance(rowid, int) or rowid < 0:
+        raise ValueError("Invalid 'after' cursor")
+    return rowid
+
+def parse_page_params(limit, after=None):
+    # Valida os parâmetros vindos da query string; ValueError vira 400 nos servidores
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_LIMIT}")
+    return limit, decode_page_cursor(after) if after else 0
+
+def page_sql(clause, rowid_expr):
+    return (
+        f"SELECT {rowid_expr}, cpf.cpf, cpf.nome, cpf.sexo, cpf.nasc {clause} "
+        f"AND {rowid_expr} > ? ORDER BY {rowid_expr} LIMIT ?"
     )
-    result = cursor.fetchall()
-    json_result = []
-    for row in result:
-        json_dict = {
-            'cpf': row[0],
-            'nome': row[1],
-            'sexo': row[2],
-            'nasc': row[3]
-        }
-        json_result.append(json_dict)
-    return json_result
+
+MAX_ROWID_SQL = "SELECT max(rowid) FROM cpf"
+
+def paginate_cpf(clause_func, name, cursor, limit, after_rowid=0):
+    clause, params, rowid_expr, indexed_count = clause_func(name, cursor)
+    cursor.execute(page_sql(clause, rowid_expr), params + (after_rowid, limit + 1))
+    rows = cursor.fetchall()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    if indexed_count:
+        # Contagem exata e barata: percorre apenas o índice
+        cursor.execute(f"SELECT count(*) {clause}", params)
+        total_estimate = cursor.fetchone()[0]
+    else:
+        # Extrapola a densidade de resultados na faixa de rowids já percorrida
+        cursor.execute(MAX_ROWID_SQL)
+        max_rowid = cursor.fetchone()[0] or 0
+        scanned = (rows[-1][0] if has_next else max_rowid) - after_rowid
+        total_estimate = round(len(rows) * max_rowid / scanned) if scanned > 0 else len(rows)
+        if not has_next and after_rowid == 0:
+            total_estimate = len(rows)
+
+    return {
+        "rows": [row[1:] for row in rows],
+        "next": encode_page_cursor(rows[-1][0]) if has_next else None,
+        "total_estimate": total_estimate
+    }
+
+def paginate_cpf_by_name(name, cursor, limit, after_rowid=0):
+    return paginate_cpf(cpf_by_name_clause, name, cursor, limit, after_rowid)
+
+def paginate_cpf_by_exact_name(name, cursor, limit, after_rowid=0):
+    return paginate_cpf(cpf_by_exact_name_clause, name, cursor, limit, after_rowid)
+
+def paginate_cpf_by_phonetic_name(name, cursor, limit, after_rowid=0):
+    return paginate_cpf(cpf_by_phonetic_name_clause, name, cursor, limit, after_rowid)
+
+CPF_BY_CPF_SQL = "SELECT cpf, nome, sexo, nasc FROM cpf WHERE cpf = ?"
+
+def fetch_cpf_by_cpf(cpf, cursor):
+    cursor.execute(CPF_BY_CPF_SQL, (cpf,))
+    return cursor.fetchall()
+
+# Consulta em lote: limite de CPFs por requisição e de CPFs por consulta IN
+MAX_BATCH_CPFS = 10000
+BATCH_QUERY_SIZE = 500
+
+CPF_BATCH_SQL = "SELECT cpf, nome, sexo, nasc FROM cpf WHERE cpf IN (SELECT value FROM json_each(?))"
+
+class BatchTooLargeError(ValueError):
+    pass
+
+def parse_cpf_batch(body):
+    # Aceita {"cpfs": [...]} ou uma lista JSON de CPFs; ValueError vira 400 nos servidores
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise ValueError("Invalid JSON body")
+    if isinstance(data, dict):
+        data = data.get("cpfs")
+    if not isinstance(data, list) or not all(isinstance(cpf, str) for cpf in data):
+        raise ValueError('Body must be a JSON list of CPF strings or {"cpfs": [...]}')
+    if len(data) > MAX_BATCH_CPFS:
+        raise BatchTooLargeError(f"Batch too large: {len(data)} CPFs (maximum {MAX_BATCH_CPFS})")
+    # CPFs repetidos são resolvidos e devolvidos uma única vez
+    return list(dict.fromkeys(data))
+
+def iter_cpf_batches(cpfs, cursor, chunk_size=BATCH_QUERY_SIZE):
+    # Um IN por bloco sobre json_each: o conjunto vai como um único parâmetro, sem tabela temporária
+    # (as conexões são query_only). Gera [(cpf informado, linhas)] na ordem de entrada.
+    for start in range(0, len(cpfs), chunk_size):
+        chunk = cpfs[start:start + chunk_size]
+        digits = {cpf: ''.join(c for c in cpf if c.isdigit()) for cpf in chunk}
+        cursor.execute(CPF_BATCH_SQL, (json.dumps(list(set(digits.values()))),))
+        found = {}
+        for row in cursor.fetchall():
+            found.setdefault(row[0], []).append(row)
+        yield [(cpf, found.get(digits[cpf], [])) for cpf in chunk]
 
 def check_person_cnpj(name, cursor):
     cursor.execute(
@@ -87,3 +303,118 @@ def check_person_cnpj_and_cpf(name_and_cpf, cursor):
         }
         json_result.append(json_dict)
     return json_result
+
+# Enriquecimento de CNPJ: cada tabela é consultada uma vez por requisição, para todas as chaves;
+# as tabelas de códigos (municipio etc.) vêm dos mapas em memória de lookups.CodeTables
+ESTABELECIMENTO_COLUMNS = (
+    "cnpj, nome_fantasia, tipo_logradouro, logradouro, numero, complemento, bairro, "
+    "municipio, uf, cep, ddd1, telefone1, correio_eletronico"
+)
+
+PARTNER_CNPJ_SQL = (
+    "SELECT cnpj FROM socios WHERE (nome_socio LIKE UPPER(?) OR nome_representante LIKE UPPER(?)) AND cnpj_cpf_socio LIKE ?"
+)
+ESTABELECIMENTO_BY_CNPJ_SQL = f"SELECT {ESTABELECIMENTO_COLUMNS} FROM estabelecimento WHERE cnpj = ?"
+
+# Consultas em lote feitas por fetch_grouped: (colunas, tabela, coluna chave)
+ESTABELECIMENTO_LOOKUP = (ESTABELECIMENTO_COLUMNS, "estabelecimento", "cnpj")
+EMPRESA_LOOKUP = ("razao_social", "empresas", "cnpj_basico")
+SOCIOS_LOOKUP = ("nome_socio, nome_representante, cnpj_cpf_socio", "socios", "cnpj")
+GROUPED_LOOKUPS = (ESTABELECIMENTO_LOOKUP, EMPRESA_LOOKUP, SOCIOS_LOOKUP)
+
+def grouped_sql(columns, table, key_column):
+    select = ", ".join(f"t.{column.strip()}" for column in columns.split(","))
+    return (
+        f"SELECT j.key, {select} FROM json_each(?) AS j JOIN {table} AS t ON t.{key_column} = j.value "
+        "ORDER BY j.key, t.rowid"
+    )
+
+def fetch_grouped(cursor, columns, table, key_column, keys):
+    """Linhas de `table` para todas as chaves numa só consulta, agrupadas por chave em ordem de rowid.
+
+    Cada chave é comparada com `key_column = valor`, como numa consulta individual por chave.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    cursor.execute(grouped_sql(columns, table, key_column), (json.dumps(keys),))
+    grouped = {}
+    for row in cursor.fetchall():
+        grouped.setdefault(keys[row[0]], []).append(row[1:])
+    return grouped
+
+def first_row(grouped, key):
+    rows = grouped.get(key)
+    return rows[0] if rows else None
+
+def join_address(est, municipio):
+    return ', '.join(filter(None, [
+        est[2],  # tipo_logradouro
+        est[3],  # logradouro
+        est[4],  # numero
+        est[5],  # complemento
+        est[6],  # bairro
+        municipio,
+        est[8],  # uf
+        est[9]   # cep
+    ]))
+
+def join_phone(est):
+    return ', '.join(filter(None, [
+        est[10],  # ddd1
+        est[11]   # telefone1
+    ]))
+
+def search_cnpj_by_partner(name, cpf, cursor, code_tables):
+    """Empresas em que a pessoa é sócia ou representante; None quando nenhum sócio corresponde."""
+    cursor.execute(PARTNER_CNPJ_SQL, ('%' + name + '%', '%' + name + '%', '%' + cpf[3:-2] + '%'))
+    cnpj_list = [row[0] for row in cursor.fetchall()]
+    if not cnpj_list:
+        return None
+
+    estabelecimentos = fetch_grouped(cursor, *ESTABELECIMENTO_LOOKUP, cnpj_list)
+    found = [first_row(estabelecimentos, cnpj) for cnpj in cnpj_list if cnpj in estabelecimentos]
+    empresas = fetch_grouped(cursor, *EMPRESA_LOOKUP, [est[0][:8] for est in found])
+
+    results = []
+    for est in found:
+        razao_social = first_row(empresas, est[0][:8])[0]
+        municipio = code_tables.describe("municipio", est[7])
+        results.append({
+            'cnpj': est[0],
+            'nome_fantasia': est[1],
+            'razao_social': razao_social,
+            'endereço': join_address(est, municipio),
+            'telefone': join_phone(est),
+            'email': est[12]
+        })
+    return results
+
+def search_cnpj_with_partners(cnpj, cursor, code_tables):
+    """Estabelecimentos do CNPJ com razão social, endereço e quadro de sócios."""
+    cursor.execute(ESTABELECIMENTO_BY_CNPJ_SQL, (cnpj,))
+    rows = cursor.fetchall()
+    socios = fetch_grouped(cursor, *SOCIOS_LOOKUP, [row[0] for row in rows])
+    empresas = fetch_grouped(cursor, *EMPRESA_LOOKUP, [row[0][:8] for row in rows])
+
+    results = []
+    for row in rows:
+        municipio = code_tables.describe("municipio", row[7])
+        razao_social = first_row(empresas, row[0][:8])[0]
+        results.append({
+            'cnpj': row[0],
+            'nome_fantasia': row[1],
+            'razao_social': razao_social,
+            'endereco': join_address(row, municipio),
+            'telefone': join_phone(row),
+            'email': row[12],
+            'uf': row[8],
+            'socios': [
+                {
+                    'nome_socio': s[0],
+                    'nome_representante': s[1],
+                    'cnpj_cpf_socio': s[2]
+                } for s in socios.get(row[0], [])
+            ]
+        })
+    return results
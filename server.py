@@ -1,18 +1,53 @@
-import sqlite3
+import admission
+import cache
+import compression
+import database
+import encoders
+import httpparser
+import logging
+import logs
+import metrics
+import plancheck
 import json
 import queries
 import socket
 import multiprocessing
-import re
 import select
-import urllib.parse
+import threading
 import ssl
 import traceback
 import time
+import os
+import tls
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+# Tabela de rotas: (método, caminho, rota); caminhos terminados em "/" recebem o restante como parâmetro
+ROUTE_TABLE = (
+    ("OPTIONS", "*", "options"),
+    ("GET", "/health", "health"),
+    ("GET", "/stats", "stats"),
+    ("GET", "/metrics", "metrics"),
+    ("POST", "/get-person-by-cpf-batch", "person_by_cpf_batch"),
+    ("GET", "/get-person-by-name/", "person_by_name"),
+    ("GET", "/get-person-by-exact-name/", "person_by_exact_name"),
+    ("GET", "/get-person-by-phonetic-name/", "person_by_phonetic_name"),
+    ("GET", "/autocomplete-person-name/", "autocomplete_person_name"),
+    ("GET", "/get-person-by-cpf/", "person_by_cpf", str.isdigit),
+)
+ROUTER = httpparser.Router(ROUTE_TABLE)
+# Rotas na ordem em que aparecem em /metrics; "invalid" recebe as desconhecidas
+ROUTES = ROUTER.routes
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+
+log = logging.getLogger(logs.LOGGER)
+
 class Server():
-    def __init__(self, host, port, cpf_db, cnpj_db, semaphore):
+    def __init__(self, host, port, cpf_db, cnpj_db, workers=None, max_requests_per_worker=1000,
+                 keepalive_timeout=5.0, max_keepalive_requests=100, certfile="cert.pem", keyfile="key.pem",
+                 cache_file="result_cache.db", cache_ttl=300.0, cache_max_entries=10000, plan_check="warn",
+                 log_level="INFO", log_sample=None, log_file=None, max_queue=256, queue_timeout=2.0,
+                 client_connections=0, client_rate=0.0, client_burst=None, retry_after=1):
         super().__init__()
         self.host = host
         self.port = port
@@ -20,10 +55,60 @@ class Server():
         self.cnpj_db = cnpj_db
         self.server = None
         self.running = False
-        self.semaphore = semaphore
         self.start_time = None
         self.stop_time = None
 
+        # Pool de processos de longa duração (prefork)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_requests_per_worker = max_requests_per_worker
+        self.worker_processes = []
+        self.conn_queue = None
+
+        # Conexões persistentes (HTTP/1.1 keep-alive)
+        self.keepalive_timeout = keepalive_timeout
+        self.max_keepalive_requests = max_keepalive_requests
+
+        # Contexto TLS criado uma única vez e herdado pelos workers
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.ssl_context = None
+        self.handshake_stats = tls.HandshakeStats()
+
+        # Controle de admissão: cada worker atende uma conexão por vez; as excedentes esperam numa
+        # fila limitada do acceptor e, com a fila cheia ou o prazo vencido, recebem 503 + Retry-After
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_connections = client_connections
+        self.retry_after = retry_after
+        self.admission_stats = admission.AdmissionStats()
+        self.admission = None
+        # Pipe em que os workers avisam o acceptor das conexões que pegaram e das que encerraram
+        self.done_reader = self.done_writer = None
+        # Cliente (IP) da conexão que cada worker está atendendo, por slot: liberado se o worker morrer
+        self.in_flight = {}
+        self.rate_limiter = admission.RateLimiter(client_rate, client_burst) if client_rate else None
+        self.shed_executor = None
+        self.shed_slots = None
+        self.shed_context = None
+
+        # Contadores e histogramas de /metrics: um slot de memória compartilhada por worker
+        self.metrics = metrics.Metrics(ROUTES, slots=self.workers)
+
+        # Logs estruturados: os processos enfileiram e uma thread do processo principal escreve
+        self.log_level = log_level
+        self.log_sample = log_sample or {}
+        self.log_file = log_file
+        self.log_queue = None
+        self.log_listener = None
+
+        # Verificação dos planos de consulta na inicialização: off, warn ou strict
+        self.plan_check = plan_check
+
+        # Cache de resultados compartilhado pelos workers (desativado com cache_file vazio)
+        self.cache = None
+        if cache_file:
+            self.cache = cache.ResultCache(cache_file, [cpf_db, cnpj_db], max_entries=cache_max_entries, ttl=cache_ttl)
+
     @staticmethod
     def get_local_ip():
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -36,228 +121,461 @@ class Server():
             s.close()
 
     @staticmethod
-    def send_http_json(conn, data):
-        try:
-            # Convertendo para JSON com tamanho limitado de dados
-            body = json.dumps(data, ensure_ascii=False)
-            print(f"Enviando resposta com {len(body)} bytes")
-
-            # Preparar o cabeçalho HTTP
-            response = (
-              "HTTP/1.1 200 OK\r\n"
-              "Content-Type: application/json; charset=utf-8\r\n"
-              "Access-Control-Allow-Origin: *\r\n"  # Permitir qualquer origem
-              "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
-              f"Content-Length: {len(body.encode('utf-8'))}\r\n"
-              "\r\n"
-              f"{body}"
-            )
-
-            # Converter para bytes
-            response_bytes = response.encode('utf-8')
+    def connection_header(keep_alive):
+        return "Connection: keep-alive\r\n" if keep_alive else "Connection: close\r\n"
+
+    @staticmethod
+    def response_encoding(request):
+        # gzip/deflate conforme o Accept-Encoding do cliente; None responde sem compressão
+        return compression.negotiate(request.headers.get("accept-encoding"))
+
+    @staticmethod
+    def content_encoding_headers(encoding):
+        # Vary em toda resposta que poderia ter saído comprimida, para caches intermediários
+        if encoding is None:
+            return "Vary: Accept-Encoding\r\n"
+        return f"Content-Encoding: {encoding}\r\nVary: Accept-Encoding\r\n"
+
+    @staticmethod
+    def build_http_json(data, keep_alive=False, encoding=None):
+        # Serializa e codifica o corpo uma única vez
+        return Server.build_http_body(json.dumps(data, ensure_ascii=False).encode('utf-8'), keep_alive, encoding=encoding)
 
+    @staticmethod
+    def build_http_body(body, keep_alive=False, content_type=JSON_CONTENT_TYPE, encoding=None):
+        # Corpo JSON já em bytes (ver encoders.py): o tamanho é calculado uma vez
+        # Corpos pequenos vão sem compressão mesmo que o cliente aceite
+        if encoding is not None and len(body) < compression.MIN_SIZE:
+            encoding = None
+        if encoding is not None:
+            body = compression.compress(body, encoding)
+        # Preparar o cabeçalho HTTP
+        headers = (
+          "HTTP/1.1 200 OK\r\n"
+          f"Content-Type: {content_type}\r\n"
+          "Access-Control-Allow-Origin: *\r\n"  # Permitir qualquer origem
+          "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+          f"{Server.content_encoding_headers(encoding)}"
+          f"Content-Length: {len(body)}\r\n"
+          f"{Server.connection_header(keep_alive)}"
+          "\r\n"
+        )
+        return headers.encode('latin-1') + body
+
+    @staticmethod
+    def build_cors_response(keep_alive=False):
+        cors_response = (
+            "HTTP/1.1 204 No Content\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+            "Access-Control-Allow-Headers: Content-Type\r\n"
+            "Access-Control-Max-Age: 86400\r\n"
+            f"{Server.connection_header(keep_alive)}"
+            "\r\n"
+        )
+        return cors_response.encode('utf-8')
+
+    @staticmethod
+    def build_health_response(keep_alive=False):
+        response = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/json\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Access-Control-Allow-Methods: GET, HEAD, OPTIONS\r\n"
+            f"{Server.connection_header(keep_alive)}"
+            "Content-Length: 15\r\n"
+            "\r\n"
+            '{"status":"ok"}'
+        )
+        return response.encode('utf-8')
+
+    @staticmethod
+    def build_error_response(keep_alive=False, message="Invalid request", status="400 Bad Request", retry_after=None,
+                             allow=None):
+        error_body = json.dumps({"error": message})
+        # Respostas de sobrecarga (503/429) dizem ao cliente quando tentar de novo
+        retry_header = f"Retry-After: {retry_after}\r\n" if retry_after else ""
+        # 405 lista os métodos aceitos no caminho
+        allow_header = f"Allow: {', '.join(allow)}\r\n" if allow else ""
+        response = (
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(error_body)}\r\n"
+            f"{retry_header}"
+            f"{allow_header}"
+            f"{Server.connection_header(keep_alive)}"
+            "\r\n"
+            f"{error_body}"
+        )
+        return response.encode("utf-8")
+
+    @staticmethod
+    def build_streaming_headers(keep_alive=False, encoding=None):
+        # O tamanho final é desconhecido: com encoding negociado o stream é sempre comprimido
+        headers = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+            f"{Server.content_encoding_headers(encoding)}"
+            "Transfer-Encoding: chunked\r\n"
+            f"{Server.connection_header(keep_alive)}"
+            "\r\n"
+        )
+        return headers.encode('utf-8')
+
+    @staticmethod
+    def encode_payload(data):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    def send_http_json(conn, data, keep_alive=False, timer=metrics.DISCARD, encoding=None):
+        return Server.send_response(conn, timer.timed("serialize", Server.build_http_json, data, keep_alive, encoding), timer)
+
+    @staticmethod
+    def send_http_body(conn, body, keep_alive=False, timer=metrics.DISCARD, content_type=JSON_CONTENT_TYPE, encoding=None):
+        # A compressão conta como serialização
+        response = timer.timed("serialize", Server.build_http_body, body, keep_alive, content_type, encoding)
+        return Server.send_response(conn, response, timer)
+
+    @staticmethod
+    def send_error(conn, keep_alive=False, message="Invalid request", status="400 Bad Request", timer=metrics.DISCARD,
+                   retry_after=None, allow=None):
+        # A conexão segue aberta: o erro é da requisição, não do transporte
+        timer.error = True
+        timer.status = int(status.split(" ", 1)[0])
+        timer.timed("send", conn.sendall, Server.build_error_response(keep_alive, message, status, retry_after, allow))
+        return True
+
+    @staticmethod
+    def route_error(request):
+        """(mensagem, status, métodos aceitos) de uma requisição sem rota: 405 se o caminho existe com outro método."""
+        allowed = ROUTER.allowed_methods(request.path)
+        if allowed and request.method not in allowed:
+            return f"Method {request.method} not allowed", "405 Method Not Allowed", allowed
+        return "Not found", "404 Not Found", None
+
+    @staticmethod
+    def send_response(conn, response_bytes, timer=metrics.DISCARD):
+        start = time.perf_counter()
+        try:
             # Enviar em pedaços de 8192 bytes para evitar problemas com pacotes muito grandes
+            response = memoryview(response_bytes)
             total_sent = 0
-            while total_sent < len(response_bytes):
-                chunk_size = min(8192, len(response_bytes) - total_sent)
-                sent = conn.send(response_bytes[total_sent:total_sent + chunk_size])
+            while total_sent < len(response):
+                chunk_size = min(8192, len(response) - total_sent)
+                sent = conn.send(response[total_sent:total_sent + chunk_size])
                 if sent == 0:
                     raise RuntimeError("Socket connection broken")
                 total_sent += sent
 
-            print(f"Resposta enviada com sucesso: {total_sent} bytes")
+            timer.send += time.perf_counter() - start
+            return True
 
         except Exception as e:
-            print(f"Erro ao enviar resposta: {e}")
-            traceback.print_exc()
+            timer.error = True
+            log.warning("Failed to send response: %s", e, exc_info=not isinstance(e, OSError))
+            return False
 
     @staticmethod
-    def send_streaming_response(ssl_socket, query_func, params, cursor):
+    def stream_chunks(execute_func, params, cursor, batch_size=queries.STREAM_BATCH_SIZE, result_cache=None, cache_key=None,
+                      timer=metrics.DISCARD):
+        # Gera o conteúdo dos pedaços à medida que as linhas saem do cursor; nada é acumulado além de um lote
+        # (o enquadramento chunked e a compressão ficam com send_chunks)
+        rows_sent = 0
         try:
-            # Enviar cabeçalhos iniciais
-            headers = (
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: application/json; charset=utf-8\r\n"
-                "Access-Control-Allow-Origin: *\r\n"
-                "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
-                "Transfer-Encoding: chunked\r\n"
-                "Connection: keep-alive\r\n"
-                "\r\n"
-            )
-            ssl_socket.sendall(headers.encode('utf-8'))
-
-            # Enviar status inicial
-            initial_update = json.dumps({
+            yield Server.encode_payload({
                 "status": "searching",
                 "message": "Iniciando busca...",
                 "progress": 0,
                 "isComplete": False
             })
-            chunk = f"{len(initial_update):X}\r\n{initial_update}\r\n"
-            ssl_socket.sendall(chunk.encode('utf-8'))
-
-            # Enviar atualização de 25%
-            ssl_socket.sendall(
-                f"{len(json.dumps({'status': 'searching', 'progress': 25, 'isComplete': False})):X}\r\n".encode('utf-8') +
-                json.dumps({'status': 'searching', 'progress': 25, 'isComplete': False}).encode('utf-8') +
-                "\r\n".encode('utf-8')
-            )
-
-            # Executar a consulta
-            result = query_func(*params, cursor)
-
-            # Enviar atualização de 75%
-            ssl_socket.sendall(
-                f"{len(json.dumps({'status': 'processing', 'progress': 75, 'isComplete': False})):X}\r\n".encode('utf-8') +
-                json.dumps({'status': 'processing', 'progress': 75, 'isComplete': False}).encode('utf-8') +
-                "\r\n".encode('utf-8')
-            )
-
-            # Preparar e enviar o resultado final
-            final_result = json.dumps({
-                "status": "complete", 
-                "progress": 100, 
+
+            cached = timer.timed("sql", result_cache.get, cache_key) if result_cache else None
+            if cached is not None:
+                batches = (cached[i:i + batch_size] for i in range(0, len(cached), batch_size))
+            else:
+                timer.timed("sql", execute_func, *params, cursor)
+                batches = timer.timed_iter("sql", queries.iter_batches(cursor, batch_size))
+
+            # Resultados pequenos são guardados no cache ao final; os grandes só passam pelo stream
+            collected = [] if result_cache and cached is None else None
+            for rows in batches:
+                rows_sent += len(rows)
+                if collected is not None:
+                    if rows_sent <= result_cache.max_rows:
+                        collected.extend(rows)
+                    else:
+                        collected = None
+                # Tuplas do cursor direto para JSON, sem dicts intermediários
+                yield timer.timed("serialize", encoders.CPF_ROW.stream_batch, rows, rows_sent)
+
+            if collected is not None:
+                timer.timed("sql", result_cache.put, cache_key, collected)
+
+            yield Server.encode_payload({
+                "status": "complete",
+                "progress": 100,
                 "isComplete": True,
-                "results": result
+                "rowsSent": rows_sent,
+                "results": []
             })
-            chunk = f"{len(final_result):X}\r\n{final_result}\r\n"
-            ssl_socket.sendall(chunk.encode('utf-8'))
+            log.debug("Streaming response complete with %d rows", rows_sent)
+        finally:
+            # Finaliza o statement mesmo se o cliente desconectar no meio
+            cursor.close()
+
+    @staticmethod
+    def run_with_cursor(databases, query_func, *params):
+        # query_func(*params, cursor) com um cursor próprio, fechado ao final como em stream_chunks:
+        # o statement é finalizado já, sem depender do GC, nas conexões de longa duração
+        cursor = databases.cursor_cpf()
+        try:
+            return query_func(*params, cursor)
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def send_streaming_response(ssl_socket, execute_func, params, cursor, keep_alive=False, result_cache=None, cache_key=None,
+                                timer=metrics.DISCARD, encoding=None):
+        chunks = Server.stream_chunks(execute_func, params, cursor, result_cache=result_cache, cache_key=cache_key, timer=timer)
+        return Server.send_chunks(ssl_socket, chunks, keep_alive, timer, encoding)
+
+    @staticmethod
+    def batch_chunks(cpfs, cursor, timer=metrics.DISCARD):
+        # Resposta da consulta em lote, no mesmo formato chunked das buscas por nome
+        try:
+            batches = timer.timed_iter("sql", queries.iter_cpf_batches(cpfs, cursor))
+            yield from timer.timed_iter("serialize", encoders.cpf_batch_payloads(batches))
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def send_chunks(ssl_socket, chunks, keep_alive=False, timer=metrics.DISCARD, encoding=None):
+        # Cada pedaço é enquadrado (e comprimido, se negociado) na hora de enviar
+        encoder = compression.ChunkedEncoder(encoding)
+        try:
+            # Enviar cabeçalhos iniciais
+            timer.timed("send", ssl_socket.sendall, Server.build_streaming_headers(keep_alive, encoding))
 
-            # Terminar a resposta chunked
-            ssl_socket.sendall("0\r\n\r\n".encode('utf-8'))
-            print(f"Resposta streaming concluída com {len(result)} resultados")
+            for payload in chunks:
+                chunk = timer.timed("serialize", encoder.chunk, payload)
+                if chunk:
+                    timer.timed("send", ssl_socket.sendall, chunk)
+            timer.timed("send", ssl_socket.sendall, encoder.finish())
+            return True
+
+        except OSError as e:
+            # Cliente desconectou: interrompe a consulta sem tentar responder
+            timer.error = True
+            log.info("Streaming interrupted, client disconnected: %s", e)
+            return False
 
         except Exception as e:
-            print(f"Erro ao enviar resposta streaming: {e}")
-            traceback.print_exc()
+            timer.error = True
+            timer.status = 500
+            log.exception("Streaming response failed: %s", e)
 
             # Tenta enviar mensagem de erro em caso de falha
             try:
-                error_msg = json.dumps({"status": "error", "message": str(e), "isComplete": True})
-                chunk = f"{len(error_msg):X}\r\n{error_msg}\r\n0\r\n\r\n"
-                ssl_socket.sendall(chunk.encode('utf-8'))
+                error_msg = Server.encode_payload({"status": "error", "message": str(e), "isComplete": True})
+                ssl_socket.sendall(encoder.chunk(error_msg) + encoder.finish())
             except:
                 pass
+            return False
+
+        finally:
+            chunks.close()
+
+    @staticmethod
+    def read_request(ssl_socket, parser):
+        # O parser guarda os bytes excedentes entre chamadas (pipelining); None quando o cliente fecha
+        request = parser.next_request()
+        while request is None:
+            data = ssl_socket.recv(65536)
+            if not data:
+                if parser.buffer:
+                    log.debug("Connection closed in the middle of a request")
+                return None
+            parser.feed(data)
+            request = parser.next_request()
+        return request
+
+    @staticmethod
+    def page_params(query):
+        # Paginação só quando 'limit' é informado; sem ele a rota continua em streaming
+        if "limit" not in query:
+            return None
+        return queries.parse_page_params(query["limit"], query.get("after"))
 
     @staticmethod
-    def handle_client(client_socket, addr, cpf_db, cnpj_db, semaphore):
+    def dispatch_request(ssl_socket, request, config, timer=metrics.DISCARD):
+        route, param = ROUTER.match(request.method, request.path)
+        timer.route = route
+        return HANDLERS[route](ssl_socket, request, param, config, timer)
+
+    # Handlers das rotas: (socket, requisição, parâmetro do caminho, config do worker, timer)
+
+    @staticmethod
+    def handle_options(ssl_socket, request, param, config, timer):
+        # Pre-flight CORS
+        timer.timed("send", ssl_socket.sendall, Server.build_cors_response(request.keep_alive))
+        return True
+
+    @staticmethod
+    def handle_health(ssl_socket, request, param, config, timer):
+        timer.timed("send", ssl_socket.sendall, Server.build_health_response(request.keep_alive))
+        return True
+
+    @staticmethod
+    def handle_stats(ssl_socket, request, param, config, timer):
+        # Estatísticas de handshakes TLS (completos x retomados)
+        stats = {"tls": config['handshake_stats'].snapshot(), "admission": config['admission_stats'].snapshot()}
+        if config['cache']:
+            stats["cache"] = config['cache'].snapshot()
+        return Server.send_http_json(ssl_socket, stats, request.keep_alive, timer, Server.response_encoding(request))
+
+    @staticmethod
+    def handle_metrics(ssl_socket, request, param, config, timer):
+        # Métricas no formato Prometheus, somadas entre os workers
+        text = timer.timed("serialize", lambda: config['metrics'].render() + config['admission_stats'].render())
+        return Server.send_http_body(ssl_socket, text.encode('utf-8'), request.keep_alive, timer, metrics.CONTENT_TYPE,
+                                     Server.response_encoding(request))
+
+    @staticmethod
+    def handle_person_by_cpf_batch(ssl_socket, request, param, config, timer):
+        # {"cpfs": [...]} resolvidos em consultas por conjunto
+        try:
+            cpfs = queries.parse_cpf_batch(request.body)
+        except queries.BatchTooLargeError as e:
+            return Server.send_error(ssl_socket, request.keep_alive, str(e), "413 Payload Too Large", timer)
+        except ValueError as e:
+            return Server.send_error(ssl_socket, request.keep_alive, str(e), timer=timer)
+        return Server.send_chunks(ssl_socket, Server.batch_chunks(cpfs, config['databases'].cursor_cpf(), timer),
+                                  request.keep_alive, timer, Server.response_encoding(request))
+
+    @staticmethod
+    def search_by_name(ssl_socket, request, name, config, timer, execute, paginate):
+        # Página de resultados (?limit=N&after=cursor) ou, sem 'limit', o streaming completo
+        try:
+            page = Server.page_params(request.query())
+        except ValueError as e:
+            return Server.send_error(ssl_socket, request.keep_alive, str(e), timer=timer)
+        databases = config['databases']
+        encoding = Server.response_encoding(request)
+        if page is None:
+            return Server.send_streaming_response(ssl_socket, execute, (name,), databases.cursor_cpf(), request.keep_alive,
+                                                  config['cache'], cache.search_key(timer.route, name), timer, encoding)
+        result = timer.timed("sql", cache.cached_call, config['cache'], cache.search_key(timer.route, name, *page),
+                             lambda: Server.run_with_cursor(databases, lambda cursor: paginate(name, cursor, *page)))
+        body = timer.timed("serialize", encoders.CPF_ROW.page_body, result)
+        return Server.send_http_body(ssl_socket, body, request.keep_alive, timer, encoding=encoding)
+
+    @staticmethod
+    def handle_person_by_name(ssl_socket, request, param, config, timer):
+        return Server.search_by_name(ssl_socket, request, param, config, timer,
+                                     queries.execute_cpf_by_name, queries.paginate_cpf_by_name)
+
+    @staticmethod
+    def handle_person_by_exact_name(ssl_socket, request, param, config, timer):
+        return Server.search_by_name(ssl_socket, request, param, config, timer,
+                                     queries.execute_cpf_by_exact_name, queries.paginate_cpf_by_exact_name)
+
+    @staticmethod
+    def handle_person_by_phonetic_name(ssl_socket, request, param, config, timer):
+        return Server.search_by_name(ssl_socket, request, param, config, timer,
+                                     queries.execute_cpf_by_phonetic_name, queries.paginate_cpf_by_phonetic_name)
+
+    @staticmethod
+    def handle_autocomplete_person_name(ssl_socket, request, param, config, timer):
+        # Sem o cache de resultados: as buscas no índice custam menos que a ida ao cache, e cada tecla ocuparia uma entrada
+        try:
+            limit = queries.parse_autocomplete_limit(request.query().get("limit"))
+        except ValueError as e:
+            return Server.send_error(ssl_socket, request.keep_alive, str(e), timer=timer)
+        names = timer.timed("sql", Server.run_with_cursor, config['databases'],
+                            lambda cursor: queries.fetch_name_autocomplete(param, cursor, limit))
+        body = timer.timed("serialize", encoders.names_body, names)
+        return Server.send_http_body(ssl_socket, body, request.keep_alive, timer, encoding=Server.response_encoding(request))
+
+    @staticmethod
+    def handle_person_by_cpf(ssl_socket, request, param, config, timer):
+        rows = timer.timed("sql", cache.cached_call, config['cache'], cache.make_key(timer.route, param),
+                           lambda: Server.run_with_cursor(config['databases'], queries.fetch_cpf_by_cpf, param))
+        body = timer.timed("serialize", encoders.CPF_ROW.results_body, rows)
+        return Server.send_http_body(ssl_socket, body, request.keep_alive, timer, encoding=Server.response_encoding(request))
+
+    @staticmethod
+    def handle_invalid(ssl_socket, request, param, config, timer):
+        message, status, allow = Server.route_error(request)
+        return Server.send_error(ssl_socket, request.keep_alive, message, status, timer, allow=allow)
+
+    @staticmethod
+    def handle_client(client_socket, addr, config):
         ssl_socket = None
-        conn_cpf = None
-        conn_cnpj = None
+        served = 0
 
         try:
             # Wrap the socket with SSL
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-            context.load_cert_chain(certfile="cert.pem", keyfile="key.pem")
-
             try:
-                ssl_socket = context.wrap_socket(client_socket, server_side=True)
-                print(f"SSL handshake successful with {addr}")
+                ssl_socket = config['ssl_context'].wrap_socket(client_socket, server_side=True)
             except ssl.SSLError as e:
-                print(f"SSL handshake failed with {addr}: {e}")
-                return
+                log.info("SSL handshake failed with %s: %s", addr, e)
+                return served
             except Exception as e:
-                print(f"Error during SSL wrap: {e}")
-                return
+                log.warning("Error during SSL wrap with %s: %s", addr, e)
+                return served
 
-            # Open database connections
-            conn_cpf = sqlite3.connect(cpf_db)
-            conn_cnpj = sqlite3.connect(cnpj_db)
-            cursor_cpf = conn_cpf.cursor()
-            cursor_cnpj = conn_cnpj.cursor()
+            # Tempo máximo ocioso entre requisições na mesma conexão
+            ssl_socket.settimeout(config['keepalive_timeout'])
+            parser = httpparser.RequestParser()
+            max_keepalive_requests = config['max_keepalive_requests']
 
-            # Receive data from client
-            data = ssl_socket.recv(1024)
-            if not data:
-                print(f"No data received from {addr}")
-                return
-
-            request = data.decode()
-            print(f"Request from {addr}: {request.splitlines()[0] if request else 'Empty'}")
-
-            # Verificar se há cabeçalhos OPTIONS para pre-flight CORS
-            if request.startswith("OPTIONS"):
-                print("Recebida requisição OPTIONS (pre-flight CORS)")
-                cors_response = (
-                    "HTTP/1.1 204 No Content\r\n"
-                    "Access-Control-Allow-Origin: *\r\n"
-                    "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
-                    "Access-Control-Allow-Headers: Content-Type\r\n"
-                    "Access-Control-Max-Age: 86400\r\n"
-                    "\r\n"
-                )
-                ssl_socket.sendall(cors_response.encode('utf-8'))
-                return
-
-            # Nova rota: Health check
-            if "GET /health" in request:
-                print("Recebida solicitação de health check")
-                response = (
-                    "HTTP/1.1 200 OK\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Access-Control-Allow-Origin: *\r\n"
-                    "Access-Control-Allow-Methods: GET, HEAD, OPTIONS\r\n"
-                    "Connection: close\r\n"
-                    "Content-Length: 15\r\n"
-                    "\r\n"
-                    '{"status":"ok"}'
-                )
-                print("Enviando resposta health check:", response.replace('\r\n', '\\r\\n'))
-                ssl_socket.sendall(response.encode('utf-8'))
-                return
-
-            # /get-person-by-name/
-            match = re.match(r"GET /get-person-by-name/([^ ]+) HTTP/1.[01]", request)
-            if match:
-                name = urllib.parse.unquote_plus(match.group(1))
-                print(f"Buscando por nome: '{name}'")
-                Server.send_streaming_response(ssl_socket, queries.search_cpf_by_name, (name,), cursor_cpf)
-                return
-
-            # /get-person-by-exact-name/
-            match = re.match(r"GET /get-person-by-exact-name/([^ ]+) HTTP/1.[01]", request)
-            if match:
-                name = urllib.parse.unquote_plus(match.group(1))
-                print(f"Buscando por nome exato: '{name}'")
-                Server.send_streaming_response(ssl_socket, queries.search_cpf_by_exact_name, (name,), cursor_cpf)
-                return
-
-            # /get-person-by-cpf/
-            match = re.match(r"GET /get-person-by-cpf/(\d+) HTTP/1.[01]", request)
-            if match:
-                cpf = match.group(1)
-                result = queries.search_cpf_by_cpf(cpf, cursor_cpf)
-                Server.send_http_json(ssl_socket, {"results": result})
-                return
-
-            # Invalid request
-            error_body = json.dumps({"error": "Invalid request"})
-            response = (
-                "HTTP/1.1 400 Bad Request\r\n"
-                "Content-Type: application/json\r\n"
-                f"Content-Length: {len(error_body)}\r\n"
-                "\r\n"
-                f"{error_body}"
-            )
-            ssl_socket.sendall(response.encode("utf-8"))
-        except Exception as e:
-            print(f"Error handling client {addr}: {e}")
-            traceback.print_exc()
-        finally:
-            if semaphore:
-                semaphore.release()
-
-            # Close database connections
-            if conn_cpf:
+            while served < max_keepalive_requests:
                 try:
-                    conn_cpf.close()
-                except:
-                    pass
-            if conn_cnpj:
+                    request = Server.read_request(ssl_socket, parser)
+                except socket.timeout:
+                    if served == 0:
+                        log.debug("No data received from %s", addr)
+                    break
+                except httpparser.BadRequest as e:
+                    # Corpo não lido ou bytes fora de sincronia: responde e encerra a conexão
+                    ssl_socket.sendall(Server.build_error_response(False, str(e), e.status))
+                    break
+
+                if request is None:
+                    if served == 0:
+                        log.debug("No data received from %s", addr)
+                    break
+
+                served += 1
+
+                request.keep_alive = request.keep_alive and served < max_keepalive_requests
+                timer = metrics.RequestTimer()
+                config['metrics'].request_started()
+                handled = False
                 try:
-                    conn_cnpj.close()
-                except:
-                    pass
+                    # Limite de taxa por IP, verificado a cada requisição (inclusive as da mesma conexão)
+                    retry_after = config['rate_limiter'].acquire(addr[0]) if config['rate_limiter'] else 0
+                    if retry_after:
+                        timer.route = ROUTER.match(request.method, request.path)[0]
+                        config['admission_stats'].record(admission.SHED_RATE)
+                        status, message = admission.SHED_RESPONSES[admission.SHED_RATE]
+                        handled = Server.send_error(ssl_socket, request.keep_alive, message, status, timer,
+                                                    admission.retry_after_header(retry_after))
+                    else:
+                        handled = Server.dispatch_request(ssl_socket, request, config, timer)
+                finally:
+                    timer.error = timer.error or not handled
+                    config['metrics'].request_finished(timer)
+                    logs.log_access(request.request_line, addr[0], timer)
+                if not handled or not request.keep_alive:
+                    break
+        except Exception as e:
+            log.exception("Error handling client %s: %s", addr, e)
+        finally:
+            # Devolve a vaga ao acceptor, que pode admitir a próxima conexão da fila
+            Server.report_done(config, addr[0])
 
             # Close sockets
             if ssl_socket:
@@ -271,13 +589,142 @@ class Server():
             except:
                 pass
 
-            print(f"Connection with {addr} closed")
+            log.debug("Connection with %s closed after %d requests", addr, served)
+
+        return served
+
+    @staticmethod
+    def report_admission(config, event, client):
+        # "<evento><slot> <cliente>": + ao pegar a conexão, - ao encerrá-la. Mensagens curtas num pipe são
+        # escritas de uma vez: vários workers podem compartilhar o mesmo lado
+        try:
+            config['admission_done'].send_bytes(f"{event}{config['metrics_slot']} {client}".encode())
+        except OSError as e:
+            log.warning("Could not report connection to the acceptor: %s", e)
+
+    @staticmethod
+    def report_started(config, client):
+        Server.report_admission(config, "+", client)
+
+    @staticmethod
+    def report_done(config, client):
+        Server.report_admission(config, "-", client)
+
+    @staticmethod
+    def worker_loop(conn_queue, config):
+        logs.configure(config['log_queue'], config['log_level'], config['log_sample'])
+
+        # Cada worker escreve só no seu slot de métricas (o contexto TLS herdado usa o mesmo objeto)
+        config['metrics'].bind(config['metrics_slot'])
+
+        # Sem fork o contexto não é herdado: cria um por worker, reutilizado em todas as conexões
+        if config['ssl_context'] is None:
+            config['ssl_context'] = tls.create_server_context(config['certfile'], config['keyfile'], config['handshake_stats'],
+                                                              config['metrics'])
+
+        # Conexões SQLite do worker, abertas sob demanda e reutilizadas entre requisições
+        config['databases'] = database.DatabaseManager(config['cpf_db'], config['cnpj_db'])
+
+        # Atende conexões recebidas do acceptor até ser reciclado ou receber o sentinela
+        max_requests = config['max_requests']
+        handled = 0
+        while not max_requests or handled < max_requests:
+            try:
+                item = conn_queue.get()
+            except Exception as e:
+                log.error("Worker %d: error receiving connection: %s", os.getpid(), e)
+                continue
+
+            if item is None:
+                break
+
+            client_socket, addr = item
+            Server.report_started(config, addr[0])
+            handled += Server.handle_client(client_socket, addr, config)
+
+        config['databases'].close()
+        log.info("Worker %d exiting after %d requests", os.getpid(), handled)
+
+    def _worker_config(self):
+        # SSLContext não é serializável; só é repassado quando o worker é criado por fork
+        inherit_context = multiprocessing.get_start_method() == 'fork'
+        return {
+            'cpf_db': self.cpf_db,
+            'cnpj_db': self.cnpj_db,
+            'admission_done': self.done_writer,
+            'admission_stats': self.admission_stats,
+            'rate_limiter': self.rate_limiter,
+            'max_requests': self.max_requests_per_worker,
+            'keepalive_timeout': self.keepalive_timeout,
+            'max_keepalive_requests': self.max_keepalive_requests,
+            'certfile': self.certfile,
+            'keyfile': self.keyfile,
+            'ssl_context': self.ssl_context if inherit_context else None,
+            'handshake_stats': self.handshake_stats,
+            'cache': self.cache,
+            'metrics': self.metrics,
+            'log_queue': self.log_queue,
+            'log_level': self.log_level,
+            'log_sample': self.log_sample
+        }
+
+    def _spawn_worker(self, slot):
+        config = self._worker_config()
+        config['metrics_slot'] = slot
+        process = multiprocessing.Process(
+            target=Server.worker_loop,
+            args=(self.conn_queue, config)
+        )
+        process.daemon = True
+        process.start()
+        return process
+
+    def _supervise_workers(self):
+        # Reinicia workers reciclados (limite de requisições) ou que morreram
+        dead = [i for i, process in enumerate(self.worker_processes) if not process.is_alive()]
+        if not dead:
+            return
+        # Os avisos que o worker mandou antes de morrer são lidos primeiro: o que sobrar em in_flight
+        # é a conexão que ele não terminou
+        self._release_finished()
+        for i in dead:
+            process = self.worker_processes[i]
+            process.join(timeout=0)
+            if process.exitcode != 0:
+                print(f"[SERVER] Worker {process.pid} died with exit code {process.exitcode}, restarting")
+            client = self.in_flight.pop(i, None)
+            if client is not None:
+                log.warning("Worker %d died serving %s; releasing its admission slot", process.pid, client)
+                self._release(client)
+            self.worker_processes[i] = self._spawn_worker(i)
+
+    def _stop_workers(self):
+        if self.conn_queue is not None:
+            for _ in self.worker_processes:
+                try:
+                    self.conn_queue.put(None)
+                except Exception:
+                    pass
+        for process in self.worker_processes:
+            process.join(timeout=3)
+            if process.is_alive():
+                process.terminate()
+        self.worker_processes = []
+
+    def _start_logging(self):
+        self.log_queue, self.log_listener = logs.start_writer(self.log_file)
+        logs.configure(self.log_queue, self.log_level, self.log_sample)
+
+    def _stop_logging(self):
+        logs.stop_writer(self.log_listener)
+        self.log_listener = None
 
     def start(self):
         # Registrar o tempo de início
         self.start_time = time.time()
         start_datetime = datetime.fromtimestamp(self.start_time)
         print(f"[SERVER] Starting at: {start_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
+        self._start_logging()
 
         # Server configuration
         HOST = self.host
@@ -285,6 +732,9 @@ class Server():
 
         # Create socket
         try:
+            # Em modo strict uma consulta sem índice impede a inicialização
+            plancheck.check_query_plans(self.plan_check, self.cpf_db)
+
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             server_socket.bind((HOST, PORT))
@@ -295,45 +745,67 @@ class Server():
             local_ip = self.get_local_ip()
             print(f"[SERVER] Listening on {local_ip}:{PORT} (HTTPS)")
 
+            # Load the certificate once; workers reuse this context (and its ticket keys)
+            self.ssl_context = tls.create_server_context(self.certfile, self.keyfile, self.handshake_stats, self.metrics)
+
+            # Start worker pool
+            self.conn_queue = multiprocessing.SimpleQueue()
+            self.admission = admission.AdmissionQueue(self.workers, self.max_queue, self.queue_timeout,
+                                                      self.client_connections, self.admission_stats)
+            self.done_reader, self.done_writer = multiprocessing.Pipe(duplex=False)
+            self.in_flight = {}
+            # Respostas 503/429 saem de threads do acceptor, que nunca bloqueia esperando um worker;
+            # contexto próprio, sem métricas, porque o slot 0 de /metrics pertence a um worker
+            self.shed_context = tls.create_server_context(self.certfile, self.keyfile)
+            self.shed_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="shed")
+            self.shed_slots = threading.BoundedSemaphore(64)
+            self.worker_processes = [self._spawn_worker(slot) for slot in range(self.workers)]
+            print(f"[SERVER] Started {self.workers} workers (max {self.max_requests_per_worker} requests each)")
+
             # Start server
             self.running = True
 
             while self.running:
                 try:
-                    # Use select with a timeout to make the server interruptible
-                    ready_to_read, _, _ = select.select([self.server], [], [], 1.0)
+                    # Use select with a timeout to make the server interruptible; wakes up early
+                    # when a worker frees a slot or a queued connection reaches its deadline
+                    deadline = self.admission.next_deadline()
+                    timeout = 1.0 if deadline is None else min(1.0, max(0.0, deadline - time.monotonic()))
+                    ready_to_read, _, _ = select.select([self.server, self.done_reader], [], [], timeout)
+
+                    self._supervise_workers()
+
+                    if self.done_reader in ready_to_read:
+                        self._release_finished()
+
+                    for client_socket, addr in self.admission.expire():
+                        self._shed(client_socket, addr, admission.SHED_TIMEOUT)
 
-                    if not ready_to_read:
+                    if self.server not in ready_to_read:
                         continue
 
                     # Accept connection
                     client_socket, addr = self.server.accept()
-                    print(f"[CONNECTION] New connection from {addr}")
-
-                    # Acquire semaphore to limit simultaneous connections
-                    self.semaphore.acquire()
 
                     # Set a reasonable timeout
                     client_socket.settimeout(5.0)
+                    # As respostas em streaming saem em vários sendall pequenos: com Nagle, cada um
+                    # esperaria o ACK atrasado do cliente (~40 ms)
+                    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
-                    # Create a process to handle the client and pass the whole socket to the new process
-                    process = multiprocessing.Process(
-                        target=self.handle_client,
-                        args=(client_socket, addr, self.cpf_db, self.cnpj_db, self.semaphore)
-                    )
-                    process.daemon = True
-                    process.start()
-                    client_socket.detach()
+                    outcome = self.admission.offer(addr[0], (client_socket, addr))
+                    if outcome == admission.ADMITTED:
+                        self._dispatch(client_socket, addr)
+                    elif outcome != admission.QUEUED:
+                        self._shed(client_socket, addr, outcome)
 
                 except OSError as e:
                     if e.errno == 9:  # Bad file descriptor
-                        print(f"Error accepting connection: socket may have been closed")
+                        log.info("Error accepting connection: socket may have been closed")
                     else:
-                        print(f"Error accepting connection: {e}")
-                        traceback.print_exc()
+                        log.exception("Error accepting connection: %s", e)
                 except Exception as e:
-                    print(f"Unexpected error in server loop: {e}")
-                    traceback.print_exc()
+                    log.exception("Unexpected error in server loop: %s", e)
 
         except Exception as e:
             print(f"Error setting up server: {e}")
@@ -342,11 +814,60 @@ class Server():
             self.stop_time = time.time()
             self._log_execution_time()
 
+    def _dispatch(self, client_socket, addr):
+        # Hand the socket to the worker pool; the queue duplicates the descriptor
+        self.conn_queue.put((client_socket, addr))
+        client_socket.close()
+
+    def _release_finished(self):
+        while self.done_reader.poll():
+            message = self.done_reader.recv_bytes().decode()
+            slot, _, client = message[1:].partition(" ")
+            if message[0] == "+":
+                self.in_flight[int(slot)] = client
+            else:
+                self.in_flight.pop(int(slot), None)
+                self._release(client)
+
+    def _release(self, client):
+        # Cada conexão encerrada libera uma vaga, ocupada pela mais antiga da fila
+        for client_socket, addr in self.admission.release(client):
+            self._dispatch(client_socket, addr)
+
+    def _shed(self, client_socket, addr, reason):
+        # Sem thread livre para o handshake, a conexão é só fechada
+        if not self.shed_slots.acquire(blocking=False):
+            client_socket.close()
+            return
+        self.shed_executor.submit(self._send_shed_response, client_socket, addr, reason)
+
+    def _send_shed_response(self, client_socket, addr, reason):
+        status, message = admission.SHED_RESPONSES[reason]
+        try:
+            client_socket.settimeout(1.0)
+            with self.shed_context.wrap_socket(client_socket, server_side=True) as ssl_socket:
+                # Lê a requisição antes de responder: fechar com dados não lidos faria o cliente receber RST
+                ssl_socket.recv(65536)
+                ssl_socket.sendall(Server.build_error_response(False, message, status, self.retry_after))
+        except (OSError, ssl.SSLError) as e:
+            log.debug("Could not send %s to %s: %s", status, addr, e)
+        finally:
+            client_socket.close()
+            self.shed_slots.release()
+        log.info("Shed connection from %s (%s)", addr, reason)
+
     def stop(self):
         self.running = False
         if self.server:
             self.server.close()
+        if self.shed_executor:
+            self.shed_executor.shutdown(wait=False, cancel_futures=True)
 
+        self._stop_workers()
+        self._log_stop()
+        self._stop_logging()
+
+    def _log_stop(self):
         # Registrar o tempo de parada
         self.stop_time = time.time()
         stop_datetime = datetime.fromtimestamp(self.stop_time)
@@ -355,6 +876,13 @@ class Server():
         # Calcular e exibir o tempo total de execução
         self._log_execution_time()
 
+        stats = self.handshake_stats.snapshot()
+        print(f"[SERVER] TLS handshakes: {stats['full']} full, {stats['resumed']} resumed ({stats['resumption_rate']:.1%} resumed)")
+
+        if self.cache:
+            stats = self.cache.snapshot()
+            print(f"[SERVER] Result cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+
     def _log_execution_time(self):
         """Calcula e exibe o tempo total de execução do servidor."""
         if self.start_time and self.stop_time:
@@ -368,3 +896,64 @@ class Server():
             print(f"[SERVER] Server was active for: {duration}")
         else:
             print("[SERVER] Execution time could not be calculated (missing start or stop time)")
+
+# Handler de cada rota, resolvido uma vez na importação
+HANDLERS = {route: getattr(Server, f"handle_{route}") for route in ROUTES}
+
+def create_server(engine, host, port, cpf_db, cnpj_db, **options):
+    """Cria o servidor com o motor escolhido: 'process' (pool de processos) ou 'asyncio'."""
+    if engine == "asyncio":
+        import async_server
+        return async_server.AsyncServer(host, port, cpf_db, cnpj_db, **options)
+    if engine == "process":
+        return Server(host, port, cpf_db, cnpj_db, **options)
+    raise ValueError(f"Unknown server engine: {engine}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor HTTPS de consultas CPF/CNPJ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--cpf-db", default="db/basecpf.db")
+    parser.add_argument("--cnpj-db", default="db/cnpj.db")
+    parser.add_argument("--engine", choices=["process", "asyncio"], default="process")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (process) or database threads (asyncio)")
+    parser.add_argument("--cache-file", default="result_cache.db",
+                        help="shared result cache file (empty string disables the cache)")
+    parser.add_argument("--cache-ttl", type=float, default=300.0)
+    parser.add_argument("--cache-size", type=int, default=10000, help="maximum cached results")
+    parser.add_argument("--plan-check", choices=plancheck.PLAN_CHECK_MODES, default="warn",
+                        help="EXPLAIN QUERY PLAN check at startup: warn about full scans or refuse to start (strict)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--log-sample", default="",
+                        help="fraction of records kept per level, e.g. INFO=0.1 keeps 10%% of the access lines")
+    parser.add_argument("--log-file", default=None, help="JSON log file (default: stdout)")
+    parser.add_argument("--max-queue", type=int, default=256,
+                        help="connections (process) or requests (asyncio) waiting for a free slot before 503")
+    parser.add_argument("--queue-timeout", type=float, default=2.0, help="seconds a queued item waits before 503")
+    parser.add_argument("--client-connections", type=int, default=0,
+                        help="concurrent connections (process) or requests (asyncio) per client IP; 0 disables")
+    parser.add_argument("--client-rate", type=float, default=0.0, help="requests per second per client IP; 0 disables")
+    parser.add_argument("--client-burst", type=float, default=None, help="burst allowed above --client-rate (default 2x)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 503")
+    args = parser.parse_args()
+    try:
+        log_sample = logs.parse_sample_rates(args.log_sample)
+    except ValueError as e:
+        parser.error(str(e))
+
+    worker_option = "db_workers" if args.engine == "asyncio" else "workers"
+    server = create_server(args.engine, args.host, args.port, args.cpf_db, args.cnpj_db,
+                           cache_file=args.cache_file, cache_ttl=args.cache_ttl,
+                           cache_max_entries=args.cache_size, plan_check=args.plan_check,
+                           log_level=args.log_level, log_sample=log_sample, log_file=args.log_file,
+                           max_queue=args.max_queue, queue_timeout=args.queue_timeout,
+                           client_connections=args.client_connections, client_rate=args.client_rate,
+                           client_burst=args.client_burst, retry_after=args.retry_after,
+                           **{worker_option: args.workers})
+    try:
+        server.start()
+    except KeyboardInterrupt:
+        server.stop()
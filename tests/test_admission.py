@@ -0,0 +1,90 @@
+import multiprocessing
+import pytest
+import admission
+from server import Server
+
+class FakeProcess:
+    def __init__(self, pid):
+        self.pid = pid
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+    def die(self, exitcode=-9):
+        self.alive = False
+        self.exitcode = exitcode
+
+@pytest.fixture
+def server(tmp_path):
+    """Acceptor do motor prefork com dois workers falsos e uma vaga de atendimento."""
+    server = Server("127.0.0.1", 0, str(tmp_path / "cpf.db"), str(tmp_path / "cnpj.db"), workers=2, cache_file="")
+    server.admission = admission.AdmissionQueue(1, max_queue=8)
+    server.done_reader, server.done_writer = multiprocessing.Pipe(duplex=False)
+    server.dispatched = []
+    server._dispatch = lambda client_socket, addr: server.dispatched.append(addr)
+    pids = iter(range(100, 200))
+    server._spawn_worker = lambda slot: FakeProcess(next(pids))
+    server.worker_processes = [server._spawn_worker(slot) for slot in range(2)]
+    yield server
+    server.done_reader.close()
+    server.done_writer.close()
+
+def worker_config(server, slot):
+    return {'admission_done': server.done_writer, 'metrics_slot': slot}
+
+def admit(server, client):
+    return server.admission.offer(client, (None, (client, 443)))
+
+def test_dead_worker_releases_its_connection(server):
+    assert admit(server, "10.0.0.1") == admission.ADMITTED
+    assert admit(server, "10.0.0.2") == admission.QUEUED
+    Server.report_started(worker_config(server, 1), "10.0.0.1")
+    dead = server.worker_processes[1]
+    dead.die()
+
+    server._supervise_workers()
+
+    # A vaga do worker morto passa para a conexão da fila, e o worker é substituído
+    assert server.dispatched == [("10.0.0.2", 443)]
+    assert server.admission.active == 1
+    assert "10.0.0.1" not in server.admission.clients
+    assert server.in_flight == {}
+    assert server.worker_processes[1] is not dead
+
+def test_connection_finished_before_death_is_released_once(server):
+    assert admit(server, "10.0.0.1") == admission.ADMITTED
+    config = worker_config(server, 0)
+    Server.report_started(config, "10.0.0.1")
+    Server.report_done(config, "10.0.0.1")
+    server.worker_processes[0].die()
+
+    server._supervise_workers()
+
+    assert server.admission.active == 0
+    assert server.in_flight == {}
+
+def test_recycled_worker_releases_nothing(server):
+    assert admit(server, "10.0.0.1") == admission.ADMITTED
+    Server.report_started(worker_config(server, 0), "10.0.0.1")
+    server._release_finished()
+    server.worker_processes[1].die(exitcode=0)
+
+    server._supervise_workers()
+
+    # O worker 0 continua atendendo: a vaga segue ocupada
+    assert server.admission.active == 1
+    assert server.in_flight == {0: "10.0.0.1"}
+
+def test_capacity_survives_repeated_crashes(server):
+    for attempt in range(10):
+        client = f"10.0.1.{attempt}"
+        assert admit(server, client) == admission.ADMITTED
+        Server.report_started(worker_config(server, attempt % 2), client)
+        server.worker_processes[attempt % 2].die()
+        server._supervise_workers()
+        assert server.admission.active == 0
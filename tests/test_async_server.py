@@ -0,0 +1,96 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import admission
+import httpparser
+import metrics
+from async_server import AsyncServer
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+def make_server(tmp_path):
+    return AsyncServer("127.0.0.1", 0, str(tmp_path / "missing-cpf.db"), str(tmp_path / "missing-cnpj.db"),
+                       db_workers=1, cache_file="", plan_check="off")
+
+def stream(server, make_chunks):
+    loop = asyncio.new_event_loop()
+    server.loop = loop
+    server.executor = ThreadPoolExecutor(1)
+    writer = FakeWriter()
+    timer = metrics.RequestTimer("person_by_name")
+    try:
+        task = loop.create_task(server.send_chunks(writer, make_chunks, False, timer))
+        # Sem cancelar a tarefa: um send_chunks esperando a fila para sempre vira falha, não travamento
+        loop.run_until_complete(asyncio.wait({task}, timeout=5))
+        assert task.done(), "send_chunks never finished"
+        return task.result(), bytes(writer.data), timer
+    finally:
+        server.executor.shutdown(wait=False)
+        loop.close()
+
+def test_stream_ends_when_database_cannot_be_opened(tmp_path):
+    sent, body, timer = stream(make_server(tmp_path), lambda cursor: iter([b"{}"]))
+    assert sent is False
+    assert timer.status == 500
+    assert b"Database file not found" in body
+    assert body.endswith(b"0\r\n\r\n")
+
+def test_stream_ends_when_producer_fails(tmp_path):
+    def chunks():
+        yield b'{"status":"searching"}'
+        raise RuntimeError("boom")
+    server = make_server(tmp_path)
+    server.databases.get = lambda: type("Databases", (), {"cursor_cpf": lambda self: None})()
+    sent, body, timer = stream(server, lambda cursor: chunks())
+    assert sent is False
+    assert b'{"status":"searching"}' in body
+    assert b"boom" in body
+    assert body.endswith(b"0\r\n\r\n")
+
+def request(method, path):
+    parser = httpparser.RequestParser()
+    parser.feed(f"{method} {path} HTTP/1.1\r\n\r\n".encode())
+    return parser.next_request()
+
+def serve_with_slots_busy(tmp_path, method, path):
+    """Atende uma requisição com a única vaga de atendimento ocupada por outro cliente."""
+    server = AsyncServer("127.0.0.1", 0, str(tmp_path / "missing-cpf.db"), str(tmp_path / "missing-cnpj.db"),
+                         db_workers=1, cache_file="", plan_check="off", queue_timeout=0.2)
+    loop = asyncio.new_event_loop()
+    server.loop = loop
+    writer = FakeWriter()
+    timer = metrics.RequestTimer()
+    try:
+        assert server.admission.offer("10.0.0.1", loop.create_future()) == admission.ADMITTED
+        task = loop.create_task(server.serve_request(writer, request(method, path), "10.0.0.2", timer))
+        loop.run_until_complete(asyncio.wait({task}, timeout=5))
+        assert task.done(), "serve_request never finished"
+        return bytes(writer.data), timer, server
+    finally:
+        loop.close()
+
+@pytest.mark.parametrize("method, path, status", [
+    ("GET", "/health", b"200"),
+    ("OPTIONS", "/get-person-by-name/MARIA", b"204"),
+    ("GET", "/metrics", b"200"),
+    ("GET", "/nope", b"404"),
+])
+def test_routes_without_sql_skip_admission(tmp_path, method, path, status):
+    body, timer, server = serve_with_slots_busy(tmp_path, method, path)
+    assert body.startswith(b"HTTP/1.1 " + status)
+    assert server.admission.active == 1
+    assert server.admission_stats.snapshot()["queued"] == 0
+
+def test_sql_routes_wait_for_a_slot(tmp_path):
+    body, timer, server = serve_with_slots_busy(tmp_path, "GET", "/get-person-by-cpf/12345678900")
+    assert body.startswith(b"HTTP/1.1 503")
+    assert timer.route == "person_by_cpf"
+    assert server.admission_stats.snapshot()["queued"] == 1
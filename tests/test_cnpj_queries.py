@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import pytest
+import database
+import lookups
+import queries
+
+PARTNER = "JOAO DA SILVA TESTE"
+PARTNER_CPF = "***123456**"
+# O CPF completo como chega na rota: a consulta compara só os dígitos do meio
+PARTNER_CPF_QUERY = "00012345600"
+
+def build_cnpj_db(path, companies, partners_per_company):
+    """cnpj.db mínimo: `companies` empresas em que PARTNER é sócio, cada uma com `partners_per_company` sócios."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE empresas (cnpj_basico TEXT, razao_social TEXT)")
+    conn.execute(
+        "CREATE TABLE estabelecimento (cnpj TEXT, cnpj_basico TEXT, nome_fantasia TEXT, tipo_logradouro TEXT, "
+        "logradouro TEXT, numero TEXT, complemento TEXT, bairro TEXT, municipio TEXT, uf TEXT, cep TEXT, "
+        "ddd1 TEXT, telefone1 TEXT, correio_eletronico TEXT)"
+    )
+    conn.execute("CREATE TABLE socios (cnpj TEXT, nome_socio TEXT, nome_representante TEXT, cnpj_cpf_socio TEXT)")
+    conn.execute('CREATE TABLE municipios (id TEXT, "desc" TEXT)')
+    conn.execute("INSERT INTO municipios VALUES ('1', 'MUNICIPIO 1')")
+    for i in range(1, companies + 1):
+        basico = f"{i:08d}"
+        cnpj = basico + "000100"
+        conn.execute("INSERT INTO empresas VALUES (?, ?)", (basico, f"EMPRESA {i} LTDA"))
+        conn.execute(
+            "INSERT INTO estabelecimento VALUES (?, ?, ?, 'RUA', 'A', '1', NULL, 'CENTRO', '1', 'SP', '01000000', "
+            "'11', '99999999', ?)", (cnpj, basico, f"FANTASIA {i}", f"contato{i}@empresa.com.br")
+        )
+        conn.execute("INSERT INTO socios VALUES (?, ?, NULL, ?)", (cnpj, PARTNER, PARTNER_CPF))
+        for j in range(1, partners_per_company):
+            conn.execute("INSERT INTO socios VALUES (?, ?, NULL, ?)", (cnpj, f"SOCIO {i} {j}", f"***{j:06d}**"))
+    conn.commit()
+    conn.close()
+
+def run_counting(path, query):
+    """Resultado de `query(cursor, code_tables)` e os comandos SQL executados durante a chamada."""
+    code_tables = lookups.CodeTables(str(path))
+    code_tables.load()
+    conn = sqlite3.connect(path)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        return query(conn.cursor(), code_tables), statements
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("companies", [1, 10, 200])
+def test_partner_search_statement_count_is_fixed(tmp_path, companies):
+    path = tmp_path / "cnpj.db"
+    build_cnpj_db(path, companies, partners_per_company=3)
+    results, statements = run_counting(
+        path, lambda cursor, code_tables: queries.search_cnpj_by_partner(PARTNER, PARTNER_CPF_QUERY, cursor, code_tables)
+    )
+    assert len(results) == companies
+    assert results[0]["razao_social"] == "EMPRESA 1 LTDA"
+    assert "MUNICIPIO 1" in results[0]["endereço"]
+    # Sócios, estabelecimentos e empresas: uma consulta cada, qualquer que seja o número de empresas
+    assert len(statements) == 3
+
+def test_partner_search_without_match_runs_one_statement(tmp_path):
+    path = tmp_path / "cnpj.db"
+    build_cnpj_db(path, 5, partners_per_company=1)
+    results, statements = run_counting(
+        path, lambda cursor, code_tables: queries.search_cnpj_by_partner("NINGUEM", "00000000000", cursor, code_tables)
+    )
+    assert results is None
+    assert len(statements) == 1
+
+@pytest.mark.parametrize("partners", [1, 10, 200])
+def test_cnpj_with_partners_statement_count_is_fixed(tmp_path, partners):
+    path = tmp_path / "cnpj.db"
+    build_cnpj_db(path, 3, partners_per_company=partners)
+    results, statements = run_counting(
+        path, lambda cursor, code_tables: queries.search_cnpj_with_partners("00000002000100", cursor, code_tables)
+    )
+    assert len(results) == 1
+    assert len(results[0]["socios"]) == partners
+    assert results[0]["socios"][0]["nome_socio"] == PARTNER
+    # Estabelecimento, sócios e empresas: uma consulta cada, qualquer que seja o número de sócios
+    assert len(statements) == 3
+
+def test_code_tables_switch_with_the_connection(tmp_path):
+    path = tmp_path / "cnpj.db"
+    build_cnpj_db(path, 1, partners_per_company=1)
+    code_tables = lookups.CodeTables(str(path))
+    code_tables.load()
+    databases = database.DatabaseManager(str(tmp_path / "cpf.db"), str(path), code_tables=code_tables)
+
+    def search():
+        return queries.search_cnpj_by_partner(PARTNER, PARTNER_CPF_QUERY, databases.cursor_cnpj(), code_tables)[0]
+
+    assert search()["razao_social"] == "EMPRESA 1 LTDA"
+    assert "MUNICIPIO 1" in search()["endereço"]
+
+    # Banco novo gerado numa cópia e trocado com mv: linhas e descrições mudam juntas
+    new_path = tmp_path / "cnpj-new.db"
+    build_cnpj_db(new_path, 1, partners_per_company=1)
+    conn = sqlite3.connect(new_path)
+    conn.execute("UPDATE empresas SET razao_social = 'EMPRESA RENOMEADA LTDA'")
+    conn.execute("""UPDATE municipios SET "desc" = 'MUNICIPIO RENOMEADO'""")
+    conn.commit()
+    conn.close()
+    os.replace(new_path, path)
+
+    # Sem uma conexão reaberta, os mapas seguem os da versão que as rotas ainda leem
+    assert code_tables.describe("municipio", "1") == "MUNICIPIO 1"
+    result = search()
+    assert result["razao_social"] == "EMPRESA RENOMEADA LTDA"
+    assert "MUNICIPIO RENOMEADO" in result["endereço"]
+    databases.close()
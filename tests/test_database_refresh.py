@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import pytest
+import cache
+import database
+import queries
+
+CPF = "00000000001"
+
+def build_cpf_db(path, name):
+    """cpf.db com uma única pessoa, de CPF `CPF` e nome `name`."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cpf (cpf TEXT, nome TEXT, sexo TEXT, nasc TEXT)")
+    conn.execute("INSERT INTO cpf VALUES (?, ?, 'F', '1990-01-01')", (CPF, name))
+    conn.commit()
+    conn.close()
+
+def replace_file(path, name):
+    # Como recomendado no README: gera numa cópia e substitui o arquivo (novo inode)
+    new_path = str(path) + ".new"
+    build_cpf_db(new_path, name)
+    os.replace(new_path, path)
+
+def rewrite_in_place(path, name):
+    # Mesmo inode e mesmo tamanho; o mtime é avançado para não depender da resolução do relógio do sistema de arquivos
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE cpf SET nome = ?", (name,))
+    conn.commit()
+    conn.close()
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+@pytest.fixture
+def cpf_db(tmp_path):
+    path = tmp_path / "cpf.db"
+    build_cpf_db(path, "NOME ANTIGO")
+    return path
+
+def names(rows):
+    return [row[1] for row in rows]
+
+@pytest.mark.parametrize("change", [replace_file, rewrite_in_place])
+def test_connection_reopens_when_file_changes(cpf_db, change):
+    databases = database.DatabaseManager(str(cpf_db), str(cpf_db.parent / "cnpj.db"))
+    assert names(queries.fetch_cpf_by_cpf(CPF, databases.cursor_cpf())) == ["NOME ANTIGO"]
+    change(cpf_db, "NOME NOVO")
+    assert names(queries.fetch_cpf_by_cpf(CPF, databases.cursor_cpf())) == ["NOME NOVO"]
+    databases.close()
+
+@pytest.mark.parametrize("change", [replace_file, rewrite_in_place])
+def test_cache_and_data_refresh_together(cpf_db, change):
+    result_cache = cache.ResultCache(str(cpf_db.parent / "cache.db"), [str(cpf_db)], check_interval=0)
+    databases = database.DatabaseManager(str(cpf_db), str(cpf_db.parent / "cnpj.db"))
+    key = cache.make_key("person_by_cpf", CPF)
+
+    def lookup():
+        return names(cache.cached_call(result_cache, key,
+                                       lambda: queries.fetch_cpf_by_cpf(CPF, databases.cursor_cpf())))
+
+    assert lookup() == ["NOME ANTIGO"]
+    assert lookup() == ["NOME ANTIGO"]
+    assert result_cache.snapshot()["hits"] == 1
+
+    change(cpf_db, "NOME NOVO")
+    # O cache é esvaziado e a falta seguinte é preenchida pela conexão reaberta, não pelas páginas antigas
+    assert lookup() == ["NOME NOVO"]
+    assert lookup() == ["NOME NOVO"]
+    snapshot = result_cache.snapshot()
+    assert snapshot["invalidations"] == 1
+    assert snapshot["hits"] == 2
+    databases.close()
+
+def test_removed_file_keeps_current_connection(cpf_db):
+    databases = database.DatabaseManager(str(cpf_db), str(cpf_db.parent / "cnpj.db"))
+    conn = databases.cpf()
+    os.remove(cpf_db)
+    assert databases.cpf() is conn
+    databases.close()
@@ -0,0 +1,201 @@
+import pytest
+import httpparser
+from server import Server, ROUTER
+
+def parse_all(parser, *segments):
+    """Alimenta o parser segmento a segmento e devolve todas as requisições completas."""
+    requests = []
+    for segment in segments:
+        parser.feed(segment)
+        request = parser.next_request()
+        while request is not None:
+            requests.append(request)
+            request = parser.next_request()
+    return requests
+
+# Parser
+
+def test_request_line_split_across_reads():
+    parser = httpparser.RequestParser()
+    requests = parse_all(parser, b"GE", b"T /get-person-by-n", b"ame/MARIA%20SILVA?limit=5 HT", b"TP/1.1\r\nHost: x\r\n\r\n")
+    assert len(requests) == 1
+    assert requests[0].method == "GET"
+    assert requests[0].path == "/get-person-by-name/MARIA%20SILVA"
+    assert requests[0].query() == {"limit": "5"}
+
+def test_headers_split_across_reads():
+    parser = httpparser.RequestParser()
+    head = b"GET /health HTTP/1.1\r\nHost: localhost\r\nAccept-Encoding: gzip\r\n\r\n"
+    # Um byte por vez, inclusive no meio do \r\n\r\n final
+    requests = parse_all(parser, *(head[i:i + 1] for i in range(len(head))))
+    assert len(requests) == 1
+    assert requests[0].headers == {"host": "localhost", "accept-encoding": "gzip"}
+    assert parser.buffer == b""
+
+def test_body_split_across_reads():
+    parser = httpparser.RequestParser()
+    requests = parse_all(parser, b"POST /get-person-by-cpf-batch HTTP/1.1\r\nContent-Length: 11\r\n\r\n{\"cpfs\"", b":[]}")
+    assert len(requests) == 1
+    assert requests[0].body == b'{"cpfs":[]}'
+
+def test_pipelined_requests_in_one_buffer():
+    parser = httpparser.RequestParser()
+    data = (
+        b"GET /health HTTP/1.1\r\n\r\n"
+        b"POST /get-person-by-cpf-batch HTTP/1.1\r\nContent-Length: 2\r\n\r\n[]"
+        b"GET /get-person-by-cpf/123 HTTP/1.1\r\nConnection: close\r\n\r\n"
+        b"GET /sta"
+    )
+    requests = parse_all(parser, data)
+    assert [(r.method, r.path, r.body) for r in requests] == [
+        ("GET", "/health", b""),
+        ("POST", "/get-person-by-cpf-batch", b"[]"),
+        ("GET", "/get-person-by-cpf/123", b""),
+    ]
+    # O início da quarta requisição fica no buffer até o resto chegar
+    assert parser.buffer == b"GET /sta"
+    assert [r.path for r in parse_all(parser, b"ts HTTP/1.1\r\n\r\n")] == ["/stats"]
+
+@pytest.mark.parametrize("data", [
+    b"GET /health\r\n\r\n",
+    b"GET health HTTP/1.1\r\n\r\n",
+    b"GET /health HTTP/2\r\n\r\n",
+    b"GET /health HTTP/1.1\r\nsem dois pontos\r\n\r\n",
+    b"GET /health HTTP/1.1\r\nHost : x\r\n\r\n",
+    b"POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n",
+    b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n",
+])
+def test_malformed_requests_are_400(data):
+    parser = httpparser.RequestParser()
+    parser.feed(data)
+    with pytest.raises(httpparser.BadRequest) as excinfo:
+        parser.next_request()
+    assert type(excinfo.value) is httpparser.BadRequest
+    assert excinfo.value.status == "400 Bad Request"
+
+def test_body_over_limit_is_413():
+    parser = httpparser.RequestParser(max_body_size=10)
+    parser.feed(b"POST /get-person-by-cpf-batch HTTP/1.1\r\nContent-Length: 11\r\n\r\n")
+    with pytest.raises(httpparser.PayloadTooLarge) as excinfo:
+        parser.next_request()
+    assert excinfo.value.status == "413 Payload Too Large"
+
+def test_headers_over_limit_are_431():
+    parser = httpparser.RequestParser(max_header_size=64)
+    parser.feed(b"GET /health HTTP/1.1\r\n" + b"X-Pad: " + b"a" * 100)
+    # Sem o fim dos cabeçalhos: o limite vale antes de o \r\n\r\n chegar
+    with pytest.raises(httpparser.HeadersTooLarge) as excinfo:
+        parser.next_request()
+    assert excinfo.value.status == "431 Request Header Fields Too Large"
+
+def test_complete_headers_over_limit_are_431():
+    parser = httpparser.RequestParser(max_header_size=64)
+    parser.feed(b"GET /health HTTP/1.1\r\nX-Pad: " + b"a" * 100 + b"\r\n\r\n")
+    with pytest.raises(httpparser.HeadersTooLarge):
+        parser.next_request()
+
+def test_error_response_carries_parser_status():
+    response = Server.build_error_response(False, "too big", httpparser.PayloadTooLarge.status)
+    assert response.startswith(b"HTTP/1.1 413 Payload Too Large\r\n")
+    assert b"Connection: close\r\n" in response
+    assert response.endswith(b'{"error": "too big"}')
+
+# Keep-alive
+
+@pytest.mark.parametrize("version, connection, keep_alive", [
+    ("HTTP/1.1", None, True),
+    ("HTTP/1.1", "close", False),
+    ("HTTP/1.1", "Close", False),
+    ("HTTP/1.1", "keep-alive", True),
+    ("HTTP/1.0", None, False),
+    ("HTTP/1.0", "keep-alive", True),
+    ("HTTP/1.0", "Keep-Alive", True),
+    ("HTTP/1.0", "close", False),
+])
+def test_keep_alive(version, connection, keep_alive):
+    head = f"GET /health {version}\r\n" + (f"Connection: {connection}\r\n" if connection else "") + "\r\n"
+    parser = httpparser.RequestParser()
+    parser.feed(head.encode())
+    assert parser.next_request().keep_alive is keep_alive
+
+# Router
+
+TABLE = (
+    ("OPTIONS", "*", "options"),
+    ("GET", "/health", "health"),
+    ("POST", "/batch", "batch"),
+    ("GET", "/by-name/", "by_name"),
+    ("GET", "/by-cpf/", "by_cpf", str.isdigit),
+)
+
+@pytest.fixture
+def router():
+    return httpparser.Router(TABLE)
+
+def test_exact_routes(router):
+    assert router.match("GET", "/health") == ("health", None)
+    assert router.match("POST", "/batch") == ("batch", None)
+
+def test_prefix_routes_decode_the_parameter(router):
+    assert router.match("GET", "/by-name/MARIA%20DA+SILVA") == ("by_name", "MARIA DA SILVA")
+    assert router.match("GET", "/by-name/JOS%C3%89") == ("by_name", "JOSÉ")
+    # O parâmetro vai até o fim do caminho, barras incluídas
+    assert router.match("GET", "/by-name/A/B") == ("by_name", "A/B")
+
+def test_prefix_validator(router):
+    assert router.match("GET", "/by-cpf/12345678900") == ("by_cpf", "12345678900")
+    assert router.match("GET", "/by-cpf/123abc") == ("invalid", None)
+
+def test_any_path_method(router):
+    assert router.match("OPTIONS", "/whatever") == ("options", None)
+
+@pytest.mark.parametrize("method, path", [
+    ("GET", "/nope"),
+    ("GET", "/by-name/"),
+    ("GET", "/healthz"),
+    ("GET", "/health/extra"),
+    ("POST", "/health"),
+    ("GET", "/batch"),
+])
+def test_unmatched_requests_fall_back(router, method, path):
+    assert router.match(method, path) == ("invalid", None)
+
+def test_routes_in_table_order(router):
+    assert router.routes == ("options", "health", "batch", "by_name", "by_cpf", "invalid")
+
+def test_allowed_methods(router):
+    assert router.allowed_methods("/health") == ["GET", "OPTIONS"]
+    assert router.allowed_methods("/batch") == ["OPTIONS", "POST"]
+    assert router.allowed_methods("/by-name/MARIA") == ["GET", "OPTIONS"]
+    assert router.allowed_methods("/nope") == []
+    assert router.allowed_methods("/nope/x") == []
+
+def request(method, path):
+    parser = httpparser.RequestParser()
+    parser.feed(f"{method} {path} HTTP/1.1\r\n\r\n".encode())
+    return parser.next_request()
+
+@pytest.mark.parametrize("method, path", [
+    ("GET", "/nope"),
+    ("GET", "/get-person-by-cpf/abc"),
+    ("GET", "/get-person-by-name/"),
+])
+def test_unknown_paths_are_404(method, path):
+    assert ROUTER.match(method, path) == ("invalid", None)
+    message, status, allow = Server.route_error(request(method, path))
+    assert status == "404 Not Found"
+    assert allow is None
+
+@pytest.mark.parametrize("method, path, allow", [
+    ("POST", "/health", ["GET", "OPTIONS"]),
+    ("DELETE", "/get-person-by-name/MARIA", ["GET", "OPTIONS"]),
+    ("GET", "/get-person-by-cpf-batch", ["OPTIONS", "POST"]),
+])
+def test_wrong_method_is_405_with_allow(method, path, allow):
+    assert ROUTER.match(method, path) == ("invalid", None)
+    message, status, allowed = Server.route_error(request(method, path))
+    assert status == "405 Method Not Allowed"
+    assert allowed == allow
+    response = Server.build_error_response(False, message, status, allow=allowed)
+    assert response.startswith(b"HTTP/1.1 405 Method Not Allowed\r\n")
+    assert f"Allow: {', '.join(allow)}\r\n".encode() in response
@@ -0,0 +1,89 @@
+import sqlite3
+import pytest
+import httpparser
+import metrics
+import queries
+from async_server import AsyncServer
+from server import Server
+
+class TrackingCursor(sqlite3.Cursor):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+class FakeDatabases:
+    """Banco cpf em memória; guarda cada cursor entregue para conferir se foi fechado."""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE cpf (cpf TEXT, nome TEXT, sexo TEXT, nasc TEXT)")
+        self.conn.executemany("INSERT INTO cpf VALUES (?, ?, 'F', '1990-01-01')",
+                              [(f"{i:011d}", f"MARIA SILVA {i}") for i in range(1, 11)])
+        self.cursors = []
+
+    def cursor_cpf(self):
+        cursor = self.conn.cursor(TrackingCursor)
+        self.cursors.append(cursor)
+        return cursor
+
+    def get(self):
+        return self
+
+class FakeSocket:
+    def __init__(self):
+        self.data = bytearray()
+
+    def send(self, data):
+        self.data += data
+        return len(data)
+
+def request(path):
+    parser = httpparser.RequestParser()
+    parser.feed(f"GET {path} HTTP/1.1\r\n\r\n".encode())
+    return parser.next_request()
+
+@pytest.fixture
+def databases():
+    databases = FakeDatabases()
+    yield databases
+    databases.conn.close()
+
+def serve(databases, handler, path, param, route):
+    ssl_socket = FakeSocket()
+    config = {'databases': databases, 'cache': None}
+    assert handler(ssl_socket, request(path), param, config, metrics.RequestTimer(route))
+    return bytes(ssl_socket.data)
+
+def test_page_closes_its_cursor(databases):
+    response = serve(databases, Server.handle_person_by_name, "/get-person-by-name/MARIA?limit=3", "MARIA",
+                     "person_by_name")
+    assert response.startswith(b"HTTP/1.1 200")
+    assert b'"next":"' in response
+    assert databases.cursors and all(cursor.closed for cursor in databases.cursors)
+
+def test_cpf_and_autocomplete_close_their_cursors(databases):
+    serve(databases, Server.handle_person_by_cpf, "/get-person-by-cpf/00000000001", "00000000001", "person_by_cpf")
+    serve(databases, Server.handle_autocomplete_person_name, "/autocomplete-person-name/MAR", "MAR",
+          "autocomplete_person_name")
+    assert len(databases.cursors) == 2
+    assert all(cursor.closed for cursor in databases.cursors)
+
+def test_cursor_is_closed_when_the_query_fails(databases):
+    def failing_query(cursor):
+        cursor.execute("SELECT * FROM nope")
+
+    with pytest.raises(sqlite3.OperationalError):
+        Server.run_with_cursor(databases, failing_query)
+    assert databases.cursors[0].closed
+
+def test_async_queries_close_their_cursors(tmp_path, databases):
+    server = AsyncServer("127.0.0.1", 0, str(tmp_path / "missing-cpf.db"), str(tmp_path / "missing-cnpj.db"),
+                         db_workers=1, cache_file="", plan_check="off")
+    server.databases = databases
+    page = server._run_query(lambda name, cursor: queries.paginate_cpf_by_name(name, cursor, 3), ("MARIA",))
+    assert len(page["rows"]) == 3
+    assert databases.cursors[0].closed
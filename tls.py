@@ -0,0 +1,57 @@
+import ssl
+import multiprocessing
+import time
+
+class HandshakeStats:
+    """Contadores de handshakes TLS completos e retomados, compartilhados entre processos."""
+
+    def __init__(self):
+        self._counts = multiprocessing.Array('Q', 2)
+
+    def record(self, reused):
+        with self._counts.get_lock():
+            self._counts[1 if reused else 0] += 1
+
+    def snapshot(self):
+        with self._counts.get_lock():
+            full, resumed = self._counts[:]
+        total = full + resumed
+        return {
+            "full": full,
+            "resumed": resumed,
+            "resumption_rate": round(resumed / total, 4) if total else 0.0
+        }
+
+def create_server_context(certfile, keyfile, stats=None, metrics=None):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+
+    # Session tickets let returning clients resume with an abbreviated handshake.
+    # The ticket keys live in the context, so processes forked after this point share them.
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = 2
+
+    if stats is not None or metrics is not None:
+        class CountingSSLSocket(ssl.SSLSocket):
+            def do_handshake(self, block=False):
+                start = time.perf_counter()
+                super().do_handshake(block)
+                if stats is not None:
+                    stats.record(self.session_reused)
+                if metrics is not None:
+                    metrics.handshake(time.perf_counter() - start)
+
+        context.sslsocket_class = CountingSSLSocket
+
+    if metrics is not None:
+        # asyncio usa SSLObject e repete do_handshake até concluir: mede da primeira chamada até o fim
+        class TimedSSLObject(ssl.SSLObject):
+            def do_handshake(self):
+                if not hasattr(self, "_handshake_start"):
+                    self._handshake_start = time.perf_counter()
+                super().do_handshake()
+                metrics.handshake(time.perf_counter() - self._handshake_start)
+
+        context.sslobject_class = TimedSSLObject
+
+    return context
@@ -0,0 +1,222 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import select
+import signal
+import socket
+import ssl
+import threading
+import time
+import logs
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+log = logging.getLogger(logs.LOGGER)
+
+class RequestHandler(WSGIRequestHandler):
+    # O tempo ocioso do keep-alive vem do socket (PooledWSGIServer.keepalive_timeout)
+    protocol_version = "HTTP/1.1"
+
+    def run_wsgi(self):
+        self.server.count_request()
+        super().run_wsgi()
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # Worker encerrando: termina a resposta atual e fecha a conexão em vez de esperar a próxima
+        if self.server.stopping.is_set():
+            self.close_connection = True
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Servidor WSGI do werkzeug com um pool fixo de threads, sem depurador nem recarregador.
+
+    Só aceita uma conexão quando há thread livre; com vários processos no mesmo socket, as
+    excedentes ficam para os outros workers. O handshake TLS roda na thread da conexão.
+    """
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads=8, ssl_context=None, fd=None, max_requests=0, keepalive_timeout=5.0):
+        # Sem ssl_context no werkzeug: ele envolveria o socket de escuta e faria o handshake no accept
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.ssl_context = ssl_context
+        self.socket.setblocking(False)
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+        self.slots = threading.BoundedSemaphore(threads)
+        self.max_requests = max_requests
+        self.keepalive_timeout = keepalive_timeout
+        self.stopping = threading.Event()
+        self._requests = itertools.count(1)
+        self.handled = 0
+
+    def count_request(self):
+        # next() de itertools.count é atômico sob o GIL
+        self.handled = next(self._requests)
+        if self.max_requests and self.handled >= self.max_requests:
+            self.stopping.set()
+
+    def serve(self, parent_pid=None):
+        """Atende até stop(), o limite de requisições ou a morte do processo mestre; espera as conexões em curso."""
+        try:
+            while not self.stopping.is_set():
+                if parent_pid and os.getppid() != parent_pid:
+                    log.warning("Master process gone, worker %d exiting", os.getpid())
+                    break
+                if not self.slots.acquire(timeout=0.5):
+                    continue
+                try:
+                    ready, _, _ = select.select([self.socket], [], [], 0.5)
+                    # Outro worker pode ter aceitado a conexão entre o select e o accept
+                    conn, addr = self.socket.accept() if ready else (None, None)
+                except (BlockingIOError, InterruptedError):
+                    conn = None
+                if conn is None:
+                    self.slots.release()
+                    continue
+                self.executor.submit(self.process_connection, conn, addr)
+        finally:
+            self.executor.shutdown(wait=True)
+            self.server_close()
+
+    def process_connection(self, conn, addr):
+        try:
+            conn.setblocking(True)
+            conn.settimeout(self.keepalive_timeout)
+            # Cabeçalhos e pedaços do streaming vão em escritas separadas: sem Nagle, nada espera o ACK atrasado
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.ssl_context is not None:
+                conn = self.ssl_context.wrap_socket(conn, server_side=True)
+            self.finish_request(conn, addr)
+        except (ssl.SSLError, OSError) as e:
+            log.debug("Connection with %s failed: %s", addr, e)
+        except Exception:
+            log.exception("Error handling client %s", addr)
+        finally:
+            self.shutdown_request(conn)
+            self.slots.release()
+
+    def stop(self):
+        self.stopping.set()
+
+class PreforkWSGIServer:
+    """Processo mestre: abre o socket, mantém `workers` processos com `threads` threads cada e os substitui.
+
+    SIGTERM/SIGINT encerram com elegância (as conexões em curso terminam); SIGHUP reinicia os
+    workers um a um. Os workers herdam a aplicação por fork.
+    """
+
+    def __init__(self, app, host, port, workers=None, threads=8, ssl_context=None, max_requests=10000,
+                 keepalive_timeout=5.0, graceful_timeout=10.0, on_worker_start=None, on_worker_exit=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.ssl_context = ssl_context
+        self.max_requests = max_requests
+        self.keepalive_timeout = keepalive_timeout
+        self.graceful_timeout = graceful_timeout
+        self.on_worker_start = on_worker_start
+        self.on_worker_exit = on_worker_exit
+        self.socket = None
+        self.processes = []
+        self.running = False
+        self._restart = []
+
+    def _worker_main(self, slot, parent_pid):
+        # O mestre trata Ctrl-C e SIGHUP; o worker só encerra por SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        server = PooledWSGIServer(self.host, self.port, self.app, self.threads, self.ssl_context,
+                                  fd=self.socket.fileno(), max_requests=self.max_requests,
+                                  keepalive_timeout=self.keepalive_timeout)
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        if self.on_worker_start:
+            self.on_worker_start(slot)
+        server.serve(parent_pid)
+        # Antes do fim do processo: o multiprocessing espera os processos filhos do worker
+        if self.on_worker_exit:
+            self.on_worker_exit(slot)
+        log.info("Worker %d exiting after %d requests", os.getpid(), server.handled)
+
+    def _spawn(self, slot):
+        # Não daemônico: o worker pode ter processos filhos (pool do Argon2, ver auth.py); o mestre
+        # encerra os workers em serve_forever e eles saem sozinhos se o mestre morrer (serve)
+        process = multiprocessing.get_context("fork").Process(target=self._worker_main, args=(slot, os.getpid()))
+        process.start()
+        return process
+
+    def _supervise(self):
+        for slot, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            process.join(timeout=0)
+            if process.exitcode != 0:
+                print(f"[WSGI] Worker {process.pid} died with exit code {process.exitcode}, restarting")
+            self.processes[slot] = self._spawn(slot)
+
+        # Reinício gradual: um worker por vez, o próximo só depois que o anterior foi substituído
+        if self._restart and all(process.is_alive() for process in self.processes):
+            slot = self._restart.pop(0)
+            self._stop_worker(self.processes[slot])
+            self.processes[slot] = self._spawn(slot)
+
+    def _stop_worker(self, process):
+        process.terminate()
+        process.join(timeout=self.graceful_timeout)
+        if process.is_alive():
+            log.warning("Worker %d did not finish in %.0fs, killing", process.pid, self.graceful_timeout)
+            process.kill()
+            process.join()
+
+    def restart_workers(self):
+        self._restart = list(range(len(self.processes)))
+
+    def stop(self):
+        self.running = False
+
+    def _serve_single(self):
+        # Sem fork (Windows) os workers não herdariam a aplicação: um único processo com o pool de threads
+        print(f"[WSGI] fork not available, serving from one process with {self.threads} threads")
+        server = PooledWSGIServer(self.host, self.port, self.app, self.threads, self.ssl_context,
+                                  keepalive_timeout=self.keepalive_timeout)
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: server.stop())
+        if self.on_worker_start:
+            self.on_worker_start(0)
+        server.serve()
+        if self.on_worker_exit:
+            self.on_worker_exit(0)
+
+    def serve_forever(self):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            return self._serve_single()
+
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        self.processes = [self._spawn(slot) for slot in range(self.workers)]
+        print(f"[WSGI] Listening on {self.host}:{self.port} with {self.workers} workers x {self.threads} threads "
+              f"(max {self.max_requests} requests each)")
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.restart_workers())
+        self.running = True
+        try:
+            while self.running:
+                self._supervise()
+                time.sleep(0.5)
+        finally:
+            # Todos recebem SIGTERM de uma vez e terminam as conexões em curso em paralelo
+            for process in self.processes:
+                process.terminate()
+            deadline = time.monotonic() + self.graceful_timeout
+            for process in self.processes:
+                process.join(timeout=max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+            self.socket.close()
+            print("[WSGI] Stopped")